@@ -0,0 +1,47 @@
+"""Saw kerf and end trim as a change of units.
+
+Solvers work in "kerf units": every piece is ``length + kerf`` long and
+every stock piece holds ``length - end_trim + kerf``. A set of pieces fits
+a stock piece exactly when the plain lengths plus one kerf per cut fit,
+where the last cut needs no kerf if nothing is left behind. Remnants come
+back as ``capacity - pieces``, i.e. the real remnant plus one kerf, so the
+solvers' bisect lookups and remnant bookkeeping stay unchanged.
+"""
+from typing import List
+
+from app.algorithm.plan import CutRow, PatternRow, WasteRow
+
+
+def waste_capacities(waste: List[WasteRow], end_trim_mm: int, kerf_mm: int) -> List[WasteRow]:
+    # Pieces no longer than their trim cannot hold anything and are dropped.
+    # Deliberately not NumPy: rows come in and go out as tuples, and the
+    # array round trip made it 2-4x slower at every pool size measured
+    # (50 to 200 000 rows), so there is no size worth switching at.
+    if not end_trim_mm and not kerf_mm:
+        return waste
+    shift = kerf_mm - end_trim_mm
+    return [(length + shift, waste_id) for length, waste_id in waste if length > end_trim_mm]
+
+
+def real_remnant(remnant: int, kerf_mm: int) -> int:
+    # A remnant up to one kerf wide is sawdust. Negative means the piece was
+    # longer than the stock (oversize orders still get a bar).
+    if remnant > kerf_mm:
+        return remnant - kerf_mm
+    return 0 if remnant >= 0 else remnant
+
+
+def pattern_cuts(patterns: List[PatternRow], end_trim_mm: int, kerf_mm: int) -> List[CutRow]:
+    # Cut rows of real-length patterns: the first cut names the stock
+    # piece, later cuts come from its remnant
+    cuts: List[CutRow] = []
+    for source_type, source_id, stock_length, pieces, _ in patterns:
+        left = stock_length - end_trim_mm + kerf_mm
+        for n, (order_id, length) in enumerate(pieces):
+            left -= length + kerf_mm
+            if n == 0:
+                bar_length = stock_length if source_type == "NEW_BAR" else None
+                cuts.append((order_id, source_type, source_id, real_remnant(left, kerf_mm), bar_length))
+            else:
+                cuts.append((order_id, "NEW_BAR_REMNANT", None, real_remnant(left, kerf_mm), None))
+    return cuts
@@ -0,0 +1,110 @@
+"""Glazing bead cut lengths for whole orders.
+
+Each opening takes four beads, two along its width and two along its
+height. As in the app's muntin calculator, the bead runs inside the sash
+or frame profile, so from outer sizes
+
+    long = size - 2 * heightMm - clearance
+
+(from rebate sizes, long = size - clearance). Ends are mitered at the
+profile's beadAngle, so the short side is long - 2 * beadHeightMm /
+tan(beadAngle); a profile without a bead angle gets square ends.
+
+Geometry comes from the preloaded profile catalogue (see miters), one
+lookup per distinct profile code; the lengths of all openings are then
+computed in one NumPy pass. Beads are ordered under the profile's code
+with BEAD_CODE_SUFFIX, which miter_nesting reads back.
+"""
+from typing import Dict, List, NamedTuple, Sequence
+
+import numpy as np
+
+from app.algorithm.miters import BEAD_CODE_SUFFIX, ProfileGeometry
+from app.models.schema import BeadCut, BeadOpening, OrderItem
+
+
+class BeadGeometryError(ValueError):
+    pass
+
+
+class BeadPieces(NamedTuple):
+    # Per opening, columns (width beads, height beads)
+    long_mm: np.ndarray
+    short_mm: np.ndarray
+    angle_deg: np.ndarray  # Per opening, both ends of all four beads
+
+
+def bead_code(profile_code: str) -> str:
+    return profile_code + BEAD_CODE_SUFFIX
+
+
+def _rounded(values: np.ndarray) -> np.ndarray:
+    # Whole millimetres, half up, as cut_length_mm for muntins
+    return np.floor(values + 0.5).astype(np.int64)
+
+
+def bead_pieces(openings: Sequence[BeadOpening], catalogue: Dict[str, ProfileGeometry],
+                dimensions: str = "outer", clearance_mm: float = 0.0) -> BeadPieces:
+    """Raises BeadGeometryError for profiles missing from the catalogue, or
+    without a height when sizes are outer, and for openings too small for
+    their beads."""
+    codes, which = np.unique([o.profile_code for o in openings], return_inverse=True)
+    missing = [c for c in codes if c not in catalogue or (dimensions == "outer" and catalogue[c].height_mm <= 0)]
+    if missing:
+        raise BeadGeometryError(f"Brak wymiarów profilu w katalogu (heightMm): {', '.join(missing)}.")
+    table = np.array([(catalogue[c].height_mm, catalogue[c].bead_height_mm, catalogue[c].bead_angle_deg)
+                      for c in codes], dtype=float)
+    height, bead_height, angle = table[which].T
+
+    sizes = np.array([(o.width_mm, o.height_mm) for o in openings], dtype=float)
+    inset = 2 * height if dimensions == "outer" else np.zeros(len(openings))
+    long_mm = sizes - inset[:, None] - clearance_mm
+
+    mitered = (angle > 0) & (angle < 90)
+    run = np.where(mitered, bead_height / np.tan(np.radians(np.where(mitered, angle, 45.0))), 0.0)
+    short_mm = long_mm - 2 * run[:, None]
+
+    too_small = (short_mm <= 0).any(axis=1)
+    if too_small.any():
+        opening = openings[int(np.argmax(too_small))]
+        raise BeadGeometryError(f"Otwór {opening.opening_id}: wymiar za mały dla listew profilu "
+                                f"{opening.profile_code}.")
+    return BeadPieces(long_mm, short_mm, np.where(mitered, angle, 90.0))
+
+
+def bead_cut_list(openings: Sequence[BeadOpening], pieces: BeadPieces) -> List[BeadCut]:
+    # Identical beads as one row, longest first
+    long_mm, short_mm = _rounded(pieces.long_mm).tolist(), _rounded(pieces.short_mm).tolist()
+    angles = pieces.angle_deg.tolist()
+    rows: Dict[tuple, BeadCut] = {}
+    # Opening ids per row as dict keys: each once, in first-seen order
+    ids: Dict[tuple, Dict[str, None]] = {}
+    for i, opening in enumerate(openings):
+        for side in (0, 1):
+            key = (opening.profile_code, opening.color, long_mm[i][side], short_mm[i][side], angles[i])
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = BeadCut(profile_code=bead_code(key[0]), color=key[1], length_mm=key[2],
+                                          short_length_mm=key[3], angle_deg=key[4], quantity=0, opening_ids=[])
+                ids[key] = {}
+            row.quantity += 2 * opening.quantity
+            ids[key][opening.opening_id] = None
+    for key, row in rows.items():
+        row.opening_ids = list(ids[key])
+    return sorted(rows.values(), key=lambda r: -r.length_mm)
+
+
+def bead_orders(openings: Sequence[BeadOpening], pieces: BeadPieces) -> List[OrderItem]:
+    # Two orders per opening, its width and its height beads
+    long_mm = _rounded(pieces.long_mm).tolist()
+    return [
+        OrderItem(order_id=f"{opening.opening_id}/{side}", profile_code=bead_code(opening.profile_code),
+                  color=opening.color, required_length_mm=long_mm[i][n], quantity=2 * opening.quantity)
+        for i, opening in enumerate(openings)
+        for n, side in enumerate(("W", "H"))
+    ]
+
+
+def total_length_mm(openings: Sequence[BeadOpening], pieces: BeadPieces) -> int:
+    quantity = np.array([o.quantity for o in openings], dtype=np.int64)
+    return int((_rounded(pieces.long_mm).sum(axis=1) * 2 * quantity).sum())
@@ -0,0 +1,110 @@
+"""Offcuts of another color with the same core color.
+
+core_color_map.json (written by config_wizard.py, read by the backend's
+CoreColorService) maps foil colors to core colors. For a (profile, color)
+with a colored core, ProfileSpec.is_core_colored, offcuts of the same
+profile in any color with the same core color can stand in for its own.
+Such a substitute counts CORE_COLOR_PENALTY_MM against the plan: it is
+used when it saves a new bar, or more scrap than the penalty.
+
+The map is read once (CORE_COLOR_MAP_PATH); without it nothing is
+substituted.
+"""
+import json
+import os
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.algorithm.plan import GroupResult, WasteRow
+from app.models.schema import ProfileSpec
+
+CORE_COLOR_MAP_PATH = os.getenv("CORE_COLOR_MAP_PATH", "")
+CORE_COLOR_PENALTY_MM = int(os.getenv("CORE_COLOR_PENALTY_MM", "300"))
+
+# As CoreColorService: white foils have a white core whatever the map says
+_WHITE_MARKERS = ("white", "biały", "9016")
+WHITE_CORE = "biały"
+
+
+class CoreColorIndex:
+    def __init__(self, mapping: Dict[str, str]):
+        # Lowercase like CoreColorService. Only the map's colors are kept:
+        # the rest come from requests, unbounded, and are cheap to classify.
+        self._core: Dict[str, str] = {color.lower(): core.lower() for color, core in mapping.items()}
+
+    def core_of(self, color: str) -> Optional[str]:
+        key = color.lower()
+        core = self._core.get(key)
+        if core is not None:
+            return core
+        return WHITE_CORE if any(marker in key for marker in _WHITE_MARKERS) else None
+
+    def substitutes(self, color: str, colors: Iterable[str]) -> List[str]:
+        # Colors other than `color` with its core, in the order given
+        core = self.core_of(color)
+        if core is None:
+            return []
+        return [c for c in colors if c != color and self.core_of(c) == core]
+
+
+def load_core_colors(path: str) -> CoreColorIndex:
+    with open(path, encoding="utf-8") as f:
+        return CoreColorIndex(json.load(f))
+
+
+@lru_cache(maxsize=1)
+def default_core_colors() -> Optional[CoreColorIndex]:
+    if CORE_COLOR_MAP_PATH and os.path.exists(CORE_COLOR_MAP_PATH):
+        return load_core_colors(CORE_COLOR_MAP_PATH)
+    return None
+
+
+def core_colored_groups(specs: Iterable[ProfileSpec]) -> Set[Tuple[str, str]]:
+    return {(spec.profile_code, spec.color) for spec in specs if spec.is_core_colored}
+
+
+def lend_offcuts(results: List[GroupResult], waste: Dict[tuple, List[WasteRow]],
+                 borrowers: Set[tuple], index: CoreColorIndex) -> Dict[tuple, List[WasteRow]]:
+    """Offcuts the solved plans leave unused, lent to core-colored groups
+    that opened new bars. Each piece goes to one group: longest pieces
+    first, to the group with the most new-bar length not yet covered."""
+    used = {cut[2] for result in results for cut in result.cuts if cut[1] == "WASTE"}
+    need: Dict[tuple, int] = {}
+    for result in results:
+        if result.key in borrowers and result.new_bars and index.core_of(result.key[1]) is not None:
+            need[result.key] = sum(cut[4] or 0 for cut in result.cuts if cut[1] == "NEW_BAR")
+
+    lent: Dict[tuple, List[WasteRow]] = {}
+    if not need:
+        return lent
+    pieces = []
+    for (profile_code, color), rows in waste.items():
+        core = index.core_of(color)
+        if core is None:
+            continue
+        takers = [key for key in need if key[0] == profile_code and key[1] != color
+                  and index.core_of(key[1]) == core]
+        if takers:
+            pieces.extend((length, waste_id, takers) for length, waste_id in rows if waste_id not in used)
+    pieces.sort(key=lambda p: -p[0])
+    for length, waste_id, takers in pieces:
+        key = max(takers, key=need.__getitem__)
+        if need[key] <= 0:
+            continue
+        lent.setdefault(key, []).append((length, waste_id))
+        need[key] -= length
+    return lent
+
+
+def substitution_gain(plain: GroupResult, substituted: GroupResult, lent: Iterable[str],
+                      penalty_mm: int = CORE_COLOR_PENALTY_MM) -> bool:
+    # Whether the plan with substitutes is worth it: cheaper in new bars, or
+    # as cheap with less scrap after the penalty per substitute used
+    lent = set(lent)
+    used = sum(1 for cut in substituted.cuts if cut[1] == "WASTE" and cut[2] in lent)
+    if used == 0:
+        return False
+    saved = plain.new_bar_cost - substituted.new_bar_cost
+    if abs(saved) > 1e-9:
+        return saved > 0
+    return substituted.scrap_mm + penalty_mm * used < plain.scrap_mm
@@ -0,0 +1,511 @@
+import math
+import random
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.models.schema import OptimizationRequest
+from app.algorithm.waste_index import SortedWastePool
+from app.algorithm.plan import CutRow, DemandRow, GroupResult, GroupStats, OrderRow, PatternRow, WasteRow
+from app.algorithm.allowances import real_remnant, waste_capacities
+from app.algorithm.stock import StockOption, pick_bar, stock_options
+
+DEFAULT_TIME_LIMIT_MS = 1000
+# Deeper trees never finish inside an interactive budget; such groups keep the FFD plan
+EXACT_MAX_PIECES = 400
+_DEADLINE_CHECK_NODES = 512
+# Local search: iterations without a strictly better plan, per piece, before it gives up
+_STALL_ITERATIONS_PER_PIECE = 50
+_MIN_STALL_ITERATIONS = 1000
+_MAX_RUINED_BINS = 3
+
+
+class _Bin:
+    # One stock piece (warehouse waste or new bar) and the pieces cut from it
+    __slots__ = ("source_type", "source_id", "stock_length", "remaining", "pieces", "cost")
+
+    def __init__(self, source_type: str, source_id: Optional[str], stock_length: int, cost: float = 0.0):
+        self.source_type = source_type
+        self.source_id = source_id
+        self.stock_length = stock_length
+        self.remaining = stock_length
+        self.pieces: List[int] = []
+        self.cost = cost
+
+
+class _SearchTimeout(Exception):
+    pass
+
+
+def _scrap_of(remnants, scrap_threshold_mm: int, kerf_mm: int = 0) -> int:
+    # Remnants in kerf units: up to one kerf is sawdust, not scrap
+    return sum(r - kerf_mm for r in remnants if kerf_mm < r < scrap_threshold_mm)
+
+
+def _place(indices: Iterable[int], lengths: List[int], bins: List[_Bin], open_bins: SortedWastePool,
+           stock: SortedWastePool, bars: List[StockOption], scrap_threshold_mm: int,
+           min_usable_offcut_mm: int) -> None:
+    # Best fit into an open bin, else the best warehouse piece, else a new bar
+    indices = list(indices)
+    demand = sum(lengths[idx] for idx in indices)
+    for idx in indices:
+        length = lengths[idx]
+        match = open_bins.pop_best_fit(length)
+        if match is not None:
+            b = match[1]
+        else:
+            w = stock.pop_avoiding_bad_offcut(length, scrap_threshold_mm, min_usable_offcut_mm)
+            if w is not None:
+                b = _Bin("WASTE", w[1], w[0])
+            else:
+                # Pieces longer than a bar still get one (negative remnant), as in greedy
+                capacity, _, cost = pick_bar(bars, length, demand)
+                b = _Bin("NEW_BAR", None, capacity, cost)
+            bins.append(b)
+        demand -= length
+        b.pieces.append(idx)
+        b.remaining -= length
+        if b.remaining > 0:
+            open_bins.add(b.remaining, b)
+
+
+def best_fit_decreasing(lengths: List[int], waste: List[WasteRow], bars: List[StockOption],
+                        scrap_threshold_mm: int, min_usable_offcut_mm: int) -> List[_Bin]:
+    # lengths must be sorted longest first. Open bins are indexed by their
+    # remaining length, so every placement is a bisect, not a scan.
+    bins: List[_Bin] = []
+    _place(range(len(lengths)), lengths, bins, SortedWastePool(), SortedWastePool(waste),
+           bars, scrap_threshold_mm, min_usable_offcut_mm)
+    return bins
+
+
+class _BranchAndBound:
+    # Depth-first search over piece -> bin assignments, pieces longest first.
+    # Objective is (new bar cost, scrap mm), compared lexicographically; with
+    # one bar length at cost 1 that is (new bars, scrap mm).
+    # Branching: open bins tightest first (one branch per distinct remaining
+    # length), then one branch per distinct unopened waste length, then one
+    # per bar length. Bound: cost + uncovered piece length at the cheapest
+    # cost per mm, rounded up to whole bars when there is one bar length.
+
+    def __init__(self, lengths: List[int], waste_lengths: List[int], bars: List[StockOption],
+                 scrap_threshold_mm: int, kerf_mm: int, deadline: float):
+        self.lengths = lengths
+        self.bars = bars
+        self.scrap = scrap_threshold_mm
+        self.kerf = kerf_mm
+        self.deadline = deadline
+        self.suffix = [0] * (len(lengths) + 1)
+        for i in range(len(lengths) - 1, -1, -1):
+            self.suffix[i] = self.suffix[i + 1] + lengths[i]
+
+        counts: Dict[int, int] = {}
+        for w in waste_lengths:
+            counts[w] = counts.get(w, 0) + 1
+        self.waste_lengths = sorted(counts)
+        self.waste_counts = [counts[w] for w in self.waste_lengths]
+        self.waste_free = sum(waste_lengths)
+
+        self.remaining: List[int] = []
+        # index into waste_lengths, or -1 - index into bars for a new bar
+        self.kinds: List[int] = []
+        self.assign = [0] * len(lengths)
+        self.nodes = 0
+        self.best_key: Tuple[float, int] = (math.inf, math.inf)
+        self.best: Optional[Tuple[List[int], List[int]]] = None
+
+    def solve(self, incumbent_key: Tuple[float, int]) -> Optional[Tuple[List[int], List[int]]]:
+        self.best_key = incumbent_key
+        try:
+            self._dfs(0, 0.0)
+        except _SearchTimeout:
+            pass
+        return self.best
+
+    def _dfs(self, i: int, cost: float) -> None:
+        self.nodes += 1
+        if self.nodes % _DEADLINE_CHECK_NODES == 0 and time.perf_counter() > self.deadline:
+            raise _SearchTimeout()
+
+        remaining = self.remaining
+        if i == len(self.lengths):
+            key = (_cost_key(cost), _scrap_of(remaining, self.scrap, self.kerf))
+            if key < self.best_key:
+                self.best_key = key
+                self.best = (self.assign[:], self.kinds[:])
+            return
+
+        smallest = self.lengths[-1]
+        free = self.waste_free + sum(r for r in remaining if r >= smallest)
+        bound = _cost_key(cost + _cost_lower_bound(self.bars, self.suffix[i] - free))
+        best_cost, best_scrap = self.best_key
+        if bound > best_cost or (bound == best_cost and best_scrap == 0):
+            return
+
+        length = self.lengths[i]
+
+        tried = set()
+        for b in sorted(range(len(remaining)), key=remaining.__getitem__):
+            r = remaining[b]
+            if r < length or r in tried:
+                continue
+            tried.add(r)
+            remaining[b] = r - length
+            self.assign[i] = b
+            self._dfs(i + 1, cost)
+            remaining[b] = r
+
+        for w, wl in enumerate(self.waste_lengths):
+            if wl < length or self.waste_counts[w] == 0:
+                continue
+            self.waste_counts[w] -= 1
+            self.waste_free -= wl
+            self.assign[i] = len(remaining)
+            remaining.append(wl - length)
+            self.kinds.append(w)
+            self._dfs(i + 1, cost)
+            remaining.pop()
+            self.kinds.pop()
+            self.waste_free += wl
+            self.waste_counts[w] += 1
+
+        for k, (capacity, _, bar_cost) in enumerate(self.bars):
+            if length > capacity or _cost_key(cost + bar_cost) > self.best_key[0]:
+                continue
+            self.assign[i] = len(remaining)
+            remaining.append(capacity - length)
+            self.kinds.append(-1 - k)
+            self._dfs(i + 1, cost + bar_cost)
+            remaining.pop()
+            self.kinds.pop()
+
+
+def _cost_lower_bound(bars: List[StockOption], uncovered: int) -> float:
+    # Cheapest new bars for `uncovered` mm of pieces (kerf units)
+    if uncovered <= 0:
+        return 0.0
+    if len(bars) == 1:
+        capacity, _, cost = bars[0]
+        return -(-uncovered // capacity) * cost
+    return uncovered * min(cost / capacity for capacity, _, cost in bars)
+
+
+def _cost_key(cost: float) -> float:
+    # Sums of catalog prices differ in the last bits depending on the order
+    # they were added in; equal plans must compare equal
+    return round(cost, 9)
+
+
+def _bins_key(bins: List[_Bin], scrap_threshold_mm: int, kerf_mm: int) -> Tuple[float, int]:
+    cost = sum(b.cost for b in bins if b.source_type == "NEW_BAR")
+    return _cost_key(cost), _scrap_of((b.remaining for b in bins), scrap_threshold_mm, kerf_mm)
+
+
+def _exact(lengths: List[int], waste: List[WasteRow], bars: List[StockOption],
+           scrap_threshold_mm: int, min_usable_offcut_mm: int, kerf_mm: int, deadline: float) -> List[_Bin]:
+    incumbent = best_fit_decreasing(lengths, waste, bars, scrap_threshold_mm, min_usable_offcut_mm)
+    if len(lengths) > EXACT_MAX_PIECES or any(length > bars[-1][0] for length in lengths):
+        return incumbent
+
+    search = _BranchAndBound(lengths, [w[0] for w in waste], bars, scrap_threshold_mm, kerf_mm, deadline)
+    found = search.solve(_bins_key(incumbent, scrap_threshold_mm, kerf_mm))
+    if found is None:
+        return incumbent
+
+    # Rebuild bins from the assignment; equal-length waste is taken in input order
+    assign, kinds = found
+    stock = SortedWastePool(waste)
+    bins: List[_Bin] = []
+    for kind in kinds:
+        if kind < 0:
+            capacity, _, cost = bars[-1 - kind]
+            bins.append(_Bin("NEW_BAR", None, capacity, cost))
+        else:
+            w_length, w_id = stock.pop_best_fit(search.waste_lengths[kind])
+            bins.append(_Bin("WASTE", w_id, w_length))
+    for idx, b in enumerate(assign):
+        bins[b].pieces.append(idx)
+        bins[b].remaining -= lengths[idx]
+    return bins
+
+
+def _kerf_units(key: tuple, orders: List[OrderRow], waste: List[WasteRow], request: OptimizationRequest):
+    # Piece lengths, stock, bar options and thresholds in kerf units (see allowances)
+    kerf = request.kerf_mm
+    lengths = [o[1] + kerf for o in orders]
+    stock = waste_capacities(waste, request.end_trim_mm, kerf)
+    bars = stock_options(request, key)
+    return lengths, stock, bars, request.scrap_threshold_mm + kerf, request.min_usable_offcut_mm + kerf
+
+
+def solve_cutting_stock_group(key: tuple, orders: List[OrderRow], waste: List[WasteRow],
+                              request: OptimizationRequest, deadline: float) -> GroupResult:
+    solve_start = time.perf_counter()
+    # Priority does not change the plan here: every order of the batch is cut
+    orders = sorted(orders, key=lambda x: -x[1])
+    lengths, stock, bars, scrap_limit, min_usable = _kerf_units(key, orders, waste, request)
+
+    if request.algorithm == "exact":
+        bins = _exact(lengths, stock, bars, scrap_limit, min_usable, request.kerf_mm, deadline)
+    else:
+        bins = best_fit_decreasing(lengths, stock, bars, scrap_limit, min_usable)
+
+    return _group_result(key, orders, lengths, bins, request, solve_start)
+
+
+def solve_demand_vector(key: tuple, demand: List[DemandRow], waste: List[WasteRow],
+                        request: OptimizationRequest) -> GroupResult:
+    # The group becomes a (length, count) demand vector, longest first; each stock piece is filled first fit decreasing from
+    # the vector, and a new-bar pattern is cut as many times as the counts
+    # allow in one step. Order ids are handed out only when the patterns
+    # are written out.
+    solve_start = time.perf_counter()
+    kerf = request.kerf_mm
+    scrap_limit = request.scrap_threshold_mm
+    stock = SortedWastePool(waste_capacities(waste, request.end_trim_mm, kerf))
+    bars = stock_options(request, key)
+
+    # Length class (kerf units) -> its orders as [order_id, pieces left]
+    ids: Dict[int, List[List]] = {}
+    for row, quantity in demand:
+        ids.setdefault(row[1] + kerf, []).append([row[0], quantity])
+    classes = sorted(ids, reverse=True)
+    counts = [sum(n for _, n in ids[c]) for c in classes]
+    demand = sum(c * n for c, n in zip(classes, counts))
+
+    # (source_type, source_id, stock_length, [(class index, pieces), ...], left, cost, times)
+    vectors = []
+    first = 0
+    while True:
+        while first < len(classes) and counts[first] == 0:
+            first += 1
+        if first == len(classes):
+            break
+        longest = classes[first]
+        w = stock.pop_avoiding_bad_offcut(longest, scrap_limit + kerf, request.min_usable_offcut_mm + kerf)
+        if w is not None:
+            source_type, source_id, capacity, cost = "WASTE", w[1], w[0], 0.0
+        else:
+            capacity, _, cost = pick_bar(bars, longest, demand)
+            source_type, source_id = "NEW_BAR", None
+
+        left = capacity
+        take = []
+        for k in range(first, len(classes)):
+            if counts[k] and classes[k] <= left:
+                n = min(counts[k], left // classes[k])
+                take.append((k, n))
+                left -= n * classes[k]
+        if not take:
+            # Longer than any bar: still gets one (negative remnant), as in greedy
+            take, left = [(first, 1)], capacity - longest
+        # Waste pieces are one of a kind; a bar pattern repeats while every count allows it
+        times = 1 if source_type == "WASTE" else min(counts[k] // n for k, n in take)
+        for k, n in take:
+            counts[k] -= n * times
+            demand -= n * times * classes[k]
+        vectors.append((source_type, source_id, capacity, take, left, cost, times))
+
+    cuts: List[CutRow] = []
+    patterns: List[PatternRow] = []
+    new_bars = scrap = 0
+    new_bar_cost = 0.0
+    heads = [0] * len(classes)  # Next order of each class to hand out pieces from
+    for source_type, source_id, capacity, take, left, cost, times in vectors:
+        stock_length = capacity - kerf + request.end_trim_mm
+        remnant = real_remnant(left, kerf)
+        if source_type == "NEW_BAR":
+            new_bars += times
+            new_bar_cost += cost * times
+        if 0 < remnant < scrap_limit:
+            scrap += remnant * times
+        # Every copy of the pattern leaves the same remnants; cuts follow
+        # the greedy convention (first cut names the stock piece)
+        remaining = capacity
+        remnants = []
+        for k, n in take:
+            for _ in range(n):
+                remaining -= classes[k]
+                remnants.append(real_remnant(remaining, kerf))
+        bar_length = stock_length if source_type == "NEW_BAR" else None
+        for _ in range(times):
+            pieces = []
+            for k, n in take:
+                queue = ids[classes[k]]
+                while n:
+                    order = queue[heads[k]]
+                    used = min(n, order[1])
+                    pieces.extend([(order[0], classes[k] - kerf)] * used)
+                    order[1] -= used
+                    n -= used
+                    if not order[1]:
+                        heads[k] += 1
+            patterns.append((source_type, source_id, stock_length, pieces, remnant))
+            cuts.append((pieces[0][0], source_type, source_id, remnants[0], bar_length))
+            cuts.extend([(piece[0], "NEW_BAR_REMNANT", None, r, None) for piece, r in zip(pieces[1:], remnants[1:])])
+
+    waste_used = sum(1 for v in vectors if v[0] == "WASTE")
+    stats = GroupStats(solve_s=time.perf_counter() - solve_start)
+    return GroupResult(key, cuts, patterns, new_bars, scrap, waste_used, stats, new_bar_cost)
+
+
+def _group_result(key: tuple, orders: List[OrderRow], lengths: List[int], bins: List[_Bin],
+                  request: OptimizationRequest, solve_start: float) -> GroupResult:
+    # bins hold indices into orders, lengths and bins are in kerf units
+    kerf = request.kerf_mm
+    scrap_limit = request.scrap_threshold_mm
+    cuts: List[CutRow] = []
+    patterns: List[PatternRow] = []
+    total_new_bars = 0
+    new_bar_cost = 0.0
+    total_scrap = 0
+    waste_used_count = 0
+
+    for b in bins:
+        stock_length = b.stock_length - kerf + request.end_trim_mm
+        if b.source_type == "NEW_BAR":
+            total_new_bars += 1
+            new_bar_cost += b.cost
+        else:
+            waste_used_count += 1
+
+        # Cuts follow the greedy convention: the first cut names the
+        # stock piece, later cuts come from its remnant
+        remaining = b.stock_length
+        for n, idx in enumerate(b.pieces):
+            remaining -= lengths[idx]
+            if n == 0:
+                bar_length = stock_length if b.source_type == "NEW_BAR" else None
+                cuts.append((orders[idx][0], b.source_type, b.source_id, real_remnant(remaining, kerf), bar_length))
+            else:
+                cuts.append((orders[idx][0], "NEW_BAR_REMNANT", None, real_remnant(remaining, kerf), None))
+
+        remnant = real_remnant(b.remaining, kerf)
+        if 0 < remnant < scrap_limit:
+            total_scrap += remnant
+        pieces = [(orders[idx][0], orders[idx][1]) for idx in b.pieces]
+        patterns.append((b.source_type, b.source_id, stock_length, pieces, remnant))
+
+    stats = GroupStats(solve_s=time.perf_counter() - solve_start)
+    return GroupResult(key, cuts, patterns, total_new_bars, total_scrap, waste_used_count, stats, new_bar_cost)
+
+
+def _bins_from_patterns(patterns: List[PatternRow], orders: List[OrderRow], lengths: List[int],
+                        stock: List[WasteRow], bars: List[StockOption], request: OptimizationRequest):
+    # Patterns back to bins over orders, lengths and stock (kerf units).
+    # Pieces whose order is gone or changed length are dropped, and so are
+    # patterns cut from waste that is no longer in stock. Returns the bins,
+    # the placed order indices and the ids of the waste no bin uses.
+    bar_cost = {length: cost for _, length, cost in bars}
+    # An order with a quantity has one row per piece, all of one length
+    index_of: Dict[str, List[int]] = {}
+    for idx, o in enumerate(orders):
+        index_of.setdefault(o[0], []).append(idx)
+    waste_left = {w[1] for w in stock}
+
+    bins: List[_Bin] = []
+    placed = set()
+    for source_type, source_id, stock_length, pieces, _ in patterns:
+        if source_type == "WASTE" and source_id not in waste_left:
+            continue
+        # A kept bar is priced as the catalog prices its length now
+        cost = bar_cost.get(stock_length, 0.0) if source_type == "NEW_BAR" else 0.0
+        b = _Bin(source_type, source_id, stock_length - request.end_trim_mm + request.kerf_mm, cost)
+        for order_id, length in pieces:
+            free = index_of.get(order_id)
+            if free and orders[free[-1]][1] == length:
+                idx = free.pop()
+                placed.add(idx)
+                b.pieces.append(idx)
+                b.remaining -= lengths[idx]
+        if b.pieces:
+            bins.append(b)
+            waste_left.discard(source_id)
+    return bins, placed, waste_left
+
+
+def repair_cutting_stock_group(key: tuple, previous: List[PatternRow], orders: List[OrderRow],
+                               waste: List[WasteRow], request: OptimizationRequest) -> GroupResult:
+    """Re-plans a group after a small change, moving as few pieces as possible.
+
+    Patterns of the previous plan keep every piece whose order is still in
+    the group with the same length, unless their warehouse piece is gone.
+    Only the pieces left without a place (new orders, and those cut from
+    removed waste) are placed, best fit decreasing into the remnants of the
+    kept patterns, then unused waste, then new bars.
+    """
+    solve_start = time.perf_counter()
+    orders = sorted(orders, key=lambda x: -x[1])
+    lengths, stock, bars, scrap_limit, min_usable = _kerf_units(key, orders, waste, request)
+    bins, placed, waste_left = _bins_from_patterns(previous, orders, lengths, stock, bars, request)
+
+    open_bins = SortedWastePool((b.remaining, b) for b in bins if b.remaining > 0)
+    free_stock = SortedWastePool(w for w in stock if w[1] in waste_left)
+    unplaced = (idx for idx in range(len(orders)) if idx not in placed)
+    _place(unplaced, lengths, bins, open_bins, free_stock, bars, scrap_limit, min_usable)
+    return _group_result(key, orders, lengths, bins, request, solve_start)
+
+
+def _objective(bins: List[_Bin], scrap_limit: int, kerf_mm: int) -> Tuple[float, int, int]:
+    cost, scrap = _bins_key(bins, scrap_limit, kerf_mm)
+    return cost, scrap, -sum(b.remaining * b.remaining for b in bins if b.remaining > 0)
+
+
+def _copy(b: _Bin) -> _Bin:
+    c = _Bin(b.source_type, b.source_id, b.stock_length, b.cost)
+    c.remaining = b.remaining
+    c.pieces = list(b.pieces)
+    return c
+
+
+def improve_cutting_stock_group(baseline: GroupResult, orders: List[OrderRow], waste: List[WasteRow],
+                                request: OptimizationRequest, deadline: float) -> GroupResult:
+    """Anytime improvement of a greedy group plan (baseline must carry patterns).
+
+    Ruin and recreate: take a few stock pieces out of the current plan, put
+    their pieces back best fit decreasing (open remnants, then unused waste,
+    then new bars), and keep the result unless it is worse. The objective is
+    (new bar cost, scrap) as for exact. Equal plans are accepted too, so the
+    search drifts across plateaus, and among them larger remnants (sum of
+    squares) count as better, which pulls pieces together until a stock
+    piece empties. Runs until the deadline, until the plan meets the cost
+    lower bound without scrap, or until it stalls, so small groups do not
+    burn the whole budget.
+    """
+    solve_start = time.perf_counter()
+    key = baseline.key
+    orders = sorted(orders, key=lambda x: -x[1])
+    lengths, stock, bars, scrap_limit, min_usable = _kerf_units(key, orders, waste, request)
+    kerf = request.kerf_mm
+    bins, _, _ = _bins_from_patterns(baseline.patterns, orders, lengths, stock, bars, request)
+    # Sorted once, stably like the pool, so each iteration's pool sort is linear
+    stock = sorted(stock, key=lambda w: w[0])
+
+    best = _objective(bins, scrap_limit, kerf)
+    # Nothing beats the cheapest bars for what waste cannot hold, without scrap
+    floor = _cost_key(_cost_lower_bound(bars, sum(lengths) - sum(w[0] for w in stock)))
+    stall_limit = max(_MIN_STALL_ITERATIONS, _STALL_ITERATIONS_PER_PIECE * len(lengths))
+    # Seeded per call so equal budgets give equal plans on equal machines
+    rng = random.Random(len(lengths))
+    stall = 0
+
+    while bins and stall < stall_limit and (best[0] > floor or best[1] > 0):
+        if time.perf_counter() > deadline:
+            break
+        stall += 1
+        ruined = set(rng.sample(range(len(bins)), rng.randint(1, min(_MAX_RUINED_BINS, len(bins)))))
+        kept = [_copy(b) for i, b in enumerate(bins) if i not in ruined]
+        freed = sorted(idx for i in ruined for idx in bins[i].pieces)
+        in_use = {b.source_id for b in kept if b.source_type == "WASTE"}
+        free_stock = SortedWastePool(w for w in stock if w[1] not in in_use)
+        open_bins = SortedWastePool((b.remaining, b) for b in kept if b.remaining > 0)
+        # Lengths are sorted longest first, so ascending indices are decreasing lengths
+        _place(freed, lengths, kept, open_bins, free_stock, bars, scrap_limit, min_usable)
+
+        candidate = _objective(kept, scrap_limit, kerf)
+        if candidate <= best:
+            if candidate < best:
+                stall = 0
+            bins, best = kept, candidate
+
+    result = _group_result(key, orders, lengths, bins, request, solve_start)
+    return result._replace(baseline=(baseline.new_bars, baseline.new_bar_cost, baseline.scrap_mm))
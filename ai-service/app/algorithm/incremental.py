@@ -0,0 +1,116 @@
+from typing import Dict, List, NamedTuple, Set, Tuple
+
+from app.models.schema import OptimizationPlanDelta, OptimizationRequest
+from app.algorithm.cutting_stock import DEFAULT_TIME_LIMIT_MS
+from app.algorithm.plan import DemandRow, GroupResult, WasteRow
+from app.algorithm.reservations import withhold_reserved
+from app.algorithm.waste_optimizer import repair_group, solve_group
+
+
+class StoredPlan(NamedTuple):
+    # Everything needed to re-plan one group without the others
+    settings: OptimizationRequest  # Request without orders and waste
+    orders: Dict[tuple, List[DemandRow]]
+    # Also the waste of groups without orders, for orders a delta adds later,
+    # and the offcuts held for reserved lengths, withheld on every delta
+    waste: Dict[tuple, List[WasteRow]]
+    results: Dict[tuple, GroupResult]  # In plan order
+    locations: Dict[str, str] = {}  # Waste id -> location, for the pick route
+
+
+def _uses_waste(result: GroupResult, waste_id: str) -> bool:
+    return any(cut[1] == "WASTE" and cut[2] == waste_id for cut in result.cuts)
+
+
+def apply_plan_delta(plan: StoredPlan, delta: OptimizationPlanDelta) -> Tuple[StoredPlan, List[tuple]]:
+    """Re-plans only the (profile, color) groups a delta touches.
+
+    A group is re-planned when it gains or loses an order, gains waste, or
+    loses a waste piece its plan cuts from. Losing waste the plan does not
+    use changes nothing, and neither does gaining waste that is held for
+    reserved lengths. A re-planned group only uses its own waste: the
+    core-color substitutes it borrowed are given up, and those lent to
+    groups that keep their plans stay out of reach. A group's plan is
+    repaired first, so kept pieces stay on their bars; only when the repair
+    costs more new bars than the old plan is the group solved in full, and
+    the full plan is taken if it is cheaper. Returns the new plan and the
+    re-planned group keys, in plan order.
+    """
+    # Copy on write: untouched groups share their row lists with the old plan
+    orders = dict(plan.orders)
+    waste = dict(plan.waste)
+    affected: Set[tuple] = set()
+
+    order_key = {row[0]: key for key, demand in orders.items() for row, _ in demand}
+    # An added order with a known id replaces it
+    removed_orders = set(delta.remove_order_ids) | {o.order_id for o in delta.add_orders}
+    for order_id in removed_orders:
+        key = order_key.get(order_id)
+        if key is not None:
+            orders[key] = [d for d in orders[key] if d[0][0] != order_id]
+            affected.add(key)
+    for order in delta.add_orders:
+        key = (order.profile_code, order.color)
+        row = (order.order_id, order.required_length_mm, order.priority)
+        orders[key] = orders.get(key, []) + [(row, order.quantity)]
+        affected.add(key)
+
+    waste_key = {w[1]: key for key, rows in waste.items() for w in rows}
+    # Core-color substitutes are cut in a group other than their own
+    borrowed = {cut[2]: key for key, result in plan.results.items() for cut in result.cuts
+                if cut[1] == "WASTE" and waste_key.get(cut[2], key) != key}
+    for waste_id in delta.remove_waste_ids:
+        key = waste_key.get(waste_id)
+        if key is None:
+            continue
+        waste[key] = [w for w in waste[key] if w[1] != waste_id]
+        result = plan.results.get(key)
+        if result is not None and _uses_waste(result, waste_id):
+            affected.add(key)
+        if waste_id in borrowed:
+            affected.add(borrowed[waste_id])
+    locations = plan.locations
+    if delta.add_waste:
+        locations = {**locations, **{item.id: item.location for item in delta.add_waste if item.location}}
+    for item in delta.add_waste:
+        key = (item.profile_code, item.color)
+        waste[key] = waste.get(key, []) + [(item.length_mm, item.id)]
+    # Added waste goes through the same hold as the batch's own
+    free = withhold_reserved(orders, waste)
+    free_ids = {w[1] for item in delta.add_waste for w in free.get((item.profile_code, item.color), ())}
+    for item in delta.add_waste:
+        key = (item.profile_code, item.color)
+        if key in orders and item.id in free_ids:
+            affected.add(key)
+
+    # Substitutes stay with the groups that keep their plans
+    on_loan = {waste_id for waste_id, key in borrowed.items() if key not in affected}
+    settings = plan.settings
+    resolved = [key for key in orders if key in affected and orders[key]]
+    time_limit_s = (settings.time_limit_ms if settings.time_limit_ms is not None else DEFAULT_TIME_LIMIT_MS) / 1000.0
+    budget_s = time_limit_s / max(len(resolved), 1)
+
+    results: Dict[tuple, GroupResult] = {}
+    for key in list(orders):
+        demand = orders[key]
+        if not demand:
+            del orders[key]  # Last order removed: the group leaves the plan
+            continue
+        if key not in affected:
+            results[key] = plan.results[key]
+            continue
+        group_waste = free.get(key, [])
+        if on_loan:
+            group_waste = [w for w in group_waste if w[1] not in on_loan]
+        previous = plan.results.get(key)
+        result = None
+        if previous is not None and previous.patterns:
+            result = repair_group(key, previous.patterns, demand, group_waste, settings)
+        if result is None or result.new_bar_cost > previous.new_bar_cost:
+            # Stability first: a full re-solve has to save a bar to be worth the churn
+            full = solve_group(key, demand, group_waste, settings, budget_s)
+            if result is None or full.new_bar_cost < result.new_bar_cost:
+                result = full
+        results[key] = result
+
+    return StoredPlan(settings, orders, waste, results, locations), resolved
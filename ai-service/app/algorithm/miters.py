@@ -0,0 +1,115 @@
+"""Nesting mitered pieces on a bar.
+
+Pieces of a profile are cut at its cutAngle (45 degrees for frames and
+sashes; mullions and other square-cut profiles leave it out), glazing
+beads at their beadAngle. Laid head to tail, every other piece turned
+over, two neighbours on a bar share one diagonal cut, which saves
+
+    overlap = height / tan(angle) - kerf * (1 / sin(angle) - 1)
+
+per shared cut (the diagonal kerf is longer than the square one). m
+pieces on one stock piece share m - 1 diagonals, so they fit when
+
+    sum(length + kerf - overlap) <= stock - (end_trim + overlap) + kerf
+
+That is the same bookkeeping as kerf and trim (see allowances): a group is
+solved with every piece `overlap` shorter and the end trim `overlap`
+longer, by any solver, and remnants come out as the real ones. Only the
+piece lengths in the patterns are put back.
+
+Heights and angles come from profiles.json (PROFILE_CATALOGUE_PATH), the
+catalogue manage_data.py and config_wizard.py fill in. Bead orders name
+their profile with BEAD_CODE_SUFFIX after the code. Profiles without a
+height or a cut angle, and groups with a piece too short to be mitered
+at both ends, are not nested.
+"""
+import json
+import math
+import os
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.algorithm.plan import DemandRow, GroupResult, PatternRow, WasteRow
+from app.models.schema import OptimizationRequest
+
+PROFILE_CATALOGUE_PATH = os.getenv("PROFILE_CATALOGUE_PATH", "")
+BEAD_CODE_SUFFIX = os.getenv("BEAD_CODE_SUFFIX", "-L")
+
+
+class ProfileGeometry(NamedTuple):
+    height_mm: float
+    width_mm: float
+    bead_height_mm: float
+    bead_angle_deg: float
+    cut_angle_deg: float = 0.0  # Miter of the profile's own pieces; 0 is a square cut
+
+
+def load_profile_catalogue(path: str) -> Dict[str, ProfileGeometry]:
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    return {
+        e["code"]: ProfileGeometry(float(e.get("heightMm") or 0), float(e.get("widthMm") or 0),
+                                   float(e.get("beadHeightMm") or 0), float(e.get("beadAngle") or 0),
+                                   float(e.get("cutAngle") or 0))
+        for e in entries
+    }
+
+
+@lru_cache(maxsize=1)
+def default_profile_catalogue() -> Dict[str, ProfileGeometry]:
+    if PROFILE_CATALOGUE_PATH and os.path.exists(PROFILE_CATALOGUE_PATH):
+        return load_profile_catalogue(PROFILE_CATALOGUE_PATH)
+    return {}
+
+
+def miter_geometry(profile_code: str, catalogue: Dict[str, ProfileGeometry]) -> Optional[Tuple[float, float]]:
+    # (height, miter angle) of the pieces of a profile code, frame or bead;
+    # None for square-cut profiles
+    geometry = catalogue.get(profile_code)
+    if geometry is not None:
+        return (geometry.height_mm, geometry.cut_angle_deg) if geometry.cut_angle_deg else None
+    if BEAD_CODE_SUFFIX and profile_code.endswith(BEAD_CODE_SUFFIX):
+        geometry = catalogue.get(profile_code[:-len(BEAD_CODE_SUFFIX)])
+        if geometry is not None:
+            return geometry.bead_height_mm, geometry.bead_angle_deg
+    return None
+
+
+def overlap_mm(height_mm: float, angle_deg: float, kerf_mm: int) -> int:
+    # Saved per shared diagonal, whole mm rounded down
+    if height_mm <= 0 or not 0 < angle_deg < 90:
+        return 0
+    a = math.radians(angle_deg)
+    return max(0, math.floor(height_mm / math.tan(a) - kerf_mm * (1 / math.sin(a) - 1)))
+
+
+def group_overlap(profile_code: str, shortest_mm: int, request: OptimizationRequest,
+                  catalogue: Optional[Dict[str, ProfileGeometry]] = None) -> int:
+    """The overlap a group is solved with; 0 when it is not nested.
+    shortest_mm is the group's shortest piece."""
+    if not request.miter_nesting:
+        return 0
+    catalogue = catalogue if catalogue is not None else default_profile_catalogue()
+    geometry = miter_geometry(profile_code, catalogue)
+    if geometry is None:
+        return 0
+    overlap = overlap_mm(geometry[0], geometry[1], request.kerf_mm)
+    # Both ends mitered take at least twice the overlap
+    return overlap if shortest_mm > 2 * overlap else 0
+
+
+def nest_rows(demand: List[DemandRow], waste: List[WasteRow], request: OptimizationRequest,
+              overlap: int) -> Tuple[List[DemandRow], List[WasteRow], OptimizationRequest]:
+    # The group in nested units; waste keeps its length, the trim takes the overlap
+    nested = [((order_id, length - overlap, priority), n) for (order_id, length, priority), n in demand]
+    return nested, waste, request.model_copy(update={"end_trim_mm": request.end_trim_mm + overlap})
+
+
+def nest_patterns(patterns: List[PatternRow], overlap: int) -> List[PatternRow]:
+    return [(t, i, stock, [(order_id, length - overlap) for order_id, length in pieces], remnant)
+            for t, i, stock, pieces, remnant in patterns]
+
+
+def unnest_result(result: GroupResult, overlap: int) -> GroupResult:
+    # Remnants, bars and scrap are already real; piece lengths get the overlap back
+    return result._replace(patterns=nest_patterns(result.patterns, -overlap))
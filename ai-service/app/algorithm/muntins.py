@@ -0,0 +1,223 @@
+"""Cut lists for glued muntins (szprosy V3) on straight grids.
+
+Geometry comes from muntins_v3.json (written by config_wizard.py, read by
+the backend's MuntinsV3Config): the sash's glass offset, the bead's
+effective offset and face angle, the muntin's width, thickness and wall
+angle. As in SZPROSY V3.MD:
+
+    glass = sash - 2 * (glassOffset + effectiveGlassOffset)
+    L = edge_distance + angle_correction_start + angle_correction_end - clearance
+
+Muntins of one direction run continuously from bead to bead; the other
+direction is cut between them, at equal spacing. Edge distances are taken
+edge to edge on the glass, so an end at a muntin loses half its width.
+The length is the longest face, on top: a face leaning at angle a adds
+thickness * tan(a) at that end. Ends at a bead take the bead's angleFace,
+ends at a muntin its wallAngleDeg.
+
+All windows are computed in one NumPy pass; each window yields at most
+four piece kinds (continuous, full, end, middle).
+"""
+import json
+import math
+import os
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.models.schema import MuntinCut, MuntinWindow, OrderItem
+
+MUNTINS_V3_PATH = os.getenv("MUNTINS_V3_PATH", "")
+
+
+class MuntinLayoutError(ValueError):
+    pass
+
+
+class MuntinGeometry(NamedTuple):
+    glass_offset_x: float
+    glass_offset_y: float
+    bead_offset: float
+    bead_angle_deg: float
+    width: float
+    thickness: float
+    wall_angle_deg: float
+
+
+class MuntinCatalogue:
+    """Sash profiles, beads and muntins of muntins_v3.json by name."""
+
+    def __init__(self, data: dict):
+        self.profiles = {p["name"]: p for p in data.get("profiles", [])}
+        self.beads = {b["name"]: b for b in data.get("beads", [])}
+        self.muntins = {m["name"]: m for m in data.get("muntins", [])}
+
+    @staticmethod
+    def _entry(table: Dict[str, dict], name: Optional[str], kind: str) -> Tuple[str, dict]:
+        # No name: the first entry, as the app preselects it
+        if name is None:
+            if not table:
+                raise MuntinLayoutError(f"Katalog szprosów nie zawiera pozycji typu {kind}.")
+            name = next(iter(table))
+        entry = table.get(name)
+        if entry is None:
+            raise MuntinLayoutError(f"Nieznany {kind}: {name}.")
+        return name, entry
+
+    def geometry(self, profile: Optional[str], bead: Optional[str],
+                 muntin: Optional[str]) -> Tuple[str, MuntinGeometry]:
+        # The muntin's name and the geometry of the combination
+        _, p = self._entry(self.profiles, profile, "profil")
+        _, b = self._entry(self.beads, bead, "listwa przyszybowa")
+        name, m = self._entry(self.muntins, muntin, "szpros")
+        return name, MuntinGeometry(
+            float(p.get("glassOffsetX", 0.0)), float(p.get("glassOffsetY", 0.0)),
+            float(b.get("effectiveGlassOffset", 0.0)), float(b.get("angleFace", 0.0)),
+            float(m.get("width", 0.0)), float(m.get("thickness", 0.0)), float(m.get("wallAngleDeg", 0.0)),
+        )
+
+
+def load_muntin_catalogue(path: str) -> MuntinCatalogue:
+    with open(path, encoding="utf-8") as f:
+        return MuntinCatalogue(json.load(f))
+
+
+@lru_cache(maxsize=1)
+def default_muntin_catalogue() -> Optional[MuntinCatalogue]:
+    if MUNTINS_V3_PATH and os.path.exists(MUNTINS_V3_PATH):
+        return load_muntin_catalogue(MUNTINS_V3_PATH)
+    return None
+
+
+class MuntinPiece(NamedTuple):
+    window: int  # Index into the windows
+    muntin: str
+    kind: str  # One of PIECE_KINDS
+    length_mm: float
+    angle_start_deg: float
+    angle_end_deg: float
+    count: int  # Pieces of the window, sash quantity included
+
+
+# (ends at a bead, ends at a muntin) per piece kind: continuous muntins, the
+# others when there are no continuous ones, and the others' end and middle pieces
+PIECE_KINDS = {"continuous": (2, 0), "full": (2, 0), "end": (1, 1), "middle": (0, 2)}
+
+
+def muntin_pieces(windows: Sequence[MuntinWindow], catalogue: MuntinCatalogue,
+                  bead_clearance_mm: float = 1.0, muntin_clearance_mm: float = 1.0,
+                  saw_offset_mm: float = 0.0) -> List[MuntinPiece]:
+    """Pieces of every window, window by window in kind order. Raises
+    MuntinLayoutError for unknown catalogue names and for grids too dense
+    for the muntin width."""
+    n = len(windows)
+    if not n:
+        return []
+    # One geometry lookup per distinct combination, then columns
+    combos: Dict[tuple, int] = {}
+    names: List[str] = []
+    geometries: List[MuntinGeometry] = []
+    which = np.empty(n, dtype=np.intp)
+    for i, w in enumerate(windows):
+        combo = (w.profile, w.bead, w.muntin)
+        j = combos.get(combo)
+        if j is None:
+            j = combos[combo] = len(geometries)
+            name, geometry = catalogue.geometry(*combo)
+            names.append(name)
+            geometries.append(geometry)
+        which[i] = j
+    g = np.array(geometries, dtype=float)[which]
+    offset_x, offset_y, bead_offset, bead_angle, width, thickness, wall_angle = g.T
+
+    sash = np.array([(w.frame_width_mm, w.frame_height_mm, w.rows, w.cols, w.continuous == "vertical",
+                      w.quantity, w.correction_mm) for w in windows], dtype=float)
+    sash_w, sash_h, rows, cols, vertical, quantity, correction = sash.T
+    vertical = vertical.astype(bool)
+    glass_w = np.maximum(sash_w - 2 * (offset_x + bead_offset) + correction, 0.0)
+    glass_h = np.maximum(sash_h - 2 * (offset_y + bead_offset) + correction, 0.0)
+
+    # Along the continuous muntins, and across them where the others are cut
+    along = np.where(vertical, glass_h, glass_w)
+    across = np.where(vertical, glass_w, glass_h)
+    n_continuous = np.where(vertical, cols, rows) - 1
+    n_split = np.where(vertical, rows, cols) - 1
+    span = across / (n_continuous + 1)
+
+    bead_tan = thickness * np.tan(np.radians(bead_angle))
+    wall_tan = thickness * np.tan(np.radians(wall_angle))
+
+    def length(edge, at_bead, at_muntin):
+        angles = at_bead * bead_tan + at_muntin * wall_tan
+        clearance = at_bead * bead_clearance_mm + at_muntin * muntin_clearance_mm
+        return edge + angles - clearance + saw_offset_mm
+
+    edges = {"continuous": along, "full": across, "end": span - width / 2, "middle": span - width}
+    lengths = np.stack([length(edges[kind], *ends) for kind, ends in PIECE_KINDS.items()], axis=1)
+    single = n_continuous == 0
+    counts = np.stack([
+        n_continuous,
+        np.where(single, n_split, 0),
+        np.where(single, 0, 2 * n_split),
+        np.where(single, 0, np.maximum(n_continuous - 1, 0) * n_split),
+    ], axis=1) * quantity[:, None]
+
+    bad = (counts > 0) & (lengths <= 0)
+    if bad.any():
+        i = int(np.nonzero(bad.any(axis=1))[0][0])
+        raise MuntinLayoutError(f"Okno {windows[i].window_id}: podział {windows[i].rows}x{windows[i].cols} "
+                                f"jest za gęsty dla szerokości szprosa.")
+
+    starts = np.stack([bead_angle, bead_angle, bead_angle, wall_angle], axis=1)
+    ends = np.stack([bead_angle, bead_angle, wall_angle, wall_angle], axis=1)
+    kinds = list(PIECE_KINDS)
+    return [
+        MuntinPiece(int(i), names[which[i]], kinds[k], float(lengths[i, k]), float(starts[i, k]), float(ends[i, k]),
+                    int(counts[i, k]))
+        for i, k in zip(*np.nonzero(counts))
+    ]
+
+
+def piece_label(kind: str, continuous: str) -> str:
+    # "Pion ciągły", "Poziom skrajny", ...
+    runs, cut = ("Pion", "Poziom") if continuous == "vertical" else ("Poziom", "Pion")
+    return {
+        "continuous": f"{runs} ciągły",
+        "full": f"{cut} ciągły",
+        "end": f"{cut} skrajny",
+        "middle": f"{cut} środkowy",
+    }[kind]
+
+
+def cut_length_mm(length_mm: float) -> int:
+    # Whole millimetres for the saw and the bar optimizer, half up
+    return int(math.floor(length_mm + 0.5))
+
+
+def cut_list(windows: Sequence[MuntinWindow], pieces: Sequence[MuntinPiece]) -> List[MuntinCut]:
+    # Identical pieces as one row, longest first: the order they are glued in
+    rows: Dict[tuple, MuntinCut] = {}
+    for p in pieces:
+        window = windows[p.window]
+        key = (p.muntin, window.color, round(p.length_mm, 1), round(p.angle_start_deg, 1),
+               round(p.angle_end_deg, 1), piece_label(p.kind, window.continuous))
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = MuntinCut(
+                muntin=key[0], color=key[1], length_mm=key[2], cut_length_mm=cut_length_mm(p.length_mm),
+                angle_start_deg=key[3], angle_end_deg=key[4], quantity=0, description=key[5], window_ids=[],
+            )
+        row.quantity += p.count
+        if window.window_id not in row.window_ids:
+            row.window_ids.append(window.window_id)
+    return sorted(rows.values(), key=lambda r: -r.length_mm)
+
+
+def muntin_orders(windows: Sequence[MuntinWindow], pieces: Sequence[MuntinPiece]) -> List[OrderItem]:
+    # One order per window and piece kind, grouped by muntin and color
+    return [
+        OrderItem(order_id=f"{windows[p.window].window_id}/{p.kind}", profile_code=p.muntin,
+                  color=windows[p.window].color, required_length_mm=cut_length_mm(p.length_mm), quantity=p.count)
+        for p in pieces
+    ]
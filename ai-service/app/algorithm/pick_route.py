@@ -0,0 +1,276 @@
+"""Pick routes through the offcut racks (pick_route=true).
+
+Locations follow LOCATION_FORMAT from setup_config.py: ``R`` digits are
+the rack row, ``P`` digits the pallet in that row, anything else is
+literal ("RR-P" reads "03-2" as row 3, pallet 2). Rows stand side by
+side between a front aisle, where the saw is, and a back aisle; pallet p
+is p steps from the front aisle and a row is one step from the next.
+
+Among offcuts that leave an equal cut (same remnant class, remnant within
+PICK_ROUTE_SLACK_MM), the piece closest to the batch's other picks is
+taken, so pieces stored together are fetched together. The picks are then
+listed in S-shape order: rows ascending, every other row walked backwards.
+Pieces whose location does not parse keep their place in the plan and go
+to the end of the route.
+"""
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.algorithm.allowances import pattern_cuts, real_remnant
+from app.algorithm.miters import group_overlap, nest_patterns
+from app.algorithm.plan import GroupResult, PatternRow, PickRoute, PickRow, WasteRow
+from app.algorithm.waste_index import SortedWastePool
+from app.models.schema import OptimizationRequest, WasteItem
+
+WAREHOUSE_ROWS = int(os.getenv("WAREHOUSE_ROWS", "25"))
+SHELF_CAPACITY = int(os.getenv("SHELF_CAPACITY", "3"))
+LOCATION_FORMAT = os.getenv("LOCATION_FORMAT", "RR-P")
+# How much longer a remnant may get to pick a closer offcut (mm)
+PICK_ROUTE_SLACK_MM = int(os.getenv("PICK_ROUTE_SLACK_MM", "50"))
+
+Position = Tuple[int, int]  # (row, pallet)
+# The saw, at the front aisle before row 1
+DEPOT: Position = (0, 0)
+# Full passes over the picks while swaps keep bringing pieces together
+_MAX_PASSES = 3
+
+
+def _location_pattern(location_format: str) -> "re.Pattern[str]":
+    parts = []
+    for run in re.finditer(r"R+|P+|[^RP]+", location_format):
+        text = run.group()
+        if text[0] == "R":
+            parts.append(r"(?P<row>\d+)")
+        elif text[0] == "P":
+            parts.append(r"(?P<pallet>\d+)")
+        else:
+            parts.append(re.escape(text))
+    if "R" not in location_format or "P" not in location_format:
+        # Unusable format: row and pallet as the first two numbers
+        return re.compile(r"\D*(?P<row>\d+)\D+(?P<pallet>\d+)")
+    return re.compile("".join(parts))
+
+
+class WarehouseLayout:
+    def __init__(self, rows: int = WAREHOUSE_ROWS, shelf_capacity: int = SHELF_CAPACITY,
+                 location_format: str = LOCATION_FORMAT):
+        self.rows = rows
+        self.shelf_capacity = shelf_capacity
+        self._pattern = _location_pattern(location_format)
+
+    def position(self, location: Optional[str]) -> Optional[Position]:
+        # None for locations that do not parse or lie outside the racks
+        match = self._pattern.fullmatch(location.strip()) if location else None
+        if match is None:
+            return None
+        row, pallet = int(match.group("row")), int(match.group("pallet"))
+        if not (1 <= row <= self.rows and 1 <= pallet <= self.shelf_capacity):
+            return None
+        return row, pallet
+
+    def distance(self, a: Position, b: Position) -> int:
+        # Within a row along it; between rows around the nearer aisle end
+        (r1, p1), (r2, p2) = a, b
+        if r1 == r2:
+            return abs(p1 - p2)
+        back = self.shelf_capacity + 1
+        return abs(r1 - r2) + min(p1 + p2, 2 * back - p1 - p2)
+
+    def walk_order(self, positions: List[Optional[Position]]) -> List[int]:
+        # Indices of positions in S-shape order, unknown positions last in input order
+        rows = sorted({p[0] for p in positions if p is not None})
+        backwards = {row: n % 2 == 1 for n, row in enumerate(rows)}
+
+        def key(i: int):
+            p = positions[i]
+            if p is None:
+                return (1, 0, 0, i)
+            return (0, p[0], -p[1] if backwards[p[0]] else p[1], i)
+        return sorted(range(len(positions)), key=key)
+
+    def route_length(self, positions: Iterable[Position]) -> int:
+        # From the saw through positions in the given order and back
+        total, here = 0, DEPOT
+        for p in positions:
+            total += self.distance(here, p)
+            here = p
+        return total + self.distance(here, DEPOT)
+
+    def nearest(self, position: Position, occupied: Counter) -> int:
+        # Distance to the closest occupied position or the saw
+        best = self.distance(position, DEPOT)
+        for other, n in occupied.items():
+            if n > 0:
+                best = min(best, self.distance(position, other))
+        return best
+
+
+@lru_cache(maxsize=1)
+def default_layout() -> WarehouseLayout:
+    return WarehouseLayout()
+
+
+def locations_of(items: Optional[Iterable[WasteItem]]) -> Dict[str, str]:
+    return {item.id: item.location for item in items or ()}
+
+
+def _remnant_class(remnant: int, request: OptimizationRequest) -> int:
+    # 0 nothing left, 1 scrap, 2 bad offcut, 3 usable, as the greedy's strategy B
+    if remnant <= 0:
+        return 0
+    if remnant < request.scrap_threshold_mm:
+        return 1
+    return 2 if remnant < request.min_usable_offcut_mm else 3
+
+
+def _recut(pattern: PatternRow, length_mm: int, request: OptimizationRequest,
+           overlap: int = 0) -> Optional[List[int]]:
+    # Real remnants after each piece when the pattern is cut from a piece
+    # of length_mm instead; None if the pieces do not fit it. overlap: the
+    # group's miter overlap (see miters)
+    kerf = request.kerf_mm
+    left = length_mm - request.end_trim_mm - overlap + kerf
+    remnants = []
+    for _, piece_mm in pattern[3]:
+        left -= piece_mm - overlap + kerf
+        remnants.append(real_remnant(left, kerf))
+    return remnants if left >= 0 else None
+
+
+class _Group:
+    # Mutable copy of one group's plan while its offcuts are swapped
+    __slots__ = ("result", "patterns", "scrap", "scrap_limit", "free", "swapped", "overlap")
+
+    def __init__(self, result: GroupResult, waste: List[WasteRow], scrap_limit: int, used: Set[str],
+                 overlap: int = 0):
+        # used: offcuts cut anywhere in the batch; a core-color substitute is
+        # cut in a group other than its own
+        self.result = result
+        self.patterns = list(result.patterns)
+        self.scrap = result.scrap_mm
+        self.scrap_limit = scrap_limit
+        self.free = SortedWastePool(w for w in waste if w[1] not in used)
+        self.swapped = False
+        self.overlap = overlap
+
+    def swap(self, j: int, length_mm: int, waste_id: str, remnants: List[int]) -> None:
+        source_type, old_id, old_length, pieces, old_remnant = self.patterns[j]
+        self.free.add(old_length, old_id)
+        self.free.remove(length_mm, waste_id)
+        # Equal cuts keep the remnant class, so scrap stays scrap
+        if 0 < old_remnant < self.scrap_limit:
+            self.scrap += remnants[-1] - old_remnant
+        self.patterns[j] = (source_type, waste_id, length_mm, pieces, remnants[-1])
+        self.swapped = True
+
+    def finish(self, request: OptimizationRequest) -> GroupResult:
+        if not self.swapped:
+            return self.result
+        # Cut rows follow the patterns, pattern by pattern
+        cuts = pattern_cuts(nest_patterns(self.patterns, self.overlap), request.end_trim_mm + self.overlap,
+                            request.kerf_mm)
+        return self.result._replace(cuts=cuts, patterns=self.patterns, scrap_mm=self.scrap)
+
+
+def _closer_offcut(group: _Group, j: int, here: Optional[Position], occupied: Counter,
+                   positions: Dict[str, Position], request: OptimizationRequest,
+                   layout: WarehouseLayout, slack_mm: int) -> Optional[Tuple[int, str, List[int]]]:
+    # The free offcut of equal cut closest to the other picks, if closer than the current one
+    _, _, length_mm, _, remnant = group.patterns[j]
+    remnant_class = _remnant_class(remnant, request)
+    best_cost = layout.nearest(here, occupied) if here is not None else None
+    best = None
+    for other_mm, other_id in group.free.peek_range(length_mm - slack_mm, length_mm + slack_mm):
+        position = positions.get(other_id)
+        if position is None:
+            continue
+        remnants = _recut(group.patterns[j], other_mm, request, group.overlap)
+        if remnants is None or _remnant_class(remnants[-1], request) != remnant_class:
+            continue
+        if abs(remnants[-1] - remnant) > slack_mm:
+            continue
+        cost = layout.nearest(position, occupied)
+        if best_cost is None or cost < best_cost:
+            best_cost, best = cost, (other_mm, other_id, remnants)
+    return best
+
+
+def route_picks(results: Iterable[GroupResult], waste: Dict[tuple, List[WasteRow]],
+                locations: Dict[str, str], request: OptimizationRequest,
+                layout: Optional[WarehouseLayout] = None,
+                slack_mm: int = PICK_ROUTE_SLACK_MM) -> Tuple[List[GroupResult], PickRoute]:
+    # results need their patterns; waste: the rows the groups were solved with
+    layout = layout if layout is not None else default_layout()
+    positions = {}
+    for waste_id, location in locations.items():
+        position = layout.position(location)
+        if position is not None:
+            positions[waste_id] = position
+
+    results = list(results)
+    used = {p[1] for result in results for p in result.patterns if p[0] == "WASTE"}
+    groups = []
+    picks: List[Tuple[int, int]] = []  # (group, pattern)
+    for result in results:
+        shortest = min((length for p in result.patterns for _, length in p[3]), default=0)
+        overlap = group_overlap(result.key[0], shortest, request)
+        group = _Group(result, waste.get(result.key, []), request.scrap_threshold_mm, used, overlap)
+        picks.extend((len(groups), j) for j, p in enumerate(group.patterns) if p[0] == "WASTE")
+        groups.append(group)
+
+    occupied = Counter(positions[groups[g].patterns[j][1]] for g, j in picks
+                       if groups[g].patterns[j][1] in positions)
+    for _ in range(_MAX_PASSES):
+        moved = False
+        for g, j in picks:
+            group = groups[g]
+            here = positions.get(group.patterns[j][1])
+            if here is not None:
+                occupied[here] -= 1
+            best = _closer_offcut(group, j, here, occupied, positions, request, layout, slack_mm)
+            if best is not None:
+                group.swap(j, *best)
+                here = positions[best[1]]
+                moved = True
+            if here is not None:
+                occupied[here] += 1
+        if not moved:
+            break
+
+    # Substitutes are listed in their own color
+    colors = {waste_id: key[1] for key, rows in waste.items() for _, waste_id in rows}
+    stops: List[PickRow] = []
+    for g, j in picks:
+        profile_code, color = groups[g].result.key
+        _, waste_id, _, pieces, _ = groups[g].patterns[j]
+        stops.append((waste_id, locations.get(waste_id), profile_code, colors.get(waste_id, color),
+                      [order_id for order_id, _ in pieces]))
+    return [group.finish(request) for group in groups], walk_route(stops, layout)
+
+
+def walk_route(stops: List[PickRow], layout: Optional[WarehouseLayout] = None) -> PickRoute:
+    layout = layout if layout is not None else default_layout()
+    positions = [layout.position(stop[1]) for stop in stops]
+    order = layout.walk_order(positions)
+    return PickRoute([stops[i] for i in order],
+                     layout.route_length(positions[i] for i in order if positions[i] is not None))
+
+
+def closest_first(items: List[WasteItem], occupied: Counter, layout: WarehouseLayout,
+                  slack_mm: int = PICK_ROUTE_SLACK_MM) -> List[WasteItem]:
+    # items tightest first: moves the offcut closest to the occupied
+    # positions, among those within slack_mm of the tightest, to the front
+    best, best_cost = 0, None
+    for n, item in enumerate(items):
+        if item.length_mm - items[0].length_mm > slack_mm:
+            break
+        position = layout.position(item.location)
+        if position is None:
+            continue
+        cost = layout.nearest(position, occupied)
+        if best_cost is None or cost < best_cost:
+            best, best_cost = n, cost
+    return [items[best]] + items[:best] + items[best + 1:]
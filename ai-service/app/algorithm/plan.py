@@ -0,0 +1,206 @@
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from app.models.schema import (
+    CuttingPattern, OptimizationImprovement, OptimizationResponse, OptimizedCut, PatternPiece, PickStop
+)
+
+# Group plans travel between processes as plain tuples: pickling them is an
+# order of magnitude cheaper than pickling Pydantic models.
+
+# (order_id, required_length_mm, priority)
+OrderRow = Tuple[str, int, int]
+# An order and its quantity: groups carry demand, not one row per piece
+DemandRow = Tuple[OrderRow, int]
+# (length_mm, waste_id)
+WasteRow = Tuple[int, str]
+# (order_id, source_type, source_id, waste_created_mm, new bar length or None)
+CutRow = Tuple[str, str, Optional[str], int, Optional[int]]
+# (source_type, source_id, stock_length_mm, [(order_id, length_mm), ...], remnant_mm)
+PatternRow = Tuple[str, Optional[str], int, List[Tuple[str, int]], int]
+# (waste_id, location, profile_code, color, [order_id, ...])
+PickRow = Tuple[str, Optional[str], str, str, List[str]]
+
+
+def expand_demand(demand: Iterable[DemandRow]) -> List[OrderRow]:
+    # One row per piece, for the solvers that place pieces one at a time
+    rows: List[OrderRow] = []
+    for row, quantity in demand:
+        if quantity == 1:
+            rows.append(row)
+        else:
+            rows.extend([row] * quantity)
+    return rows
+
+
+def demand_lengths(demand: Iterable[DemandRow]) -> Iterator[int]:
+    # Piece lengths, one per piece
+    for row, quantity in demand:
+        for _ in range(quantity):
+            yield row[1]
+
+
+class GroupStats(NamedTuple):
+    # Solver instrumentation. Travels back with the plan because counters
+    # bumped inside a worker process would never reach the API's metrics.
+    solve_s: float = 0.0
+    virtual_scans: int = 0   # Lookups in the batch's own remnants
+    waste_scans: int = 0     # Lookups in warehouse waste
+    virtual_s: float = 0.0   # Greedy time per strategy
+    waste_s: float = 0.0
+    new_bar_s: float = 0.0
+
+
+class GroupResult(NamedTuple):
+    # Plan for one (profile, color) group. Groups are solved independently
+    # and merged in the order they first appear in the request.
+    key: tuple
+    cuts: List[CutRow]
+    patterns: List[PatternRow]
+    new_bars: int
+    scrap_mm: int
+    waste_used: int
+    stats: GroupStats = GroupStats()
+    new_bar_cost: float = 0.0
+    # (new_bars, new_bar_cost, scrap_mm) of the greedy plan an improved plan started from
+    baseline: Optional[Tuple[int, float, int]] = None
+
+
+class PickRoute(NamedTuple):
+    # Offcuts to fetch in walking order, and the walk from the saw and back
+    stops: List[PickRow]
+    distance: int
+
+
+class _Totals:
+    # Batch totals shared by build_response and iter_stream_chunks
+    __slots__ = ("new_bars", "new_bar_cost", "scrap", "waste_used", "baseline")
+
+    def __init__(self):
+        self.new_bars = 0
+        self.new_bar_cost = 0.0
+        self.scrap = 0
+        self.waste_used = 0
+        self.baseline: Optional[List] = None
+
+    def add(self, result: GroupResult) -> None:
+        self.new_bars += result.new_bars
+        self.new_bar_cost += result.new_bar_cost
+        self.scrap += result.scrap_mm
+        self.waste_used += result.waste_used
+        if result.baseline is not None:
+            if self.baseline is None:
+                self.baseline = [0, 0.0, 0]
+            for i, value in enumerate(result.baseline):
+                self.baseline[i] += value
+
+    def improvement(self) -> Optional[OptimizationImprovement]:
+        if self.baseline is None:
+            return None
+        bars, cost, scrap = self.baseline
+        return OptimizationImprovement(
+            baseline_new_bars_count=bars,
+            baseline_new_bar_cost=cost,
+            baseline_scrap_generated_mm=scrap,
+            new_bars_saved=bars - self.new_bars,
+            new_bar_cost_saved=cost - self.new_bar_cost,
+            scrap_saved_mm=scrap - self.scrap,
+        )
+
+
+def build_response(results: Iterable[GroupResult], scrap_threshold_mm: int,
+                   route: Optional[PickRoute] = None, with_patterns: bool = True) -> OptimizationResponse:
+    # with_patterns=False leaves the patterns out of the response, not out of the results
+    cuts: List[OptimizedCut] = []
+    patterns: List[CuttingPattern] = []
+    totals = _Totals()
+
+    # The only place the optimizer's rows become API models
+    for result in results:
+        profile_code, color = result.key
+        for order_id, source_type, source_id, remnant, bar_length in result.cuts:
+            cuts.append(OptimizedCut(
+                order_id=order_id,
+                source_type=source_type,
+                source_id=source_id,
+                waste_created_mm=remnant,
+                is_scrap=(remnant < scrap_threshold_mm and remnant > 0),
+                stock_length_mm=bar_length
+            ))
+        for source_type, source_id, stock_length, pieces, remnant in result.patterns if with_patterns else ():
+            patterns.append(CuttingPattern(
+                profile_code=profile_code,
+                color=color,
+                source_type=source_type,
+                source_id=source_id,
+                stock_length_mm=stock_length,
+                pieces=[PatternPiece(order_id=order_id, length_mm=length) for order_id, length in pieces],
+                remnant_mm=remnant,
+                is_scrap=(remnant < scrap_threshold_mm and remnant > 0)
+            ))
+        totals.add(result)
+
+    return OptimizationResponse(
+        cuts=cuts,
+        total_waste_used_count=totals.waste_used,
+        total_new_bars_count=totals.new_bars,
+        total_new_bar_cost=totals.new_bar_cost,
+        total_scrap_generated_mm=totals.scrap,
+        patterns=patterns,
+        improvement=totals.improvement(),
+        pick_route=[] if route is None else [
+            PickStop(waste_id=waste_id, location=location, profile_code=profile_code, color=color,
+                     order_ids=order_ids)
+            for waste_id, location, profile_code, color, order_ids in route.stops
+        ],
+        pick_route_distance=None if route is None else route.distance
+    )
+
+
+def iter_stream_chunks(results: Iterable[GroupResult], scrap_threshold_mm: int,
+                       with_patterns: bool = True) -> Iterator[List[Dict[str, Any]]]:
+    # Same content as build_response, as plain dicts: one chunk of "cut" and
+    # "pattern" records per finished group, then a chunk with the "summary"
+    totals = _Totals()
+    groups = 0
+
+    for result in results:
+        profile_code, color = result.key
+        chunk = []
+        for order_id, source_type, source_id, remnant, bar_length in result.cuts:
+            chunk.append({
+                "type": "cut",
+                "profile_code": profile_code,
+                "color": color,
+                "order_id": order_id,
+                "source_type": source_type,
+                "source_id": source_id,
+                "waste_created_mm": remnant,
+                "is_scrap": remnant < scrap_threshold_mm and remnant > 0,
+                "stock_length_mm": bar_length,
+            })
+        for source_type, source_id, stock_length, pieces, remnant in result.patterns if with_patterns else ():
+            chunk.append({
+                "type": "pattern",
+                "profile_code": profile_code,
+                "color": color,
+                "source_type": source_type,
+                "source_id": source_id,
+                "stock_length_mm": stock_length,
+                "pieces": [{"order_id": order_id, "length_mm": length} for order_id, length in pieces],
+                "remnant_mm": remnant,
+                "is_scrap": remnant < scrap_threshold_mm and remnant > 0,
+            })
+        totals.add(result)
+        groups += 1
+        yield chunk
+
+    improvement = totals.improvement()
+    yield [{
+        "type": "summary",
+        "groups": groups,
+        "total_waste_used_count": totals.waste_used,
+        "total_new_bars_count": totals.new_bars,
+        "total_new_bar_cost": totals.new_bar_cost,
+        "total_scrap_generated_mm": totals.scrap,
+        "improvement": improvement.model_dump() if improvement is not None else None,
+    }]
@@ -0,0 +1,158 @@
+"""Offcuts kept back for common sash lengths (RESERVE_WASTE_ENABLED).
+
+Every length in RESERVED_WASTE_LENGTHS is a class: offcuts within
+RESERVED_WASTE_TOLERANCE_MM of it are what a sash of that length is cut
+from. Per profile, each class holds back as many of its offcuts as the
+forecast demand for the class, the closest ones of whichever color; the
+rest of the class is free stock. Orders and queries of the class's own
+length release one held piece of their color each, the shortest held piece
+they can be cut from, so they can still be served from it.
+
+The demand forecast is computed once a day from the consumption history.
+With no history at all every offcut of a class is held back.
+"""
+import math
+import os
+from bisect import bisect_left
+from collections import Counter
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.algorithm.plan import DemandRow, WasteRow, demand_lengths
+from app.algorithm.shortage_forecast import CONSUMING_OPERATIONS, RECENT_WINDOW_DAYS, default_history
+from app.algorithm.waste_index import SortedWastePool
+from app.models.schema import ConsumptionEvent
+
+RESERVE_WASTE_ENABLED = os.getenv("RESERVE_WASTE_ENABLED", "false").strip().lower() == "true"
+RESERVED_WASTE_LENGTHS = [int(v) for v in os.getenv("RESERVED_WASTE_LENGTHS", "").split(",") if v.strip()]
+RESERVED_WASTE_TOLERANCE_MM = int(os.getenv("RESERVED_WASTE_TOLERANCE_MM", "10"))
+# Days of forecast demand each class keeps stock for
+RESERVATION_HORIZON_DAYS = int(os.getenv("RESERVATION_HORIZON_DAYS", "14"))
+
+
+class ReservationIndex:
+    def __init__(self, lengths: Iterable[int], tolerance_mm: int = RESERVED_WASTE_TOLERANCE_MM,
+                 demand: Optional[Dict[Tuple[str, int], int]] = None):
+        self.lengths = sorted(set(lengths))
+        self.tolerance_mm = tolerance_mm
+        # (profile_code, class length) -> pieces to hold; None holds every piece
+        self.demand = demand
+
+    def class_of(self, length_mm: int) -> Optional[int]:
+        # Nearest class within tolerance; a tie goes to the shorter class
+        i = bisect_left(self.lengths, length_mm)
+        best = None
+        for c in self.lengths[max(i - 1, 0):i + 1]:
+            if abs(c - length_mm) <= self.tolerance_mm and (best is None or abs(c - length_mm) < abs(best - length_mm)):
+                best = c
+        return best
+
+    def released(self, lengths: Iterable[int]) -> Dict[int, List[int]]:
+        # Lengths of the orders releasing a held piece, per class
+        by_class: Dict[int, List[int]] = {}
+        for length in lengths:
+            c = self.class_of(length)
+            if c is not None:
+                by_class.setdefault(c, []).append(length)
+        return by_class
+
+    def _held(self, profile_code: str, by_class: Dict[int, List[Tuple[int, Any, str]]],
+              released: Dict[str, Dict[int, List[int]]]) -> Set[Any]:
+        # by_class: (length, ref, color) of every color of the profile, so
+        # the profile's demand is held once, not once per color
+        held: Set[Any] = set()
+        for c, pieces in by_class.items():
+            keep = len(pieces) if self.demand is None else self.demand.get((profile_code, c), 0)
+            if keep <= 0:
+                continue
+            # The pieces closest to the class length are the ones worth keeping
+            pieces.sort(key=lambda p: (abs(p[0] - c), -p[0]))
+            kept_by_color: Dict[str, List[Tuple[int, Any]]] = {}
+            for length, ref, color in pieces[:keep]:
+                kept_by_color.setdefault(color, []).append((length, ref))
+            for color, kept in kept_by_color.items():
+                kept.sort()
+                # Longest order first, each freeing the shortest held piece
+                # of its own color it fits in
+                for length in sorted(released.get(color, {}).get(c, ()), reverse=True):
+                    i = bisect_left(kept, (length,))
+                    if i < len(kept):
+                        del kept[i]
+                held.update(ref for _, ref in kept)
+        return held
+
+    def held_rows(self, profile_code: str, rows: Dict[str, Iterable[WasteRow]],
+                  released: Dict[str, Dict[int, List[int]]]) -> Set[str]:
+        # Ids of the held pieces among a profile's (length_mm, id) rows per
+        # color; released: the releasing orders per color
+        by_class: Dict[int, List[Tuple[int, Any, str]]] = {}
+        for color, color_rows in rows.items():
+            for length, waste_id in color_rows:
+                c = self.class_of(length)
+                if c is not None:
+                    by_class.setdefault(c, []).append((length, waste_id, color))
+        return self._held(profile_code, by_class, released)
+
+    def held_in_pools(self, profile_code: str, pools: Dict[str, SortedWastePool],
+                      released: Dict[str, Dict[int, List[int]]]) -> Set[str]:
+        # Same on length-sorted pools of WasteItems: one range lookup per class and color
+        by_class: Dict[int, List[Tuple[int, Any, str]]] = {}
+        for c in self.lengths:
+            for color, pool in pools.items():
+                for length, item in pool.peek_range(c - self.tolerance_mm, c + self.tolerance_mm):
+                    if self.class_of(length) == c:
+                        by_class.setdefault(c, []).append((length, item.id, color))
+        return self._held(profile_code, by_class, released)
+
+
+def forecast_class_demand(events: Iterable[ConsumptionEvent], index: ReservationIndex, as_of: date,
+                          window_days: int = RECENT_WINDOW_DAYS,
+                          horizon_days: int = RESERVATION_HORIZON_DAYS) -> Dict[Tuple[str, int], int]:
+    # Pieces of each class taken over the recent window, scaled to the horizon
+    first_day = as_of - timedelta(days=window_days)
+    taken: Counter = Counter()
+    for event in events:
+        if event.operation_type not in CONSUMING_OPERATIONS or event.quantity_change >= 0:
+            continue
+        if not first_day <= event.timestamp.date() < as_of:
+            continue
+        c = index.class_of(event.length_mm)
+        if c is not None:
+            taken[(event.profile_code, c)] += -event.quantity_change
+    return {key: math.ceil(n * horizon_days / max(window_days, 1)) for key, n in taken.items()}
+
+
+@lru_cache(maxsize=1)
+def _reservations_on(as_of: date) -> Optional[ReservationIndex]:
+    if not RESERVE_WASTE_ENABLED or not RESERVED_WASTE_LENGTHS:
+        return None
+    index = ReservationIndex(RESERVED_WASTE_LENGTHS)
+    history = default_history()
+    if history:
+        index.demand = forecast_class_demand(history, index, as_of)
+    return index
+
+
+def default_reservations() -> Optional[ReservationIndex]:
+    # Rebuilt on the first call of each day, with that day's forecast
+    return _reservations_on(date.today())
+
+
+def withhold_reserved(orders: Dict[tuple, List[DemandRow]], waste: Dict[tuple, List[WasteRow]],
+                      index: Optional[ReservationIndex] = None) -> Dict[tuple, List[WasteRow]]:
+    # The batch's waste rows without the held pieces; the batch's own orders
+    # of a class release as many as they are
+    index = index if index is not None else default_reservations()
+    if index is None:
+        return waste
+    by_profile: Dict[str, Dict[str, List[WasteRow]]] = {}
+    for (profile_code, color), rows in waste.items():
+        by_profile.setdefault(profile_code, {})[color] = rows
+    held: Set[str] = set()
+    for profile_code, rows in by_profile.items():
+        released = {color: index.released(demand_lengths(orders.get((profile_code, color), ()))) for color in rows}
+        held |= index.held_rows(profile_code, rows, released)
+    if not held:
+        return waste
+    return {key: [w for w in rows if w[1] not in held] for key, rows in waste.items()}
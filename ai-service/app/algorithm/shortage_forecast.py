@@ -0,0 +1,155 @@
+import csv
+import os
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.models.schema import ConsumptionEvent, ShortagePredictionResponse
+
+# operation_logs export used when a request carries no history
+CONSUMPTION_HISTORY_PATH = os.getenv("CONSUMPTION_HISTORY_PATH", "")
+RECENT_WINDOW_DAYS = int(os.getenv("FORECAST_RECENT_WINDOW_DAYS", "14"))
+FORECAST_HORIZON_DAYS = int(os.getenv("FORECAST_HORIZON_DAYS", "365"))
+
+# Only stock leaving the warehouse for production counts as usage
+CONSUMING_OPERATIONS = frozenset({"TAKEN"})
+
+
+def risk_level(days_left: Optional[int]) -> str:
+    if days_left is None:
+        return "LOW"
+    if days_left <= 2:
+        return "CRITICAL"
+    if days_left <= 5:
+        return "HIGH"
+    if days_left <= 14:
+        return "MEDIUM"
+    return "LOW"
+
+
+def load_history_csv(path: str) -> List[ConsumptionEvent]:
+    # Columns as exported from operation_logs joined with inventory_items:
+    # operation_type, profile_code, quantity_change, length_mm, timestamp (ISO 8601)
+    with open(path, newline="", encoding="utf-8") as f:
+        return [
+            ConsumptionEvent(
+                operation_type=row["operation_type"],
+                profile_code=row["profile_code"],
+                quantity_change=int(row["quantity_change"]),
+                length_mm=int(row["length_mm"]),
+                timestamp=datetime.fromisoformat(row["timestamp"])
+            )
+            for row in csv.DictReader(f)
+        ]
+
+
+@lru_cache(maxsize=1)
+def _history_at(path: str, mtime_ns: int) -> List[ConsumptionEvent]:
+    return load_history_csv(path)
+
+
+def default_history() -> List[ConsumptionEvent]:
+    # Read again only when the export has been rewritten; callers must not change the list
+    try:
+        mtime_ns = os.stat(CONSUMPTION_HISTORY_PATH).st_mtime_ns if CONSUMPTION_HISTORY_PATH else None
+    except FileNotFoundError:
+        mtime_ns = None
+    if mtime_ns is None:
+        return []
+    return _history_at(CONSUMPTION_HISTORY_PATH, mtime_ns)
+
+
+def daily_usage_matrix(events: Iterable[ConsumptionEvent], profile_codes: Sequence[str],
+                       as_of: date, history_days: int) -> np.ndarray:
+    # (profiles, days) matrix of mm taken per day; column -1 is the day before as_of
+    row_of: Dict[str, int] = {code: i for i, code in enumerate(profile_codes)}
+    first_day = as_of - timedelta(days=history_days)
+    rows: List[int] = []
+    cols: List[int] = []
+    used_mm: List[int] = []
+    for event in events:
+        if event.operation_type not in CONSUMING_OPERATIONS or event.quantity_change >= 0:
+            continue
+        row = row_of.get(event.profile_code)
+        if row is None:
+            continue
+        col = (event.timestamp.date() - first_day).days
+        if 0 <= col < history_days:
+            rows.append(row)
+            cols.append(col)
+            used_mm.append(-event.quantity_change * event.length_mm)
+
+    usage = np.zeros((len(profile_codes), history_days), dtype=np.float64)
+    if rows:
+        np.add.at(usage, (np.asarray(rows), np.asarray(cols)), np.asarray(used_mm, dtype=np.float64))
+    return usage
+
+
+def forecast_days_left(usage: np.ndarray, stock_mm: np.ndarray, as_of: date,
+                       recent_window: int = RECENT_WINDOW_DAYS,
+                       horizon: int = FORECAST_HORIZON_DAYS) -> Tuple[np.ndarray, np.ndarray]:
+    """Days until stock runs out for every profile at once.
+
+    The daily rate is the recent rolling mean when there is recent usage,
+    otherwise the mean over the whole history. A day-of-week profile from
+    the history scales that rate along the horizon, so stock taken mostly on
+    weekdays does not drain over the weekend. Returns (days_left, rate),
+    with days_left -1 when stock lasts beyond the horizon.
+    """
+    n_profiles, n_days = usage.shape
+    if n_days == 0:
+        return np.full(n_profiles, -1, dtype=np.int64), np.zeros(n_profiles)
+
+    long_rate = usage.mean(axis=1)
+    recent_rate = usage[:, -min(recent_window, n_days):].mean(axis=1)
+    rate = np.where(recent_rate > 0, recent_rate, long_rate)
+
+    # Weekday of every history column, and mean usage per weekday
+    first_weekday = (as_of - timedelta(days=n_days)).weekday()
+    weekdays = (np.arange(n_days) + first_weekday) % 7
+    per_weekday = np.zeros((n_profiles, 7))
+    day_counts = np.bincount(weekdays, minlength=7)
+    for wd in range(7):
+        if day_counts[wd]:
+            per_weekday[:, wd] = usage[:, weekdays == wd].mean(axis=1)
+    seasonal = np.ones((n_profiles, 7))
+    np.divide(per_weekday, long_rate[:, None], out=seasonal, where=long_rate[:, None] > 0)
+    # Weekdays never seen in a short history keep factor 1
+    seasonal[:, day_counts == 0] = 1.0
+
+    # Day 0 is as_of itself
+    horizon_weekdays = (np.arange(horizon) + as_of.weekday()) % 7
+    projected = np.cumsum(rate[:, None] * seasonal[:, horizon_weekdays], axis=1)
+    runs_out = projected >= stock_mm[:, None]
+    days_left = np.where(runs_out.any(axis=1), runs_out.argmax(axis=1), -1)
+    # Nothing in stock: out today, whatever the usage
+    days_left = np.where(stock_mm <= 0, 0, days_left)
+    return days_left, rate
+
+
+def predict_shortages(stock: Sequence[Tuple[str, int]], events: Iterable[ConsumptionEvent],
+                      history_days: int, as_of: Optional[date] = None) -> List[ShortagePredictionResponse]:
+    # One response per (profile_code, current_stock_mm), in input order; a
+    # code listed twice gets the same usage row for each of its stock levels
+    as_of = as_of or date.today()
+    profile_codes = [code for code, _ in stock]
+    row_of = {code: i for i, code in enumerate(dict.fromkeys(profile_codes))}
+    usage = daily_usage_matrix(events, list(row_of), as_of, max(history_days, 1))
+    if len(row_of) < len(profile_codes):
+        usage = usage[[row_of[code] for code in profile_codes]]
+    stock_mm = np.asarray([mm for _, mm in stock], dtype=np.float64)
+    days_left, rate = forecast_days_left(usage, stock_mm, as_of)
+
+    predictions = []
+    for code, days, daily in zip(profile_codes, days_left.tolist(), rate.tolist()):
+        days = None if days < 0 else days
+        predictions.append(ShortagePredictionResponse(
+            profile_code=code,
+            predicted_stockout_date=as_of + timedelta(days=days) if days is not None else None,
+            risk_level=risk_level(days),
+            daily_usage_trend=daily,
+            days_left=days
+        ))
+    return predictions
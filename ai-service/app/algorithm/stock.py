@@ -0,0 +1,55 @@
+"""New-bar lengths and their costs per (profile, color) group.
+
+Without a catalog entry a group has a single option, the request's
+full_bar_length_mm at cost 1, so the cost of a plan is its bar count and
+every solver behaves as it did with one bar length.
+"""
+from typing import List, Sequence, Tuple
+
+from app.models.schema import OptimizationRequest
+
+# (capacity in kerf units, length_mm, cost), sorted by capacity
+StockOption = Tuple[int, int, float]
+
+
+def stock_options(request: OptimizationRequest, key: tuple) -> List[StockOption]:
+    profile_code, color = key
+    lengths = None
+    for entry in request.stock_catalog:
+        if entry.profile_code != profile_code:
+            continue
+        if entry.color == color:
+            lengths = entry.lengths
+            break
+        if entry.color is None and lengths is None:
+            lengths = entry.lengths
+    allowance = request.kerf_mm - request.end_trim_mm
+    if not lengths:
+        return [(request.full_bar_length_mm + allowance, request.full_bar_length_mm, 1.0)]
+    # Equal lengths listed twice: the cheaper price wins
+    best = {}
+    for s in lengths:
+        if s.length_mm not in best or s.cost < best[s.length_mm]:
+            best[s.length_mm] = s.cost
+    return sorted((length + allowance, length, cost) for length, cost in best.items())
+
+
+def pick_bar(options: Sequence[StockOption], required: int, demand: int) -> StockOption:
+    """The bar to open for a piece of `required` (kerf units).
+
+    demand is the length of all pieces still to place, this one included.
+    When one bar can take all of it, the cheapest such bar; otherwise the
+    fitting bar with the lowest cost per mm, so long runs go to the bars
+    that are cheapest by length. A piece longer than every bar gets the
+    longest one (negative remnant), as with a single bar length.
+    """
+    if len(options) == 1:
+        return options[0]
+    fitting = [o for o in options if o[0] >= required]
+    if not fitting:
+        return options[-1]
+    covering = [o for o in fitting if o[0] >= demand]
+    if covering:
+        # Ties go to the shorter bar: min keeps the first
+        return min(covering, key=lambda o: o[2])
+    return min(fitting, key=lambda o: o[2] / o[0])
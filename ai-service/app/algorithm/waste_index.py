@@ -0,0 +1,158 @@
+import heapq
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+class SortedWastePool:
+    """Pool of stock pieces kept sorted by length.
+
+    Pieces of equal length keep their insertion order, so "first smallest
+    piece that fits" matches a linear scan over a length-sorted list.
+    """
+
+    __slots__ = ("_lengths", "_items")
+
+    def __init__(self, entries: Iterable[Tuple[int, Any]] = ()):
+        # Stable sort: equal lengths stay in input order
+        ordered = sorted(entries, key=lambda e: e[0])
+        self._lengths: List[int] = [e[0] for e in ordered]
+        self._items: List[Any] = [e[1] for e in ordered]
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, length: int, item: Any) -> None:
+        # bisect_right places the piece after existing pieces of the same length
+        i = bisect_right(self._lengths, length)
+        self._lengths.insert(i, length)
+        self._items.insert(i, item)
+
+    def _pop(self, i: int) -> Tuple[int, Any]:
+        length = self._lengths.pop(i)
+        return length, self._items.pop(i)
+
+    def pop_best_fit(self, required_mm: int) -> Optional[Tuple[int, Any]]:
+        # Smallest piece with length >= required_mm
+        i = bisect_left(self._lengths, required_mm)
+        if i == len(self._lengths):
+            return None
+        return self._pop(i)
+
+    def pop_avoiding_bad_offcut(self, required_mm: int, scrap_threshold_mm: int,
+                                min_usable_offcut_mm: int) -> Optional[Tuple[int, Any]]:
+        # Remnants in (scrap_threshold, min_usable) are "bad offcuts": too long
+        # to throw away, too short to store. On a length-sorted pool that band
+        # is a contiguous slice, so the choice is:
+        #   1. tightest fit if its remnant is scrap-sized (<= scrap_threshold)
+        #   2. else the first piece leaving a usable remnant (>= min_usable)
+        #   3. else the tightest fit, even though it leaves a bad offcut
+        n = len(self._lengths)
+        i = bisect_left(self._lengths, required_mm)
+        if i == n:
+            return None
+        if self._lengths[i] - required_mm <= scrap_threshold_mm:
+            return self._pop(i)
+        if min_usable_offcut_mm > scrap_threshold_mm:
+            j = bisect_left(self._lengths, required_mm + min_usable_offcut_mm, i)
+            if j < n:
+                return self._pop(j)
+            return self._pop(i)
+        # Empty bad band: every remnant is either scrap or usable
+        return self._pop(i)
+
+    def remove(self, length: int, item: Any) -> bool:
+        # Only pieces of exactly this length can match; identity picks the one
+        i = bisect_left(self._lengths, length)
+        while i < len(self._lengths) and self._lengths[i] == length:
+            if self._items[i] is item:
+                self._pop(i)
+                return True
+            i += 1
+        return False
+
+    def items(self) -> List[Any]:
+        # Shortest first
+        return list(self._items)
+
+    def peek_fits(self, required_mm: int, k: int) -> List[Tuple[int, Any]]:
+        # Up to k tightest pieces with length >= required_mm, without removing them
+        i = bisect_left(self._lengths, required_mm)
+        return list(zip(self._lengths[i:i + k], self._items[i:i + k]))
+
+    def peek_range(self, low_mm: int, high_mm: int) -> List[Tuple[int, Any]]:
+        # Pieces with low_mm <= length <= high_mm, without removing them
+        i = bisect_left(self._lengths, low_mm)
+        j = bisect_right(self._lengths, high_mm, i)
+        return list(zip(self._lengths[i:j], self._items[i:j]))
+
+
+class WasteIndex:
+    """Waste items hashed by (profile_code, color), each group sorted by length."""
+
+    __slots__ = ("_pools",)
+
+    def __init__(self, items: Iterable[Any] = ()):
+        grouped: Dict[tuple, List[Tuple[int, Any]]] = {}
+        for item in items:
+            grouped.setdefault((item.profile_code, item.color), []).append((item.length_mm, item))
+        self._pools: Dict[tuple, SortedWastePool] = {key: SortedWastePool(entries) for key, entries in grouped.items()}
+
+    def add(self, item: Any) -> None:
+        key = (item.profile_code, item.color)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = SortedWastePool()
+        pool.add(item.length_mm, item)
+
+    def remove(self, item: Any) -> bool:
+        key = (item.profile_code, item.color)
+        pool = self._pools.get(key)
+        if pool is None or not pool.remove(item.length_mm, item):
+            return False
+        if not len(pool):
+            del self._pools[key]
+        return True
+
+    def pool(self, profile_code: str, color: str) -> Optional[SortedWastePool]:
+        return self._pools.get((profile_code, color))
+
+    def items_for(self, profile_code: str, color: str) -> List[Any]:
+        pool = self._pools.get((profile_code, color))
+        return pool.items() if pool is not None else []
+
+    def colors_of(self, profile_code: str) -> List[str]:
+        return [color for profile, color in self._pools if profile == profile_code]
+
+    def best_fits(self, profile_code: str, color: str, required_mm: int, k: int = 1,
+                  reservations: Optional[Any] = None, core_colors: Optional[Any] = None,
+                  penalty_mm: int = 0) -> List[Any]:
+        # reservations: a ReservationIndex whose held pieces are skipped
+        # core_colors: a CoreColorIndex; pieces of colors with the same core
+        # also fit, ranked as if penalty_mm longer
+        colors = [color]
+        if core_colors is not None:
+            colors += core_colors.substitutes(color, self.colors_of(profile_code))
+        held = set()
+        if reservations is not None:
+            # The hold is shared by every color of the profile
+            released = reservations.released([required_mm])
+            pools = {c: pool for (profile, c), pool in self._pools.items() if profile == profile_code}
+            held = reservations.held_in_pools(profile_code, pools, {c: released for c in colors})
+        fits = self._pool_fits(profile_code, color, required_mm, k, held)
+        if core_colors is None:
+            return [item for _, item in fits]
+        ranked = [(length, n, item) for n, (length, item) in enumerate(fits)]
+        for substitute in colors[1:]:
+            for length, item in self._pool_fits(profile_code, substitute, required_mm, k, held):
+                ranked.append((length + penalty_mm, len(ranked), item))
+        return [item for *_, item in heapq.nsmallest(k, ranked)]
+
+    def _pool_fits(self, profile_code: str, color: str, required_mm: int, k: int,
+                   held: Set[Any]) -> List[Tuple[int, Any]]:
+        pool = self._pools.get((profile_code, color))
+        if pool is None:
+            return []
+        if not held:
+            return pool.peek_fits(required_mm, k)
+        fits = pool.peek_fits(required_mm, k + len(held))
+        return [fit for fit in fits if fit[1].id not in held][:k]
@@ -1,207 +1,403 @@
-from typing import List, Dict, Optional, Tuple
-from app.models.schema import OptimizationRequest, OptimizationResponse, OptimizedCut, WasteItem, OrderItem
-import uuid
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from multiprocessing import get_context
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from app.models.schema import OptimizationRequest, OptimizationResponse, WasteItem
+from app.algorithm.waste_index import SortedWastePool
+from app.algorithm.cutting_stock import (
+    DEFAULT_TIME_LIMIT_MS, improve_cutting_stock_group, repair_cutting_stock_group, solve_cutting_stock_group,
+    solve_demand_vector
+)
+from app.algorithm.plan import (
+    CutRow, DemandRow, GroupResult, GroupStats, OrderRow, PatternRow, WasteRow, build_response, expand_demand
+)
+from app.algorithm.allowances import real_remnant, waste_capacities
+from app.algorithm.stock import pick_bar, stock_options
+from app.algorithm.reservations import withhold_reserved
+from app.algorithm.pick_route import locations_of, route_picks
+from app.algorithm.miters import group_overlap, nest_patterns, nest_rows, unnest_result
+from app.algorithm.color_substitution import (
+    core_colored_groups, default_core_colors, lend_offcuts, substitution_gain
+)
+from app import metrics
+import time
 
-def optimize_batch_cutting(request: OptimizationRequest) -> OptimizationResponse:
-    # 1. Group Orders by (Profile, Color)
-    grouped_orders = {}
-    for order in request.orders:
-        key = (order.profile_code, order.color)
-        if key not in grouped_orders:
-            grouped_orders[key] = []
-        grouped_orders[key].append(order)
+# Worker processes for per-group optimization; 1 keeps everything in-process
+DEFAULT_WORKERS = int(os.getenv("OPTIMIZER_WORKERS", "1"))
+# Size of the shared pool and upper bound on any request's workers; 0 = core count
+MAX_WORKERS = int(os.getenv("OPTIMIZER_MAX_WORKERS", "0")) or (os.cpu_count() or 1)
 
-    # 2. Prepare Waste Pool (Mutable)
-    # Map: (Profile, Color) -> List[WasteItem]
-    waste_pool: Dict[tuple, List[WasteItem]] = {}
-    for waste in request.available_waste:
-        key = (waste.profile_code, waste.color)
-        if key not in waste_pool:
-            waste_pool[key] = []
-        waste_pool[key].append(waste)
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    # One long-lived pool for every request; "spawn" because the API process runs threads
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=get_context("spawn"))
+        return _executor
 
-    cuts: List[OptimizedCut] = []
+
+def shutdown_executors() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(cancel_futures=True)
+            _executor = None
+
+
+def _pool_map(fn: Callable, tasks: List[tuple], limit: int) -> Iterator:
+    # Results in task order, with at most `limit` of the request's tasks in
+    # the shared pool at a time; closing the iterator cancels the rest
+    executor = _get_executor()
+    remaining = iter(tasks)
+    pending = deque(executor.submit(fn, task) for task in islice(remaining, limit))
+    try:
+        while pending:
+            result = pending.popleft().result()
+            for task in islice(remaining, 1):
+                pending.append(executor.submit(fn, task))
+            yield result
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def resolve_workers(requested: Optional[int]) -> int:
+    workers = DEFAULT_WORKERS if requested is None else requested
+    if workers <= 0:
+        workers = MAX_WORKERS
+    return min(workers, MAX_WORKERS)
+
+
+def _greedy_group(key: tuple, orders: List[OrderRow], waste: List[WasteRow],
+                  request: OptimizationRequest) -> GroupResult:
+    # The plan comes back as patterns too: they seed the local search, and
+    # the pick route and plan deltas work on them
+    cuts: List[CutRow] = []
     total_new_bars = 0
+    new_bar_cost = 0.0
     total_scrap = 0
     waste_used_count = 0
+
+    # Sort orders: Priority (High to Low), then Length (Long to Short)
+    # Longest items are hardest to fit, so place them first.
+    orders.sort(key=lambda x: (-x[2], -x[1]))
     
-    # 3. Process each group
-    for key, orders in grouped_orders.items():
-        profile_code, color = key
-        
-        # Sort orders: Priority (High to Low), then Length (Long to Short)
-        # Longest items are hardest to fit, so place them first.
-        orders.sort(key=lambda x: (-x.priority, -x.required_length_mm))
+    # Lengths below are in kerf units (see allowances): pieces carry one
+    # kerf, stock its trimmed length plus one kerf. Cut rows, scrap and
+    # threshold checks use the real remnant.
+    kerf_mm = request.kerf_mm
+    end_trim_mm = request.end_trim_mm
+
+    # Get relevant waste, indexed by length - Best Fit strategy
+    available_waste = SortedWastePool(waste_capacities(waste, end_trim_mm, kerf_mm))
+    
+    # Track "Open" New Bars (Virtual waste created during this batch)
+    # These are treated as high priority to use up immediately.
+    # Remnants live only in this loop; their id is the index of the stock
+    # piece they belong to in `sources`.
+    virtual_waste = SortedWastePool()
+    # Stock pieces cut so far: [source_type, source_id, stock_length_mm, pieces, left]
+    sources: List[list] = []
+
+    scrap_threshold_mm = request.scrap_threshold_mm
+    min_usable_offcut_mm = request.min_usable_offcut_mm
+    bar_options = stock_options(request, key)
+    # Length of the orders not yet cut, this one included: decides which bar length to open
+    demand = sum(o[1] for o in orders) + kerf_mm * len(orders)
+
+    # Per-strategy timing for /metrics; three clock reads per order at most
+    clock = time.perf_counter
+    virtual_s = waste_s = new_bar_s = 0.0
+    waste_scans = 0
+    solve_start = clock()
+
+    for order_id, required_length_mm, _ in orders:
+        matched_cut = None
+        required = required_length_mm + kerf_mm
         
-        # Get relevant waste
-        available_waste = waste_pool.get(key, [])
-        # Sort waste by length (Ascending) - Best Fit strategy
-        available_waste.sort(key=lambda x: x.length_mm)
+        # --- STRATEGY A: Try Virtual Waste (Remnants from new bars in this batch) ---
+        # Tightest remnant wins, ties go to the oldest remnant
+        t0 = clock()
+        virtual_match = virtual_waste.pop_best_fit(required)
         
-        # Track "Open" New Bars (Virtual waste created during this batch)
-        # These are treated as high priority to use up immediately
-        virtual_waste: List[WasteItem] = []
-
-        for order in orders:
-            matched_cut = None
+        if virtual_match is not None:
+            # Use Virtual Waste
+            source_length, source = virtual_match
+            left = source_length - required
+            remnant = real_remnant(left, kerf_mm)
+            sources[source][3].append((order_id, required_length_mm))
+            sources[source][4] = left
             
-            # --- STRATEGY A: Try Virtual Waste (Remnants from new bars in this batch) ---
-            best_virtual_idx = -1
-            min_remnant_v = float('inf')
+            # Technically from a new bar opened in this batch
+            matched_cut = (order_id, "NEW_BAR_REMNANT", None, remnant, None)
             
-            for i, item in enumerate(virtual_waste):
-                if item.length_mm >= order.required_length_mm:
-                    remnant = item.length_mm - order.required_length_mm
-                    # We want to minimize remnant to pack tightly
-                    if remnant < min_remnant_v:
-                        min_remnant_v = remnant
-                        best_virtual_idx = i
+            # If remnant is usable, add back to virtual waste
+            if remnant > 0:
+                 if remnant >= scrap_threshold_mm:
+                     # Keep using this bar if possible
+                     virtual_waste.add(left, source)
+                 else:
+                     total_scrap += remnant
+            virtual_s += clock() - t0
+
+        else:
+            t1 = clock()
+            virtual_s += t1 - t0
+            # --- STRATEGY B: Try Physical Waste (Warehouse) ---
+            # Definition of "Bad Offcut":
+            # A piece that is too short to be usable, but too long to be just scrap (wasteful).
+            #  - Scrap: 0 to scrap_threshold
+            #  - Usable: > min_usable_offcut
+            #  - Bad/Wasteful: scrap_threshold to min_usable_offcut
+            # We prefer:
+            # 1. Not Bad (Usable or Scrap)
+            # 2. Smallest remnant (Best Fit)
+            # Getting rid of existing waste is good, but creating a NEW bad
+            # offcut from it is only accepted when nothing better fits.
+            waste_scans += 1
+            waste_match = available_waste.pop_avoiding_bad_offcut(
+                required,
+                scrap_threshold_mm + kerf_mm,
+                min_usable_offcut_mm + kerf_mm
+            )
             
-            if best_virtual_idx != -1:
-                # Use Virtual Waste
-                source_item = virtual_waste.pop(best_virtual_idx)
-                remnant = source_item.length_mm - order.required_length_mm
+            if waste_match is not None:
+                # Use Physical Waste
+                source_length, source_id = waste_match
+                left = source_length - required
+                remnant = real_remnant(left, kerf_mm)
                 
-                matched_cut = OptimizedCut(
-                    order_id=order.order_id,
-                    source_type="NEW_BAR_REMNANT", # Technically from a new bar opened in this batch
-                    source_id=None, 
-                    waste_created_mm=remnant,
-                    is_scrap=(remnant < request.scrap_threshold_mm and remnant > 0)
-                )
+                matched_cut = (order_id, "WASTE", source_id, remnant, None)
+                waste_used_count += 1
+                source = len(sources)
+                sources.append(["WASTE", source_id, source_length - kerf_mm + end_trim_mm,
+                                [(order_id, required_length_mm)], left])
                 
-                # If remnant is usable, add back to virtual waste
                 if remnant > 0:
-                     if remnant >= request.scrap_threshold_mm:
-                         # Keep using this bar if possible
-                         new_virtual = WasteItem(
-                             id=f"virt-{uuid.uuid4()}",
-                             location="PRODUCTION_LINE",
-                             length_mm=remnant,
-                             profile_code=profile_code,
-                             color=color
-                         )
-                         virtual_waste.append(new_virtual)
-                     else:
-                         total_scrap += remnant
+                    if remnant < scrap_threshold_mm:
+                        total_scrap += remnant
+                    # If it's a large remnant, technically it goes back to stock, 
+                    # but in this batch logic we assume it's output.
+                    # We don't add it to virtual_waste usually because it's already "cut".
+                    # But for optimization, we COULD treat it as available for next cuts?
+                    # Let's assume physical waste is "One Shot" for simplicity in this version,
+                    # or add it to virtual if you want to multi-cut a long waste piece.
+                    # Let's add to virtual to allow multi-cut of long waste!
+                    elif remnant >= min_usable_offcut_mm:
+                         virtual_waste.add(left, source)
+                waste_s += clock() - t1
 
             else:
-                # --- STRATEGY B: Try Physical Waste (Warehouse) ---
-                best_waste_idx = -1
-                min_remnant_w = float('inf')
-                best_is_bad_offcut = True # Initialize as worst case
+                # Lookup miss still counts as warehouse time
+                t2 = clock()
+                waste_s += t2 - t1
+                # --- STRATEGY C: Open New Bar ---
+                bar_capacity, bar_length_mm, bar_cost = pick_bar(bar_options, required, demand)
+                total_new_bars += 1
+                new_bar_cost += bar_cost
+                left = bar_capacity - required
+                remnant = real_remnant(left, kerf_mm)
                 
-                for i, item in enumerate(available_waste):
-                    if item.length_mm >= order.required_length_mm:
-                        remnant = item.length_mm - order.required_length_mm
-                        
-                        # Definition of "Bad Offcut":
-                        # A piece that is too short to be usable, but too long to be just scrap (wasteful).
-                        # Or strictly: usable > remnant > scrap_threshold (if we consider that range 'bad')
-                        # Usually: 
-                        #  - Scrap: 0 to scrap_threshold
-                        #  - Usable: > min_usable_offcut
-                        #  - Bad/Wasteful: scrap_threshold to min_usable_offcut
-                        
-                        is_bad = (remnant > request.scrap_threshold_mm and remnant < request.min_usable_offcut_mm)
-                        
-                        # We prefer:
-                        # 1. Not Bad (Usable or Scrap)
-                        # 2. Smallest remnant (Best Fit)
-                        
-                        if not is_bad:
-                            if best_is_bad_offcut:
-                                # Found our first "Good" match, take it
-                                best_waste_idx = i
-                                min_remnant_w = remnant
-                                best_is_bad_offcut = False
-                            else:
-                                # Already have a good match, check if this is tighter
-                                if remnant < min_remnant_w:
-                                    best_waste_idx = i
-                                    min_remnant_w = remnant
-                        
-                        else:
-                            # It is bad. Only take it if we have no "Good" matches yet and it's the tightest bad one?
-                            # Or maybe avoid bad matches entirely if possible?
-                            # Let's say we avoid bad matches from WASTE unless forced? 
-                            # Actually, for existing waste, getting rid of it is good.
-                            # But creating a NEW bad offcut from existing waste is bad.
-                            if best_is_bad_offcut:
-                                if remnant < min_remnant_w:
-                                    best_waste_idx = i
-                                    min_remnant_w = remnant
+                matched_cut = (order_id, "NEW_BAR", None, remnant, bar_length_mm)
+                source = len(sources)
+                sources.append(["NEW_BAR", None, bar_length_mm, [(order_id, required_length_mm)], left])
                 
-                if best_waste_idx != -1:
-                    # Use Physical Waste
-                    source_item = available_waste.pop(best_waste_idx)
-                    remnant = source_item.length_mm - order.required_length_mm
-                    
-                    matched_cut = OptimizedCut(
-                        order_id=order.order_id,
-                        source_type="WASTE",
-                        source_id=source_item.id,
-                        waste_created_mm=remnant,
-                        is_scrap=(remnant < request.scrap_threshold_mm and remnant > 0)
-                    )
-                    waste_used_count += 1
-                    
-                    if remnant > 0:
-                        if remnant < request.scrap_threshold_mm:
-                            total_scrap += remnant
-                        # If it's a large remnant, technically it goes back to stock, 
-                        # but in this batch logic we assume it's output.
-                        # We don't add it to virtual_waste usually because it's already "cut".
-                        # But for optimization, we COULD treat it as available for next cuts?
-                        # Let's assume physical waste is "One Shot" for simplicity in this version,
-                        # or add it to virtual if you want to multi-cut a long waste piece.
-                        # Let's add to virtual to allow multi-cut of long waste!
-                        elif remnant >= request.min_usable_offcut_mm:
-                             new_virtual = WasteItem(
-                                 id=f"rem-{source_item.id}",
-                                 location="PRODUCTION_LINE",
-                                 length_mm=remnant,
-                                 profile_code=profile_code,
-                                 color=color
-                             )
-                             virtual_waste.append(new_virtual)
-
-                else:
-                    # --- STRATEGY C: Open New Bar ---
-                    total_new_bars += 1
-                    remnant = request.full_bar_length_mm - order.required_length_mm
-                    
-                    matched_cut = OptimizedCut(
-                        order_id=order.order_id,
-                        source_type="NEW_BAR",
-                        source_id=None,
-                        waste_created_mm=remnant,
-                        is_scrap=(remnant < request.scrap_threshold_mm and remnant > 0)
-                    )
-                    
-                    if remnant > 0:
-                         if remnant >= request.scrap_threshold_mm:
-                             # Add to virtual waste to be used by subsequent orders
-                             new_virtual = WasteItem(
-                                 id=f"newbar-{total_new_bars}",
-                                 location="PRODUCTION_LINE",
-                                 length_mm=remnant,
-                                 profile_code=profile_code,
-                                 color=color
-                             )
-                             virtual_waste.append(new_virtual)
-                         else:
-                             total_scrap += remnant
-
-            if matched_cut:
-                cuts.append(matched_cut)
-            else:
-                # Should not happen with New Bar strategy unless order > full_bar_length
-                pass
-
-    return OptimizationResponse(
-        cuts=cuts,
-        total_waste_used_count=waste_used_count,
-        total_new_bars_count=total_new_bars,
-        total_scrap_generated_mm=total_scrap
-    )
+                if remnant > 0:
+                     if remnant >= scrap_threshold_mm:
+                         # Add to virtual waste to be used by subsequent orders
+                         virtual_waste.add(left, source)
+                     else:
+                         total_scrap += remnant
+                new_bar_s += clock() - t2
+
+        demand -= required
+        if matched_cut:
+            cuts.append(matched_cut)
+        else:
+            # Should not happen with New Bar strategy unless order > full_bar_length
+            pass
+
+    stats = GroupStats(clock() - solve_start, len(orders), waste_scans, virtual_s, waste_s, new_bar_s)
+    patterns = [(t, i, length, pieces, real_remnant(left, kerf_mm)) for t, i, length, pieces, left in sources]
+    return GroupResult(key, cuts, patterns, total_new_bars, total_scrap, waste_used_count, stats, new_bar_cost)
+
+
+def _shortest(demand: List[DemandRow]) -> int:
+    return min(row[1] for row, _ in demand)
+
+
+def _solve_group(task: Tuple[tuple, List[DemandRow], List[WasteRow], OptimizationRequest, float]) -> GroupResult:
+    # Top-level so it can be shipped to worker processes
+    key, demand, waste, settings, budget_s = task
+    deadline = time.perf_counter() + budget_s
+    overlap = group_overlap(key[0], _shortest(demand), settings) if demand else 0
+    if not overlap:
+        return _solve_rows(key, demand, waste, settings, deadline)
+    # Mitered pieces share diagonals: solved in nested units (see miters)
+    demand, waste, nested = nest_rows(demand, waste, settings, overlap)
+    return unnest_result(_solve_rows(key, demand, waste, nested, deadline), overlap)
+
+
+def _solve_rows(key: tuple, demand: List[DemandRow], waste: List[WasteRow], settings: OptimizationRequest,
+                deadline: float) -> GroupResult:
+    if settings.algorithm == "pattern":
+        return solve_demand_vector(key, demand, waste, settings)
+    # The other solvers place pieces one by one
+    orders = expand_demand(demand)
+    if settings.algorithm == "greedy":
+        return _greedy_group(key, orders, waste, settings)
+    if settings.algorithm == "local":
+        # Greedy sorts its list in place; the search needs the rows as given
+        baseline = _greedy_group(key, list(orders), waste, settings)
+        return improve_cutting_stock_group(baseline, orders, waste, settings, deadline)
+    return solve_cutting_stock_group(key, orders, waste, settings, deadline)
+
+
+def group_rows(request: OptimizationRequest, reserve: bool = True
+               ) -> Tuple[Dict[tuple, List[DemandRow]], Dict[tuple, List[WasteRow]]]:
+    # reserve=False keeps the held offcuts in the pool, for callers that
+    # withhold them themselves
+    # 1. Group Orders by (Profile, Color), each with its quantity
+    grouped_orders: Dict[tuple, List[DemandRow]] = {}
+    for order in request.orders:
+        key = (order.profile_code, order.color)
+        if key not in grouped_orders:
+            grouped_orders[key] = []
+        grouped_orders[key].append(((order.order_id, order.required_length_mm, order.priority), order.quantity))
+
+    # 2. Prepare Waste Pool (Mutable), without offcuts held for reserved lengths
+    waste = waste_rows(request.available_waste or ())
+    return grouped_orders, withhold_reserved(grouped_orders, waste) if reserve else waste
+
+
+def waste_rows(items: Iterable[WasteItem]) -> Dict[tuple, List[WasteRow]]:
+    # Map: (Profile, Color) -> List[(length_mm, id)]
+    waste_pool: Dict[tuple, List[WasteRow]] = {}
+    for waste in items:
+        key = (waste.profile_code, waste.color)
+        if key not in waste_pool:
+            waste_pool[key] = []
+        waste_pool[key].append((waste.length_mm, waste.id))
+    return waste_pool
+
+
+def lists_patterns(request: OptimizationRequest) -> bool:
+    # Greedy keeps its patterns for plan deltas and the local search; its
+    # responses list them only when asked, as they would double the payload
+    return request.algorithm != "greedy" or request.pick_route or request.include_patterns
+
+
+def batch_settings(request: OptimizationRequest) -> OptimizationRequest:
+    # The request without its payload: what every group solver needs
+    return request.model_copy(update={"orders": [], "available_waste": []})
+
+
+def solve_group(key: tuple, demand: List[DemandRow], waste: List[WasteRow], settings: OptimizationRequest,
+                budget_s: float) -> GroupResult:
+    # One group in the calling process; the caller's lists are left untouched
+    result = _solve_group((key, list(demand), list(waste), settings, budget_s))
+    metrics.observe_group(settings.algorithm, result, len(demand))
+    return result
+
+
+def repair_group(key: tuple, previous: List[PatternRow], demand: List[DemandRow], waste: List[WasteRow],
+                 settings: OptimizationRequest) -> GroupResult:
+    # repair_cutting_stock_group, in nested units for mitered groups
+    overlap = group_overlap(key[0], _shortest(demand), settings) if demand else 0
+    if not overlap:
+        return repair_cutting_stock_group(key, previous, expand_demand(demand), waste, settings)
+    demand, waste, nested = nest_rows(demand, waste, settings, overlap)
+    result = repair_cutting_stock_group(key, nest_patterns(previous, overlap), expand_demand(demand), waste, nested)
+    return unnest_result(result, overlap)
+
+
+def iter_group_results(request: OptimizationRequest, use_pool: bool = False,
+                       progress: Optional[Callable[[int, int], None]] = None,
+                       grouped: Optional[Tuple[Dict[tuple, List[DemandRow]], Dict[tuple, List[WasteRow]]]] = None
+                       ) -> Iterator[GroupResult]:
+    # grouped: group_rows(request), when the caller keeps the rows
+    grouped_orders, waste_pool = grouped if grouped is not None else group_rows(request)
+
+    # 3. Process each group. Groups share nothing, so they can run in
+    # separate processes; map() keeps results in group order either way.
+    workers = min(resolve_workers(request.workers), len(grouped_orders))
+    time_limit_s = (request.time_limit_ms if request.time_limit_ms is not None else DEFAULT_TIME_LIMIT_MS) / 1000.0
+    # Solver budget per group: groups run `workers` at a time
+    budget_s = time_limit_s * max(workers, 1) / max(len(grouped_orders), 1)
+    # Tasks carry only their own group; the shared settings travel without the payload
+    settings = batch_settings(request)
+    # Greedy sorts its orders in place; tasks get their own lists
+    tasks = [
+        (key, list(orders), waste_pool.get(key, []), settings, budget_s)
+        for key, orders in grouped_orders.items()
+    ]
+    # use_pool moves even single-worker solving off the calling process,
+    # e.g. for background jobs that must not hold the API's GIL
+    pooled = workers > 1 or use_pool
+    workers = max(workers, 1)
+
+    def solve_all(batch: List[tuple]) -> Iterable[GroupResult]:
+        if batch and pooled:
+            return _pool_map(_solve_group, batch, workers)
+        return map(_solve_group, batch)
+
+    results = solve_all(tasks)
+    # Core-colored groups can borrow offcuts of other colors, once every
+    # group's own plan shows which offcuts are left
+    borrowers = core_colored_groups(request.profile_specs)
+    index = default_core_colors() if borrowers else None
+    if index is not None:
+        solved = []
+        for done, result in enumerate(results, 1):
+            if progress is not None:
+                progress(done, len(tasks))
+            solved.append(result)
+        results = _borrow_offcuts(solved, grouped_orders, waste_pool, borrowers, index, settings, budget_s,
+                                  solve_all)
+        progress = None
+
+    for done, result in enumerate(results, 1):
+        # Recorded here, in the API process, whichever process solved the group
+        metrics.observe_group(request.algorithm, result, len(grouped_orders[result.key]))
+        if progress is not None:
+            # May raise to abandon the batch; pending pool tasks are cancelled
+            progress(done, len(tasks))
+        yield result
+
+
+def _borrow_offcuts(solved: List[GroupResult], grouped_orders: Dict[tuple, List[DemandRow]],
+                    waste_pool: Dict[tuple, List[WasteRow]], borrowers, index, settings: OptimizationRequest,
+                    budget_s: float, solve_all) -> List[GroupResult]:
+    # Groups that were lent offcuts are solved again with them; the new plan
+    # replaces the old one only if it beats it after the substitution penalty
+    lent = lend_offcuts(solved, waste_pool, borrowers, index)
+    if not lent:
+        return solved
+    tasks = [
+        (key, list(grouped_orders[key]), waste_pool.get(key, []) + rows, settings, budget_s)
+        for key, rows in lent.items()
+    ]
+    position = {result.key: i for i, result in enumerate(solved)}
+    for result in solve_all(tasks):
+        i = position[result.key]
+        if substitution_gain(solved[i], result, (w[1] for w in lent[result.key])):
+            solved[i] = result
+    return solved
+
+
+def optimize_batch_cutting(request: OptimizationRequest, use_pool: bool = False,
+                           progress: Optional[Callable[[int, int], None]] = None) -> OptimizationResponse:
+    if not request.pick_route:
+        return build_response(iter_group_results(request, use_pool, progress), request.scrap_threshold_mm,
+                              with_patterns=lists_patterns(request))
+    grouped = group_rows(request)
+    results, route = route_picks(iter_group_results(request, use_pool, progress, grouped), grouped[1],
+                                 locations_of(request.available_waste), request)
+    return build_response(results, request.scrap_threshold_mm, route, lists_patterns(request))
@@ -0,0 +1,137 @@
+import heapq
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from app.algorithm.color_substitution import CORE_COLOR_PENALTY_MM, CoreColorIndex
+from app.algorithm.pick_route import WarehouseLayout, closest_first, walk_route
+from app.algorithm.plan import PickRoute
+from app.algorithm.reservations import ReservationIndex
+from app.algorithm.waste_index import WasteIndex
+from app.models.schema import WasteCandidate, WasteItem, WasteRecommendationQuery, WasteRecommendationResponse
+
+
+def tightest_fits(items: Iterable[WasteItem], profile_code: str, color: str,
+                  required_mm: int, k: int, reservations: Optional[ReservationIndex] = None,
+                  core_colors: Optional[CoreColorIndex] = None) -> List[WasteItem]:
+    # Inline payloads are not indexed: one filtering pass is cheaper than
+    # sorting a list that is used once. nsmallest is stable, so equal lengths
+    # keep payload order, like the sorted index does.
+    if reservations is None and core_colors is None:
+        fitting = (
+            item for item in items
+            if item.profile_code == profile_code and item.color == color and item.length_mm >= required_mm
+        )
+        return heapq.nsmallest(k, fitting, key=lambda item: item.length_mm)
+
+    # With core_colors, offcuts of colors with the same core rank as if
+    # CORE_COLOR_PENALTY_MM longer. Each color is looked up once.
+    penalties = {color: 0}
+    groups: Dict[str, List[WasteItem]] = {}
+    for item in items:
+        if item.profile_code != profile_code:
+            continue
+        penalty = penalties.get(item.color)
+        if penalty is None:
+            substitute = core_colors is not None and core_colors.substitutes(color, [item.color])
+            penalty = penalties[item.color] = CORE_COLOR_PENALTY_MM if substitute else -1
+        groups.setdefault(item.color, []).append(item)
+
+    held = set()
+    if reservations is not None:
+        # Held pieces depend on the whole class in every color of the
+        # profile, also pieces too short for this query
+        released = reservations.released([required_mm])
+        held = reservations.held_rows(
+            profile_code, {c: [(item.length_mm, item.id) for item in group] for c, group in groups.items()},
+            {c: released for c in groups if penalties[c] >= 0})
+    fitting = [item for c, group in groups.items() if penalties[c] >= 0
+               for item in group if item.length_mm >= required_mm and item.id not in held]
+    return heapq.nsmallest(k, fitting, key=lambda item: item.length_mm + penalties[item.color])
+
+
+# Offcuts looked at per query when choosing by location
+_ROUTE_CANDIDATES = 16
+
+
+def _score(cutoff_mm: int, required_mm: int) -> float:
+    return max(0.1, 1.0 - (cutoff_mm / max(required_mm, 1)))
+
+
+def build_recommendation(matches: List[WasteItem], required_mm: int,
+                         color: Optional[str] = None) -> WasteRecommendationResponse:
+    # matches are the tightest fits, best first; offcuts not in `color` are
+    # core-color substitutes
+    if not matches:
+        return WasteRecommendationResponse(
+            recommended_item_id=None,
+            waste_length_mm=0,
+            cutoff_waste_mm=0,
+            score=0.0,
+            message="Brak pasującego odpadu. Użyj nowej sztangi."
+        )
+
+    alternatives = [
+        WasteCandidate(
+            waste_id=item.id,
+            location=item.location,
+            length_mm=item.length_mm,
+            cutoff_waste_mm=item.length_mm - required_mm,
+            score=_score(item.length_mm - required_mm, required_mm),
+            color=item.color if color is not None and item.color != color else None
+        )
+        for item in matches
+    ]
+    best = alternatives[0]
+    message = f"Użyj odpadu z lokalizacji {best.location}"
+    if best.color is not None:
+        message += f" (kolor zastępczy {best.color}, ten sam rdzeń)"
+    return WasteRecommendationResponse(
+        recommended_item_id=best.waste_id,
+        waste_length_mm=best.length_mm,
+        cutoff_waste_mm=best.cutoff_waste_mm,
+        score=best.score,
+        message=message,
+        alternatives=alternatives
+    )
+
+
+def recommend_batch(queries: Sequence[WasteRecommendationQuery], items: Iterable[WasteItem],
+                    exclusive: bool = False,
+                    reservations: Optional[ReservationIndex] = None,
+                    layout: Optional[WarehouseLayout] = None,
+                    core_colors: Optional[CoreColorIndex] = None) -> List[WasteRecommendationResponse]:
+    # The pool is indexed once and shared by all queries. With exclusive
+    # allocation each recommended offcut leaves the pool before the next
+    # query, so alternatives only list offcuts that are still free.
+    # With a layout, near-equal offcuts are recommended by how close they
+    # are to the ones recommended before. With core_colors, core-colored
+    # queries also match offcuts of colors with the same core.
+    index = WasteIndex(items)
+    occupied: Counter = Counter()
+    responses = []
+    for query in queries:
+        k = query.top_k if layout is None else max(query.top_k, _ROUTE_CANDIDATES)
+        substitutes = core_colors if query.is_core_colored else None
+        matches = index.best_fits(query.profile_code, query.color, query.required_length_mm, k, reservations,
+                                  substitutes, CORE_COLOR_PENALTY_MM)
+        if layout is not None and matches:
+            matches = closest_first(matches, occupied, layout)[:query.top_k]
+            position = layout.position(matches[0].location)
+            if position is not None:
+                occupied[position] += 1
+        if exclusive and matches:
+            index.remove(matches[0])
+        responses.append(build_recommendation(matches, query.required_length_mm, query.color))
+    return responses
+
+
+def recommendation_route(queries: Sequence[WasteRecommendationQuery],
+                         responses: Sequence[WasteRecommendationResponse],
+                         layout: Optional[WarehouseLayout] = None) -> PickRoute:
+    # Each recommended offcut once, in walking order
+    stops = {}
+    for query, response in zip(queries, responses):
+        if response.recommended_item_id is not None and response.recommended_item_id not in stops:
+            best = response.alternatives[0]
+            stops[best.waste_id] = (best.waste_id, best.location, query.profile_code, best.color or query.color, [])
+    return walk_route(list(stops.values()), layout)
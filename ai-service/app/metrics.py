@@ -0,0 +1,91 @@
+"""Prometheus metrics of the AI service, exposed at /metrics."""
+import time
+
+from prometheus_client import Counter, Histogram
+
+from app.algorithm.plan import GroupResult
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "ai_http_request_duration_seconds", "Request latency per route, until the last body byte",
+    ["method", "route", "status"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+
+OPTIMIZER_GROUPS = Counter(
+    "ai_optimizer_groups_total", "(profile, color) groups optimized", ["algorithm"]
+)
+OPTIMIZER_ORDERS_PER_GROUP = Histogram(
+    "ai_optimizer_orders_per_group", "Orders in one (profile, color) group", ["algorithm"],
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+)
+OPTIMIZER_GROUP_SECONDS = Histogram(
+    "ai_optimizer_group_solve_seconds", "Solver time of one group", ["algorithm"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+)
+OPTIMIZER_CANDIDATE_SCANS = Counter(
+    "ai_optimizer_candidate_scans_total", "Greedy stock lookups (one bisect each) per pool", ["pool"]
+)
+OPTIMIZER_STRATEGY_SECONDS = Counter(
+    "ai_optimizer_strategy_seconds_total", "Greedy time per strategy", ["strategy"]
+)
+OPTIMIZER_NEW_BARS = Counter(
+    "ai_optimizer_new_bars_total", "New bars opened", ["algorithm"]
+)
+OPTIMIZER_WASTE_USED = Counter(
+    "ai_optimizer_waste_used_total", "Warehouse waste pieces used", ["algorithm"]
+)
+OPTIMIZER_SCRAP_MM = Counter(
+    "ai_optimizer_scrap_mm_total", "Scrap generated (mm)", ["algorithm"]
+)
+
+
+def observe_group(algorithm: str, result: GroupResult, orders: int) -> None:
+    # orders: the group's order lines; result.cuts has one row per piece
+    stats = result.stats
+    OPTIMIZER_GROUPS.labels(algorithm).inc()
+    OPTIMIZER_ORDERS_PER_GROUP.labels(algorithm).observe(orders)
+    OPTIMIZER_GROUP_SECONDS.labels(algorithm).observe(stats.solve_s)
+    OPTIMIZER_NEW_BARS.labels(algorithm).inc(result.new_bars)
+    OPTIMIZER_WASTE_USED.labels(algorithm).inc(result.waste_used)
+    OPTIMIZER_SCRAP_MM.labels(algorithm).inc(result.scrap_mm)
+    if algorithm == "greedy":
+        OPTIMIZER_CANDIDATE_SCANS.labels("virtual_remnant").inc(stats.virtual_scans)
+        OPTIMIZER_CANDIDATE_SCANS.labels("warehouse_waste").inc(stats.waste_scans)
+        OPTIMIZER_STRATEGY_SECONDS.labels("virtual_remnant").inc(stats.virtual_s)
+        OPTIMIZER_STRATEGY_SECONDS.labels("warehouse_waste").inc(stats.waste_s)
+        OPTIMIZER_STRATEGY_SECONDS.labels("new_bar").inc(stats.new_bar_s)
+
+
+class RequestTimingMiddleware:
+    """ASGI middleware recording HTTP_REQUEST_SECONDS.
+
+    Plain ASGI rather than BaseHTTPMiddleware so streamed responses are
+    timed to their last chunk. Routes are labelled by their template
+    (/optimize/jobs/{job_id}) to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the shared scope
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status)
+            ).observe(time.perf_counter() - start)
@@ -0,0 +1,168 @@
+"""Columnar msgpack form of OptimizationRequest for bulk /optimize/batch calls.
+
+The body is one msgpack map. Settings use the same keys as the JSON request;
+orders and waste are columns, with profile and color codes indexing shared
+dictionaries:
+
+    {
+        "profiles": ["P1", "P2"],
+        "colors": ["White"],
+        "orders": {"order_id": [...], "profile": [...], "color": [...],
+                   "required_length_mm": [...], "priority": [...],
+                   "quantity": [...]},     # priority and quantity optional
+        "available_waste": {"id": [...], "profile": [...], "color": [...],
+                            "length_mm": [...]},     # or leave out and send "waste_version"
+        "algorithm": "ffd", ...
+    }
+
+Integer columns are msgpack arrays or binaries of little-endian int32. Rows
+go straight into the optimizer's group rows; only the settings become a
+Pydantic model.
+"""
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import msgpack
+import numpy as np
+
+from app.algorithm.plan import DemandRow, WasteRow
+from app.models.schema import OptimizationRequest
+
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+
+
+class ColumnarFormatError(ValueError):
+    pass
+
+
+class ColumnarBatch(NamedTuple):
+    settings: OptimizationRequest  # Without orders; available_waste is [] when the body carries waste
+    orders: Dict[tuple, List[DemandRow]]
+    waste: Optional[Dict[tuple, List[WasteRow]]]  # None: the batch names a waste_version
+
+
+def _int_column(columns: Dict[str, Any], table: str, name: str, n: int, default: Optional[int] = None) -> List[int]:
+    value = columns.get(name)
+    if value is None and default is not None:
+        return [default] * n
+    if isinstance(value, bytes):
+        if len(value) % 4:
+            raise ColumnarFormatError(f"Kolumna {table}.{name}: długość danych binarnych nie jest wielokrotnością 4.")
+        value = np.frombuffer(value, dtype="<i4").tolist()
+    elif not isinstance(value, list) or not all(type(v) is int for v in value):
+        raise ColumnarFormatError(f"Kolumna {table}.{name} musi zawierać liczby całkowite.")
+    _check_length(table, name, value, n)
+    return value
+
+
+def _str_column(value: Any, label: str) -> List[str]:
+    if not isinstance(value, list) or not all(type(v) is str for v in value):
+        raise ColumnarFormatError(f"Kolumna {label} musi zawierać napisy.")
+    return value
+
+
+def _check_length(table: str, name: str, value: list, n: int) -> None:
+    if len(value) != n:
+        raise ColumnarFormatError(f"Kolumna {table}.{name} ma {len(value)} wartości, oczekiwano {n}.")
+
+
+def _group_keys(columns: Dict[str, Any], table: str, n: int, profiles: List[str], colors: List[str]) -> List[tuple]:
+    # Codes are grouped first, so each distinct key tuple is built once
+    profile_codes = _int_column(columns, table, "profile", n)
+    color_codes = _int_column(columns, table, "color", n)
+    if n and (min(profile_codes) < 0 or max(profile_codes) >= len(profiles)):
+        raise ColumnarFormatError(f"Kolumna {table}.profile wskazuje poza słownik profiles.")
+    if n and (min(color_codes) < 0 or max(color_codes) >= len(colors)):
+        raise ColumnarFormatError(f"Kolumna {table}.color wskazuje poza słownik colors.")
+    keys: Dict[tuple, tuple] = {}
+    out = []
+    for code in zip(profile_codes, color_codes):
+        key = keys.get(code)
+        if key is None:
+            key = keys[code] = (profiles[code[0]], colors[code[1]])
+        out.append(key)
+    return out
+
+
+def decode_batch(body: bytes) -> ColumnarBatch:
+    """Decodes a columnar body. Raises ColumnarFormatError for a malformed
+    body and pydantic.ValidationError for invalid settings."""
+    try:
+        data = msgpack.unpackb(body, raw=False)
+    except (ValueError, msgpack.UnpackException) as e:
+        raise ColumnarFormatError(f"Niepoprawne dane msgpack: {e}")
+    if not isinstance(data, dict):
+        raise ColumnarFormatError("Treść żądania musi być mapą msgpack.")
+
+    profiles = _str_column(data.pop("profiles", []), "profiles")
+    colors = _str_column(data.pop("colors", []), "colors")
+    order_columns = data.pop("orders", None)
+    waste_columns = data.pop("available_waste", None)
+    if not isinstance(order_columns, dict):
+        raise ColumnarFormatError("Brak kolumn orders.")
+
+    order_ids = _str_column(order_columns.get("order_id"), "orders.order_id")
+    n = len(order_ids)
+    lengths = _int_column(order_columns, "orders", "required_length_mm", n)
+    priorities = _int_column(order_columns, "orders", "priority", n, default=1)
+    quantities = _int_column(order_columns, "orders", "quantity", n, default=1)
+    if n and min(quantities) < 1:
+        raise ColumnarFormatError("Kolumna orders.quantity musi zawierać liczby dodatnie.")
+    orders: Dict[tuple, List[DemandRow]] = {}
+    for key, row, quantity in zip(_group_keys(order_columns, "orders", n, profiles, colors),
+                                  zip(order_ids, lengths, priorities), quantities):
+        rows = orders.get(key)
+        if rows is None:
+            rows = orders[key] = []
+        rows.append((row, quantity))
+
+    waste: Optional[Dict[tuple, List[WasteRow]]] = None
+    if waste_columns is not None:
+        if not isinstance(waste_columns, dict):
+            raise ColumnarFormatError("available_waste musi być mapą kolumn.")
+        waste_ids = _str_column(waste_columns.get("id"), "available_waste.id")
+        m = len(waste_ids)
+        waste_lengths = _int_column(waste_columns, "available_waste", "length_mm", m)
+        waste = {}
+        for key, row in zip(_group_keys(waste_columns, "available_waste", m, profiles, colors),
+                            zip(waste_lengths, waste_ids)):
+            rows = waste.get(key)
+            if rows is None:
+                rows = waste[key] = []
+            rows.append(row)
+
+    data["orders"] = []
+    data["available_waste"] = [] if waste is not None else None
+    settings = OptimizationRequest.model_validate(data)
+    return ColumnarBatch(settings, orders, waste)
+
+
+def encode_batch(request: OptimizationRequest) -> bytes:
+    # Client side of the format, for tests, benchmarks and Python callers
+    profiles: Dict[str, int] = {}
+    colors: Dict[str, int] = {}
+
+    def code(table: Dict[str, int], value: str) -> int:
+        return table.setdefault(value, len(table))
+
+    def ints(values: List[int]) -> bytes:
+        return np.asarray(values, dtype="<i4").tobytes()
+
+    data = request.model_dump(mode="json", exclude={"orders", "available_waste"})
+    data["orders"] = {
+        "order_id": [o.order_id for o in request.orders],
+        "profile": ints([code(profiles, o.profile_code) for o in request.orders]),
+        "color": ints([code(colors, o.color) for o in request.orders]),
+        "required_length_mm": ints([o.required_length_mm for o in request.orders]),
+        "priority": ints([o.priority for o in request.orders]),
+        "quantity": ints([o.quantity for o in request.orders]),
+    }
+    if request.available_waste is not None:
+        data["available_waste"] = {
+            "id": [w.id for w in request.available_waste],
+            "profile": ints([code(profiles, w.profile_code) for w in request.available_waste]),
+            "color": ints([code(colors, w.color) for w in request.available_waste]),
+            "length_mm": ints([w.length_mm for w in request.available_waste]),
+        }
+    data["profiles"] = list(profiles)
+    data["colors"] = list(colors)
+    return msgpack.packb(data, use_bin_type=True)
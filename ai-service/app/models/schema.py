@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
-from datetime import date
+from typing import List, Literal, Optional
+from datetime import date, datetime
 
 # --- Shared Models ---
 
@@ -11,16 +11,40 @@ class ProfileSpec(BaseModel):
 
 # --- Shortage Prediction Models ---
 
+class ConsumptionEvent(BaseModel):
+    # One operation_logs row, with the item's profile and length denormalized
+    profile_code: str
+    operation_type: str = "TAKEN"  # TAKEN, ADDED, MOVED, WASTE_CREATED, LABEL_PRINTED
+    quantity_change: int  # e.g. -1, +5
+    length_mm: int
+    timestamp: datetime
+
 class ShortagePredictionRequest(BaseModel):
     profile_code: str
     current_stock_mm: int
     history_days: int = 90
+    # Falls back to CONSUMPTION_HISTORY_PATH when omitted
+    consumption_history: Optional[List[ConsumptionEvent]] = None
 
 class ShortagePredictionResponse(BaseModel):
     profile_code: str
     predicted_stockout_date: Optional[date]
     risk_level: str  # LOW, MEDIUM, HIGH, CRITICAL
     daily_usage_trend: float
+    days_left: Optional[int] = None  # None: no stockout within the forecast horizon
+
+class StockLevel(BaseModel):
+    profile_code: str
+    current_stock_mm: int
+
+class ShortageBatchRequest(BaseModel):
+    items: List[StockLevel]
+    history_days: int = 90
+    consumption_history: Optional[List[ConsumptionEvent]] = None
+    as_of: Optional[date] = None  # Defaults to today
+
+class ShortageBatchResponse(BaseModel):
+    predictions: List[ShortagePredictionResponse]  # Most urgent first
 
 # --- Waste Recommendation Models ---
 
@@ -35,7 +59,19 @@ class WasteRecommendationRequest(BaseModel):
     profile_code: str
     required_length_mm: int
     color: str
-    available_waste: List[WasteItem]
+    # Either the pool itself or the version of the pool held by /inventory/waste
+    available_waste: Optional[List[WasteItem]] = None
+    waste_version: Optional[int] = None
+    top_k: int = Field(1, ge=1, le=50)  # How many offcuts to return, tightest first
+    is_core_colored: bool = False  # Also offcuts of colors with the same core color
+
+class WasteCandidate(BaseModel):
+    waste_id: str
+    location: str
+    length_mm: int
+    cutoff_waste_mm: int
+    score: float
+    color: Optional[str] = None  # Set when the offcut is of another color with the same core
 
 class WasteRecommendationResponse(BaseModel):
     recommended_item_id: Optional[str]
@@ -43,6 +79,63 @@ class WasteRecommendationResponse(BaseModel):
     cutoff_waste_mm: int
     score: float
     message: str
+    alternatives: List[WasteCandidate] = []  # Includes the recommended item first
+
+class WasteRecommendationQuery(BaseModel):
+    profile_code: str
+    required_length_mm: int
+    color: str
+    top_k: int = Field(1, ge=1, le=50)
+    is_core_colored: bool = False
+
+class WasteRecommendationBatchRequest(BaseModel):
+    queries: List[WasteRecommendationQuery]
+    # Shared pool for all queries, inline or by /inventory/waste version
+    available_waste: Optional[List[WasteItem]] = None
+    waste_version: Optional[int] = None
+    # Allocate each recommended offcut to one query only (queries served in order)
+    exclusive: bool = False
+    # Among near-equal offcuts recommend the ones stored together; see app/algorithm/pick_route.py
+    pick_route: bool = False
+
+class PickStop(BaseModel):
+    waste_id: str
+    location: Optional[str]
+    profile_code: str
+    color: str
+    order_ids: List[str] = []  # Orders cut from this offcut
+
+class WasteRecommendationBatchResponse(BaseModel):
+    recommendations: List[WasteRecommendationResponse]  # One per query, same order
+    pick_route: List[PickStop] = []  # pick_route only: recommended offcuts in walking order
+    pick_route_distance: Optional[int] = None  # Walk from the saw and back, in pallet steps
+
+# --- Waste Inventory Snapshot Models ---
+
+class WasteInventorySnapshot(BaseModel):
+    version: int
+    items: List[WasteItem]
+
+class WasteInventoryDelta(BaseModel):
+    base_version: int  # Version the delta applies to
+    version: int       # Version after applying it
+    upserts: List[WasteItem] = []
+    deletes: List[str] = []  # Waste item ids
+
+class WasteInventoryStatus(BaseModel):
+    version: int
+    item_count: int
+
+# --- Result Cache Models ---
+
+class ResultCacheStats(BaseModel):
+    entries: int
+    bytes: int
+    hits: int
+    misses: int
+    evictions: int
+    max_entries: int
+    max_bytes: int
 
 # --- Advanced Optimization Models ---
 
@@ -52,13 +145,46 @@ class OrderItem(BaseModel):
     color: str
     required_length_mm: int
     priority: int = 1  # 1 (Low) to 5 (High)
+    quantity: int = Field(1, ge=1)  # Identical pieces; each gets its own cut with this order_id
+
+class StockLength(BaseModel):
+    length_mm: int = Field(..., gt=0)
+    cost: float = Field(..., ge=0)  # Price of one bar, in any currency as long as it is the same for all
+
+class StockCatalogEntry(BaseModel):
+    profile_code: str
+    color: Optional[str] = None  # None: every color of the profile without an entry of its own
+    lengths: List[StockLength] = Field(..., min_length=1)
 
 class OptimizationRequest(BaseModel):
     orders: List[OrderItem]
-    available_waste: List[WasteItem]
+    # Either the pool itself or the version of the pool held by /inventory/waste
+    available_waste: Optional[List[WasteItem]] = None
+    waste_version: Optional[int] = None
     full_bar_length_mm: int = 6500
     min_usable_offcut_mm: int = 500  # Minimum length to keep as waste
     scrap_threshold_mm: int = 200    # Below this is trash
+    kerf_mm: int = Field(0, ge=0)      # Saw blade width lost at every cut
+    end_trim_mm: int = Field(0, ge=0)  # Trimmed off each stock piece before its first cut
+    # New-bar lengths per profile; groups without an entry use full_bar_length_mm at cost 1
+    stock_catalog: List[StockCatalogEntry] = []
+    # greedy: single pass in order priority; ffd: best fit decreasing per group;
+    # exact: branch-and-bound over bar patterns, seeded with ffd;
+    # local: improves the greedy plan until the time limit (anytime);
+    # pattern: ffd on (length, count) demand, each bar pattern cut in multiples, for large quantities
+    algorithm: Literal["greedy", "ffd", "exact", "local", "pattern"] = "greedy"
+    time_limit_ms: Optional[int] = Field(None, ge=0)  # Solver time budget for the whole batch
+    # Processes for independent groups; None = OPTIMIZER_WORKERS, 0 = all cores, at most OPTIMIZER_MAX_WORKERS
+    workers: Optional[int] = Field(None, ge=0, le=256)
+    # Prefer offcuts stored together among near-equal ones and list them in
+    # walking order; not for /optimize/batch/stream
+    pick_route: bool = False
+    # List greedy plans as patterns too; the other solvers and pick_route always do
+    include_patterns: bool = False
+    # Groups with a colored core may use offcuts of other colors with the same core color
+    profile_specs: List[ProfileSpec] = []
+    # Neighbouring mitered pieces share their diagonal cut (profile heights from profiles.json)
+    miter_nesting: bool = False
 
 class OptimizedCut(BaseModel):
     order_id: str
@@ -66,9 +192,142 @@ class OptimizedCut(BaseModel):
     source_id: Optional[str]  # ID of waste item or None for new bar
     waste_created_mm: int
     is_scrap: bool
+    stock_length_mm: Optional[int] = None  # Length of the new bar opened by this cut
+
+class PatternPiece(BaseModel):
+    order_id: str
+    length_mm: int
+
+class CuttingPattern(BaseModel):
+    profile_code: str
+    color: str
+    source_type: str  # WASTE or NEW_BAR
+    source_id: Optional[str]
+    stock_length_mm: int
+    pieces: List[PatternPiece]  # In cutting order
+    remnant_mm: int
+    is_scrap: bool
+
+class OptimizationImprovement(BaseModel):
+    # Greedy plan of the same groups, and what the local search saved on it
+    baseline_new_bars_count: int
+    baseline_new_bar_cost: float
+    baseline_scrap_generated_mm: int
+    new_bars_saved: int
+    new_bar_cost_saved: float
+    scrap_saved_mm: int
 
 class OptimizationResponse(BaseModel):
     cuts: List[OptimizedCut]
     total_waste_used_count: int
     total_new_bars_count: int
     total_scrap_generated_mm: int
+    total_new_bar_cost: float = 0.0  # Sum of the catalog costs of the new bars
+    patterns: List[CuttingPattern] = []  # One per stock piece cut; greedy only with include_patterns
+    improvement: Optional[OptimizationImprovement] = None  # local only: gain over the greedy plan
+    pick_route: List[PickStop] = []  # pick_route only: offcuts to fetch in walking order
+    pick_route_distance: Optional[int] = None  # Walk from the saw and back, in pallet steps
+    plan_id: Optional[str] = None  # For incremental re-optimization via /optimize/plans/{plan_id}/delta
+
+# --- Muntin (Szprosy V3) Models ---
+
+class MuntinWindow(BaseModel):
+    window_id: str
+    frame_width_mm: float = Field(..., gt=0)  # Sash, outer size
+    frame_height_mm: float = Field(..., gt=0)
+    rows: int = Field(1, ge=1, le=20)  # Panes, equally divided
+    cols: int = Field(1, ge=1, le=20)
+    # Muntins running from bead to bead; the others are cut between them
+    continuous: Literal["vertical", "horizontal"] = "vertical"
+    # Names in muntins_v3.json; None: the first entry
+    profile: Optional[str] = None
+    bead: Optional[str] = None
+    muntin: Optional[str] = None
+    color: str = ""  # Muntin color, for the bar optimizer
+    quantity: int = Field(1, ge=1)  # Identical sashes
+    correction_mm: float = 0.0  # Manual correction of the glass size, both directions
+
+class MuntinCutListRequest(BaseModel):
+    windows: List[MuntinWindow] = Field(..., min_length=1)
+    bead_clearance_mm: float = Field(1.0, ge=0)  # Per end touching a bead
+    muntin_clearance_mm: float = Field(1.0, ge=0)  # Per end touching a muntin
+    saw_offset_mm: float = 0.0  # Added to every piece
+    # Packs the pieces into bars with these settings, after any orders they carry
+    optimization: Optional[OptimizationRequest] = None
+
+class MuntinCut(BaseModel):
+    muntin: str
+    color: str
+    length_mm: float  # Longest face, 0.1 mm
+    cut_length_mm: int  # Whole mm, as sent to the optimizer
+    angle_start_deg: float
+    angle_end_deg: float
+    quantity: int
+    description: str
+    window_ids: List[str]
+
+class MuntinCutListResponse(BaseModel):
+    cuts: List[MuntinCut]  # Identical pieces grouped, longest first
+    total_length_mm: float
+    plan: Optional[OptimizationResponse] = None
+
+# --- Glazing Bead Models ---
+
+class BeadOpening(BaseModel):
+    opening_id: str
+    profile_code: str  # Sash or frame profile in profiles.json; its beads follow its geometry
+    width_mm: float = Field(..., gt=0)
+    height_mm: float = Field(..., gt=0)
+    color: str = ""
+    quantity: int = Field(1, ge=1)  # Identical openings
+
+class BeadCutListRequest(BaseModel):
+    openings: List[BeadOpening] = Field(..., min_length=1)
+    # outer: sizes of the sash or frame; rebate: the run of the beads themselves
+    dimensions: Literal["outer", "rebate"] = "outer"
+    clearance_mm: float = Field(0.0, ge=0)  # Taken off every bead
+    # Packs the beads into bars with these settings, after any orders they carry
+    optimization: Optional[OptimizationRequest] = None
+
+class BeadCut(BaseModel):
+    profile_code: str  # The profile's code with BEAD_CODE_SUFFIX
+    color: str
+    length_mm: int  # Long side, as sent to the optimizer
+    short_length_mm: int
+    angle_deg: float  # Both ends; 90 for square cuts
+    quantity: int
+    opening_ids: List[str]
+
+class BeadCutListResponse(BaseModel):
+    cuts: List[BeadCut]  # Identical beads grouped, longest first
+    total_length_mm: int
+    plan: Optional[OptimizationResponse] = None
+
+# --- Incremental Re-optimization Models ---
+
+class OptimizationPlanDelta(BaseModel):
+    add_orders: List[OrderItem] = []  # An order_id already in the plan replaces that order
+    remove_order_ids: List[str] = []
+    add_waste: List[WasteItem] = []
+    remove_waste_ids: List[str] = []  # E.g. offcuts consumed elsewhere
+
+class GroupKey(BaseModel):
+    profile_code: str
+    color: str
+
+class PlanReoptimizationResponse(OptimizationResponse):
+    base_plan_id: str
+    resolved_groups: List[GroupKey]  # Only these groups were re-planned
+
+# --- Background Optimization Jobs ---
+
+class OptimizationJobStatus(BaseModel):
+    job_id: str
+    status: str  # QUEUED, RUNNING, DONE, FAILED, CANCELLED
+    groups_done: int
+    groups_total: int  # Known once the first group finishes
+    submitted_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    result: Optional[OptimizationResponse] = None  # Set when status is DONE
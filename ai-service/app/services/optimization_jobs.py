@@ -0,0 +1,165 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from app.models.schema import OptimizationRequest, OptimizationResponse
+
+JOB_WORKERS = int(os.getenv("OPTIMIZATION_JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("OPTIMIZATION_JOB_QUEUE_SIZE", "16"))
+JOB_RESULT_TTL_S = int(os.getenv("OPTIMIZATION_JOB_TTL_S", "900"))
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class OptimizationJob:
+    __slots__ = ("job_id", "request", "status", "groups_done", "groups_total", "submitted_at",
+                 "started_at", "finished_at", "finished_monotonic", "result", "error", "cancel_requested")
+
+    def __init__(self, request: OptimizationRequest):
+        self.job_id = uuid.uuid4().hex
+        self.request: Optional[OptimizationRequest] = request
+        self.status = "QUEUED"  # QUEUED, RUNNING, DONE, FAILED, CANCELLED
+        self.groups_done = 0
+        self.groups_total = 0
+        self.submitted_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.finished_monotonic: Optional[float] = None
+        self.result: Optional[OptimizationResponse] = None
+        self.error: Optional[str] = None
+        self.cancel_requested = False
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ("DONE", "FAILED", "CANCELLED")
+
+
+class OptimizationJobQueue:
+    """Bounded in-process queue of batch optimizations.
+
+    Worker threads only coordinate: group solving runs on the optimizer's
+    process pool, so the API threads keep the GIL for short requests.
+    Finished jobs are kept for ``ttl_s`` seconds and then evicted.
+    """
+
+    def __init__(self, runner: Callable[..., OptimizationResponse], workers: int = JOB_WORKERS,
+                 max_queued: int = JOB_QUEUE_SIZE, ttl_s: float = JOB_RESULT_TTL_S):
+        self._runner = runner
+        self._workers = max(workers, 1)
+        self._ttl_s = ttl_s
+        # Capacity counts the jobs still waiting; a cancelled job frees its
+        # slot at once, though the worker only skips it when it comes up
+        self._queue: "queue.SimpleQueue[Optional[OptimizationJob]]" = queue.SimpleQueue()
+        self._max_queued = max_queued
+        self._queued = 0
+        self._jobs: Dict[str, OptimizationJob] = {}
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def _ensure_started(self) -> None:
+        # Threads start with the first job, so importing the app stays cheap
+        if self._threads:
+            return
+        for n in range(self._workers):
+            thread = threading.Thread(target=self._work, name=f"optimization-job-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, request: OptimizationRequest) -> OptimizationJob:
+        job = OptimizationJob(request)
+        with self._lock:
+            self._evict_expired()
+            if 0 < self._max_queued <= self._queued:
+                raise JobQueueFull()
+            self._ensure_started()
+            self._queue.put(job)
+            self._queued += 1
+            self._jobs[job.job_id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[OptimizationJob]:
+        with self._lock:
+            self._evict_expired()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[OptimizationJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.is_finished:
+                return job
+            job.cancel_requested = True
+            if job.status == "QUEUED":
+                # The worker drops it when dequeued
+                self._queued -= 1
+                self._finish(job, "CANCELLED")
+            return job
+
+    def shutdown(self) -> None:
+        with self._lock:
+            threads, self._threads = self._threads, []
+            for job in self._jobs.values():
+                if not job.is_finished:
+                    job.cancel_requested = True
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join(timeout=5)
+
+    def _finish(self, job: OptimizationJob, status: str) -> None:
+        job.status = status
+        job.finished_at = datetime.now()
+        job.finished_monotonic = time.monotonic()
+        job.request = None  # The payload can be large; only the result is kept
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_monotonic is not None and now - job.finished_monotonic > self._ttl_s
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                if job.is_finished:
+                    continue
+                self._queued -= 1
+                job.status = "RUNNING"
+                job.started_at = datetime.now()
+                request = job.request
+
+            def progress(done: int, total: int, job: OptimizationJob = job) -> None:
+                job.groups_done = done
+                job.groups_total = total
+                if job.cancel_requested:
+                    raise JobCancelled()
+
+            try:
+                result = self._runner(request, use_pool=True, progress=progress)
+            except JobCancelled:
+                with self._lock:
+                    self._finish(job, "CANCELLED")
+            except Exception as e:
+                with self._lock:
+                    job.error = str(e)
+                    self._finish(job, "FAILED")
+            else:
+                with self._lock:
+                    job.result = result
+                    self._finish(job, "DONE")
+                    self._evict_expired()
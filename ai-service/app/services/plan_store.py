@@ -0,0 +1,49 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.algorithm.incremental import StoredPlan
+
+PLAN_STORE_MAX_PLANS = int(os.getenv("PLAN_STORE_MAX_PLANS", "128"))
+PLAN_STORE_TTL_S = float(os.getenv("PLAN_STORE_TTL_S", "3600"))
+
+
+class PlanStore:
+    """Recent optimization plans by plan id, for incremental re-optimization.
+
+    Least recently used plans are dropped first once ``max_plans`` is
+    reached; plans not used for ``ttl_s`` seconds expire.
+    """
+
+    def __init__(self, max_plans: int = PLAN_STORE_MAX_PLANS, ttl_s: float = PLAN_STORE_TTL_S):
+        self._max_plans = max_plans
+        self._ttl_s = ttl_s
+        self._lock = threading.Lock()
+        # plan_id -> (expires_at, plan)
+        self._plans: "OrderedDict[str, Tuple[float, StoredPlan]]" = OrderedDict()
+
+    def get(self, plan_id: str) -> Optional[StoredPlan]:
+        with self._lock:
+            entry = self._plans.get(plan_id)
+            if entry is None:
+                return None
+            now = time.monotonic()
+            if entry[0] < now:
+                del self._plans[plan_id]
+                return None
+            # Reading a plan keeps it alive
+            self._plans[plan_id] = (now + self._ttl_s, entry[1])
+            self._plans.move_to_end(plan_id)
+            return entry[1]
+
+    def put(self, plan_id: str, plan: StoredPlan) -> None:
+        with self._lock:
+            self._plans.pop(plan_id, None)
+            self._plans[plan_id] = (time.monotonic() + self._ttl_s, plan)
+            while len(self._plans) > self._max_plans:
+                self._plans.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._plans)
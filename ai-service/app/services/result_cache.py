@@ -0,0 +1,136 @@
+import hashlib
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import msgpack
+from pydantic import BaseModel
+
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 2**20)))
+RESULT_CACHE_TTL_S = float(os.getenv("RESULT_CACHE_TTL_S", "300"))
+
+
+def content_key(namespace: str, request: BaseModel, exclude: Optional[set] = None, salt: str = "") -> str:
+    # Requests are hashed in their JSON form: field order is fixed by the
+    # model, list order is kept because it decides the plan's group order.
+    # The core serializer returns bytes; model_dump_json would round-trip
+    # them through str.
+    return body_key(namespace, request.__pydantic_serializer__.to_json(request, exclude=exclude), salt)
+
+
+def rows_key(namespace: str, settings: BaseModel, rows: Any, exclude: Optional[set] = None, salt: str = "") -> str:
+    # For requests whose payload is already in row form, whatever body it
+    # came in: the settings in their JSON form, then the rows packed with
+    # msgpack (tuples pack as lists, dicts keep their order)
+    digest = hashlib.blake2b(settings.__pydantic_serializer__.to_json(settings, exclude=exclude), digest_size=16)
+    digest.update(msgpack.packb(rows))
+    digest.update(salt.encode())
+    return f"{namespace}:{digest.hexdigest()}"
+
+
+def body_key(namespace: str, body: bytes, salt: str = "") -> str:
+    # A request already in its serialized form
+    digest = hashlib.blake2b(body, digest_size=16)
+    digest.update(salt.encode())
+    return f"{namespace}:{digest.hexdigest()}"
+
+
+class CatalogueVersions:
+    """Version numbers of server-side catalogues, for cache key salts.
+
+    A catalogue gets a new number whenever its loader hands out a different
+    object than last time (reloaded, or rebuilt for a new day), so results
+    made with the old one stop matching. The current objects are held, so
+    identity comparisons stay valid.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._numbers = itertools.count(1)
+        self._current: Dict[str, Tuple[Any, int]] = {}
+
+    def stamp(self, **catalogues: Any) -> str:
+        parts = []
+        with self._lock:
+            for name in sorted(catalogues):
+                catalogue = catalogues[name]
+                held = self._current.get(name)
+                if held is None or held[0] is not catalogue:
+                    held = self._current[name] = (catalogue, next(self._numbers))
+                parts.append(str(held[1]))
+        return ".".join(parts)
+
+
+class ResultCache:
+    """LRU cache of serialized responses with a TTL.
+
+    Values are the JSON bodies, so a hit skips both the solver and response
+    serialization, and the byte limit is exact. Entries are evicted least
+    recently used first once either the entry or the byte limit is reached.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES, max_bytes: int = RESULT_CACHE_MAX_BYTES,
+                 ttl_s: float = RESULT_CACHE_TTL_S):
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._ttl_s = ttl_s
+        self._lock = threading.Lock()
+        # key -> (expires_at, body)
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, body: bytes) -> None:
+        if self._max_entries <= 0 or len(body) > self._max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self._ttl_s, body)
+            self._bytes += len(body)
+            while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, body = self._entries.pop(key)
+        self._bytes -= len(body)
+
+    def invalidate(self, namespace: Optional[str] = None) -> int:
+        # Drops everything, or only the keys of one namespace
+        with self._lock:
+            keys = [k for k in self._entries if namespace is None or k.startswith(f"{namespace}:")]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "max_entries": self._max_entries,
+                "max_bytes": self._max_bytes,
+            }
@@ -0,0 +1,103 @@
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from app.algorithm.color_substitution import CoreColorIndex
+from app.algorithm.reservations import ReservationIndex
+from app.algorithm.waste_index import WasteIndex
+from app.models.schema import WasteItem
+
+
+class WasteVersionConflict(Exception):
+    def __init__(self, current_version: int):
+        super().__init__(f"current version is {current_version}")
+        self.current_version = current_version
+
+
+class WasteInventoryStore:
+    """Resident copy of the warehouse offcut inventory.
+
+    The backend owns the version numbers: it loads a full snapshot once and
+    then sends deltas, each naming the version it applies to. Requests that
+    reference a version other than the current one get a conflict, so the
+    caller can resend the snapshot instead of optimizing against stale stock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = 0
+        # Bumped by every write, even one that reuses a version number
+        self.generation = 0
+        self._items: Dict[str, WasteItem] = {}
+        self._index = WasteIndex()
+
+    def _insert(self, item: WasteItem) -> None:
+        self._items[item.id] = item
+        self._index.add(item)
+
+    def _delete(self, item_id: str) -> None:
+        item = self._items.pop(item_id, None)
+        if item is not None:
+            self._index.remove(item)
+
+    def replace(self, version: int, items: Iterable[WasteItem]) -> None:
+        with self._lock:
+            self._items = {}
+            self._index = WasteIndex()
+            for item in items:
+                if item.id in self._items:
+                    self._delete(item.id)
+                self._insert(item)
+            self.version = version
+            self.generation += 1
+
+    def apply_delta(self, base_version: int, version: int,
+                    upserts: Iterable[WasteItem], deletes: Iterable[str]) -> None:
+        with self._lock:
+            if base_version != self.version:
+                raise WasteVersionConflict(self.version)
+            for item_id in deletes:
+                self._delete(item_id)
+            for item in upserts:
+                self._delete(item.id)
+                self._insert(item)
+            self.version = version
+            self.generation += 1
+
+    def _check(self, version: Optional[int]) -> None:
+        if version is not None and version != self.version:
+            raise WasteVersionConflict(self.version)
+
+    def generation_of(self, version: int) -> int:
+        # Identifies the stored content behind a version, for cache keys
+        with self._lock:
+            self._check(version)
+            return self.generation
+
+    def items_for(self, profile_code: str, color: str, version: Optional[int] = None) -> List[WasteItem]:
+        with self._lock:
+            self._check(version)
+            return self._index.items_for(profile_code, color)
+
+    def best_fits(self, profile_code: str, color: str, required_mm: int, k: int = 1,
+                  version: Optional[int] = None, reservations: Optional[ReservationIndex] = None,
+                  core_colors: Optional[CoreColorIndex] = None, penalty_mm: int = 0) -> List[WasteItem]:
+        with self._lock:
+            self._check(version)
+            return self._index.best_fits(profile_code, color, required_mm, k, reservations, core_colors, penalty_mm)
+
+    def colors_of(self, profile_code: str) -> List[str]:
+        # Colors with stored offcuts of the profile
+        with self._lock:
+            return self._index.colors_of(profile_code)
+
+    def items_for_keys(self, keys: Iterable[tuple], version: Optional[int] = None) -> List[WasteItem]:
+        # Only the (profile, color) groups a batch needs, shortest first per group
+        with self._lock:
+            self._check(version)
+            items: List[WasteItem] = []
+            for profile_code, color in dict.fromkeys(keys):
+                items.extend(self._index.items_for(profile_code, color))
+            return items
+
+    def __len__(self) -> int:
+        return len(self._items)
@@ -0,0 +1,108 @@
+"""Throughput and peak memory of the optimizer's internal representation.
+
+Compares the greedy pass with one Pydantic model per remnant and per cut
+(uuid4 ids, the representation used before plan rows) against the
+current tuple/counter path, both on the same length-indexed pools.
+
+Run from ai-service/:  python -m benchmarks.bench_internal_repr
+"""
+import argparse
+import time
+import tracemalloc
+import uuid
+
+from app.algorithm.waste_index import SortedWastePool
+from app.algorithm.waste_optimizer import iter_group_results, optimize_batch_cutting
+from app.models.schema import OptimizationRequest, OptimizationResponse, OptimizedCut, WasteItem
+from benchmarks.workloads import make_optimization_request
+
+
+def pydantic_hot_loop(request: OptimizationRequest) -> OptimizationResponse:
+    grouped_orders = {}
+    for order in request.orders:
+        grouped_orders.setdefault((order.profile_code, order.color), []).append(order)
+    waste_pool = {}
+    for waste in request.available_waste:
+        waste_pool.setdefault((waste.profile_code, waste.color), []).append(waste)
+
+    scrap = request.scrap_threshold_mm
+    cuts = []
+    new_bars = total_scrap = waste_used = 0
+
+    def remnant_item(length, profile_code, color):
+        return WasteItem(id=f"virt-{uuid.uuid4()}", location="PRODUCTION_LINE",
+                         length_mm=length, profile_code=profile_code, color=color)
+
+    for (profile_code, color), orders in grouped_orders.items():
+        orders.sort(key=lambda x: (-x.priority, -x.required_length_mm))
+        available = SortedWastePool((w.length_mm, w) for w in waste_pool.get((profile_code, color), []))
+        virtual = SortedWastePool()
+        for order in orders:
+            need = order.required_length_mm
+            match = virtual.pop_best_fit(need)
+            if match is not None:
+                remnant = match[1].length_mm - need
+                source_type, source_id = "NEW_BAR_REMNANT", None
+                keep = remnant >= scrap
+            else:
+                match = available.pop_avoiding_bad_offcut(need, scrap, request.min_usable_offcut_mm)
+                if match is not None:
+                    remnant = match[1].length_mm - need
+                    source_type, source_id = "WASTE", match[1].id
+                    waste_used += 1
+                    keep = remnant >= request.min_usable_offcut_mm
+                else:
+                    new_bars += 1
+                    remnant = request.full_bar_length_mm - need
+                    source_type, source_id = "NEW_BAR", None
+                    keep = remnant >= scrap
+            cuts.append(OptimizedCut(order_id=order.order_id, source_type=source_type, source_id=source_id,
+                                     waste_created_mm=remnant, is_scrap=0 < remnant < scrap))
+            if remnant > 0:
+                if remnant < scrap:
+                    total_scrap += remnant
+                elif keep:
+                    virtual.add(remnant, remnant_item(remnant, profile_code, color))
+
+    return OptimizationResponse(cuts=cuts, total_waste_used_count=waste_used,
+                                total_new_bars_count=new_bars, total_scrap_generated_mm=total_scrap)
+
+
+def measure(fn, request, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(request)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(request)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--orders-per-group", type=int, default=2000)
+    parser.add_argument("--waste-per-group", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    request = make_optimization_request(args.groups, args.orders_per_group, args.waste_per_group)
+    n_orders = len(request.orders)
+    variants = [
+        ("pydantic per remnant/cut", pydantic_hot_loop),
+        ("plan rows (solve only)", lambda r: list(iter_group_results(r))),
+        ("plan rows + response", optimize_batch_cutting),
+    ]
+
+    print(f"orders={n_orders} waste={len(request.available_waste)} groups={args.groups}")
+    print(f"{'variant':<26}{'time [s]':>10}{'orders/s':>12}{'peak [MiB]':>12}")
+    for name, fn in variants:
+        seconds, peak = measure(fn, request, args.repeat)
+        print(f"{name:<26}{seconds:>10.3f}{n_orders / seconds:>12.0f}{peak / 2**20:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Scaling of optimize_batch_cutting with worker processes.
+
+Run from ai-service/:  python -m benchmarks.bench_parallel_groups
+"""
+import argparse
+import os
+import time
+
+from app.algorithm.waste_optimizer import optimize_batch_cutting, shutdown_executors
+from benchmarks.workloads import make_optimization_request
+
+
+def best_of(request, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        optimize_batch_cutting(request)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--groups", default="1,4,16,64")
+    parser.add_argument("--orders-per-group", type=int, default=400)
+    parser.add_argument("--waste-per-group", type=int, default=2000)
+    parser.add_argument("--algorithm", default="ffd", choices=["greedy", "ffd", "exact"])
+    parser.add_argument("--workers", default=f"1,2,4,{os.cpu_count()}")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    worker_counts = sorted({int(w) for w in args.workers.split(",")})
+    print(f"cpu_count={os.cpu_count()} algorithm={args.algorithm} "
+          f"orders/group={args.orders_per_group} waste/group={args.waste_per_group}")
+    print("groups " + "".join(f"{f'w={w} [s]':>14}" for w in worker_counts) + f"{'speedup':>10}")
+
+    for n_groups in (int(g) for g in args.groups.split(",")):
+        request = make_optimization_request(n_groups, args.orders_per_group, args.waste_per_group,
+                                            algorithm=args.algorithm, time_limit_ms=200 * n_groups)
+        # Warm the pools so process start-up is not measured
+        for w in worker_counts:
+            optimize_batch_cutting(request.model_copy(update={"workers": w}))
+        timings = [best_of(request.model_copy(update={"workers": w}), args.repeat) for w in worker_counts]
+        print(f"{n_groups:>6} " + "".join(f"{t:>14.3f}" for t in timings) + f"{timings[0] / timings[-1]:>9.2f}x")
+
+    shutdown_executors()
+
+
+if __name__ == "__main__":
+    main()
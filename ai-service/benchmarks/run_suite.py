@@ -0,0 +1,293 @@
+"""Benchmark suite for the optimizer and the API endpoints.
+
+Times optimize_batch_cutting, recommend_waste and predict_shortage as plain
+calls of the endpoint functions ("direct") and through the FastAPI app with
+the in-process TestClient ("http", and "http_msgpack" for the columnar
+/optimize/batch body), on synthetic workloads with waste pools
+from 10 to 100k items. Throughput, p50/p99 latency, peak memory and yield
+(bars, scrap, waste used, hit rate) are written to JSON so runs can be
+compared.
+
+Run from ai-service/:
+    python -m benchmarks.run_suite --out bench.json [--quick]
+    python -m benchmarks.run_suite --compare before.json after.json
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+from collections import Counter
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List
+
+from fastapi.testclient import TestClient
+
+import main
+from app.algorithm.waste_optimizer import optimize_batch_cutting
+from app.models.columnar import MSGPACK_MEDIA_TYPE, encode_batch
+from app.models.schema import ShortageBatchRequest, ShortagePredictionRequest, WasteRecommendationRequest
+from app.services.result_cache import ResultCache
+from benchmarks.workloads import group_keys, make_consumption_history, make_optimization_request, make_waste_pool
+
+POOL_SIZES = [10, 1_000, 10_000, 100_000]
+QUICK_POOL_SIZES = [10, 1_000]
+N_GROUPS = 20
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    # Nearest-rank percentile
+    i = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[i]
+
+
+def as_dict(result: Any) -> Dict[str, Any]:
+    return result if isinstance(result, dict) else result.model_dump(mode="json")
+
+
+def run_case(name: str, path: str, fn: Callable[[], Any], calls: int, units_per_call: int, unit: str,
+             params: Dict[str, Any], yields: Callable[[List[Dict[str, Any]]], Dict[str, Any]]) -> Dict[str, Any]:
+    fn()  # Warm-up: imports, process pools, caches
+    latencies = []
+    results = []
+    start = time.perf_counter()
+    for _ in range(calls):
+        t = time.perf_counter()
+        results.append(fn())
+        latencies.append(time.perf_counter() - t)
+    total = time.perf_counter() - start
+
+    # Separate run: tracemalloc slows allocation-heavy code down
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    record = {
+        "name": name,
+        "path": path,
+        "params": params,
+        "calls": calls,
+        "throughput": calls * units_per_call / total,
+        "throughput_unit": f"{unit}/s",
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_mem_mib": peak / 2**20,
+        "yield": yields([as_dict(r) for r in results]),
+    }
+    print(f"{name:<28}{path:<14}{json.dumps(params):<56}{record['p50_ms']:>10.2f}{record['p99_ms']:>10.2f}"
+          f"{record['throughput']:>14.0f} {unit}/s{record['peak_mem_mib']:>9.1f} MiB")
+    return record
+
+
+def optimization_yield(responses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # Deterministic optimizer: every call gives the same plan
+    r = responses[-1]
+    return {
+        "bars_used": r["total_new_bars_count"],
+        "waste_used": r["total_waste_used_count"],
+        "scrap_mm": r["total_scrap_generated_mm"],
+    }
+
+
+def bench_optimize(client: TestClient, pool_sizes: List[int], orders_per_group: int, calls: int) -> List[dict]:
+    records = []
+    for pool_size in pool_sizes:
+        request = make_optimization_request(N_GROUPS, orders_per_group, 0)
+        request = request.model_copy(update={"available_waste": make_waste_pool(pool_size, N_GROUPS)})
+        payload = request.model_dump(mode="json")
+        params = {"orders": len(request.orders), "waste": pool_size, "groups": N_GROUPS}
+        n_calls = calls if pool_size < 100_000 else max(calls // 4, 2)
+
+        def http(payload=payload):
+            response = client.post("/optimize/batch", json=payload)
+            response.raise_for_status()
+            return response.json()
+
+        def http_msgpack(body=encode_batch(request)):
+            response = client.post("/optimize/batch", content=body, headers={"Content-Type": MSGPACK_MEDIA_TYPE})
+            response.raise_for_status()
+            return response.json()
+
+        for path, fn in (("direct", lambda request=request: optimize_batch_cutting(request)), ("http", http),
+                         ("http_msgpack", http_msgpack)):
+            records.append(run_case("optimize_batch_cutting", path, fn, n_calls, len(request.orders), "orders",
+                                    params, optimization_yield))
+    return records
+
+
+def recommendation_yield(responses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    hits = [r for r in responses if r["recommended_item_id"] is not None]
+    return {
+        "hit_rate": round(len(hits) / len(responses), 4),
+        "mean_cutoff_waste_mm": round(sum(r["cutoff_waste_mm"] for r in hits) / max(len(hits), 1), 1),
+    }
+
+
+def bench_recommend(client: TestClient, pool_sizes: List[int], calls: int) -> List[dict]:
+    records = []
+    keys = group_keys(N_GROUPS)
+    for pool_size in pool_sizes:
+        pool = make_waste_pool(pool_size, N_GROUPS, seed=1)
+        rng = random.Random(2)
+        queries = [
+            {"profile_code": p, "color": c, "required_length_mm": rng.randint(400, 2600), "top_k": 3}
+            for p, c in (rng.choice(keys) for _ in range(256))
+        ]
+        version = 1_000_000 + pool_size
+        main.waste_store.replace(version, pool)
+        pool_json = [w.model_dump() for w in pool]
+        # Inline pools are re-sent with every call; keep big ones to a few calls
+        inline_calls = max(10, min(calls, 2_000_000 // max(pool_size, 1)))
+
+        variants = [
+            ("inline", inline_calls, {"available_waste": pool}, {"available_waste": pool_json}),
+            ("stored", calls, {"waste_version": version}, {"waste_version": version}),
+        ]
+        for source, n_calls, direct_extra, http_extra in variants:
+            params = {"waste": pool_size, "source": source}
+            direct_requests = [WasteRecommendationRequest(**q, **direct_extra) for q in queries]
+            http_payloads = [{**q, **http_extra} for q in queries]
+            counter = iter(range(10**9))
+
+            def direct(reqs=direct_requests):
+                return main._recommend_waste(reqs[next(counter) % len(reqs)])
+
+            def http(payloads=http_payloads):
+                response = client.post("/recommend/waste", json=payloads[next(counter) % len(payloads)])
+                response.raise_for_status()
+                return response.json()
+
+            for path, fn in (("direct", direct), ("http", http)):
+                records.append(run_case("recommend_waste", path, fn, n_calls, 1, "queries", params,
+                                        recommendation_yield))
+    return records
+
+
+def bench_cache_hits(client: TestClient, orders_per_group: int, calls: int) -> List[dict]:
+    # Repeat plan views: same payload, served from the result cache
+    main.result_cache = ResultCache()
+    request = make_optimization_request(N_GROUPS, orders_per_group, 50)
+    payload = request.model_dump(mode="json")
+    params = {"orders": len(request.orders), "waste": len(request.available_waste), "cached": True}
+
+    def http():
+        response = client.post("/optimize/batch", json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    try:
+        return [run_case("optimize_batch_cutting", "http", http, calls, len(request.orders), "orders",
+                         params, optimization_yield)]
+    finally:
+        main.result_cache = ResultCache(max_entries=0)
+
+
+def shortage_yield(responses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    r = responses[-1]
+    predictions = r["predictions"] if "predictions" in r else [r]
+    return {"risk_levels": dict(Counter(p["risk_level"] for p in predictions))}
+
+
+def bench_shortage(client: TestClient, n_profiles: int, calls: int) -> List[dict]:
+    records = []
+    # Single-profile requests forecast from today
+    as_of = date.today()
+    codes = [f"P{i:04d}" for i in range(n_profiles)]
+    history = make_consumption_history(codes, 90, as_of)
+    rng = random.Random(3)
+    stock = [{"profile_code": code, "current_stock_mm": rng.randint(0, 60) * 6500} for code in codes]
+    params = {"profiles": n_profiles, "events": len(history), "history_days": 90}
+
+    single = ShortagePredictionRequest(**stock[0], consumption_history=history)
+    batch = ShortageBatchRequest(items=stock, consumption_history=history, as_of=as_of)
+    single_json = single.model_dump(mode="json")
+    batch_json = batch.model_dump(mode="json")
+
+    def post(url, payload):
+        response = client.post(url, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    cases = [
+        ("predict_shortage", 1, lambda: main.predict_shortage(single), lambda: post("/predict/shortage", single_json)),
+        ("predict_shortage_batch", n_profiles, lambda: main.predict_shortage_batch(batch),
+         lambda: post("/predict/shortage/batch", batch_json)),
+    ]
+    for name, units, direct, http in cases:
+        for path, fn in (("direct", direct), ("http", http)):
+            records.append(run_case(name, path, fn, calls, units, "profiles", params, shortage_yield))
+    return records
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(before_path: str, after_path: str) -> None:
+    with open(before_path, encoding="utf-8") as f:
+        before = {(r["name"], r["path"], json.dumps(r["params"], sort_keys=True)): r for r in json.load(f)["results"]}
+    with open(after_path, encoding="utf-8") as f:
+        after = json.load(f)["results"]
+
+    print(f"{'case':<28}{'path':<14}{'params':<56}{'p50 x':>8}{'p99 x':>8}{'thrpt x':>9}{'mem x':>8}")
+    for r in after:
+        old = before.get((r["name"], r["path"], json.dumps(r["params"], sort_keys=True)))
+        if old is None:
+            continue
+        ratios = [r["p50_ms"] / old["p50_ms"], r["p99_ms"] / old["p99_ms"],
+                  r["throughput"] / old["throughput"], r["peak_mem_mib"] / max(old["peak_mem_mib"], 1e-9)]
+        print(f"{r['name']:<28}{r['path']:<14}{json.dumps(r['params']):<56}" + "".join(f"{x:>8.2f}" for x in ratios))
+        if r["yield"] != old["yield"]:
+            print(f"{'':<36}yield changed: {old['yield']} -> {r['yield']}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default="benchmark-results.json")
+    parser.add_argument("--quick", action="store_true", help="small pools and few calls, for a smoke run")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    pool_sizes = QUICK_POOL_SIZES if args.quick else POOL_SIZES
+    calls = 20 if args.quick else 200
+    client = TestClient(main.app)
+    # Repeated payloads would otherwise be timed as cache hits
+    main.result_cache = ResultCache(max_entries=0)
+
+    print(f"{'case':<28}{'path':<14}{'params':<56}{'p50 [ms]':>10}{'p99 [ms]':>10}{'throughput':>14}")
+    results = []
+    results += bench_optimize(client, pool_sizes, orders_per_group=25 if args.quick else 100,
+                              calls=3 if args.quick else 10)
+    results += bench_recommend(client, pool_sizes, calls)
+    results += bench_cache_hits(client, orders_per_group=25 if args.quick else 100, calls=calls)
+    results += bench_shortage(client, 100 if args.quick else 1000, calls=3 if args.quick else 10)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"wrote {len(results)} results to {args.out}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,80 @@
+import random
+from datetime import date, datetime, timedelta
+from typing import List
+
+from app.models.schema import ConsumptionEvent, OptimizationRequest, OrderItem, WasteItem
+
+# Typical window part lengths and a bar length most profiles ship in
+ORDER_LENGTH_RANGE_MM = (400, 2600)
+WASTE_LENGTH_RANGE_MM = (250, 4000)
+
+
+def group_keys(n_groups: int) -> List[tuple]:
+    colors = ["Biały", "Złoty Dąb", "Winchester XA", "Orzech", "Antracyt"]
+    profiles = [f"10{1200 + i}" for i in range((n_groups + len(colors) - 1) // len(colors))]
+    return [(profile, color) for profile in profiles for color in colors][:n_groups]
+
+
+def make_optimization_request(n_groups: int, orders_per_group: int, waste_per_group: int,
+                              seed: int = 0, **params) -> OptimizationRequest:
+    rng = random.Random(seed)
+    orders = []
+    waste = []
+    for profile_code, color in group_keys(n_groups):
+        for _ in range(orders_per_group):
+            orders.append(OrderItem(
+                order_id=f"o{len(orders)}",
+                profile_code=profile_code,
+                color=color,
+                required_length_mm=rng.randint(*ORDER_LENGTH_RANGE_MM),
+                priority=rng.randint(1, 5),
+            ))
+        for _ in range(waste_per_group):
+            waste.append(WasteItem(
+                id=f"w{len(waste)}",
+                location=f"{rng.randint(1, 25):02d}-{rng.randint(1, 3)}",
+                length_mm=rng.randint(*WASTE_LENGTH_RANGE_MM),
+                profile_code=profile_code,
+                color=color,
+            ))
+    # Interleave groups the way a real batch arrives
+    rng.shuffle(orders)
+    rng.shuffle(waste)
+    return OptimizationRequest(orders=orders, available_waste=waste, **params)
+
+
+def make_waste_pool(n_items: int, n_groups: int, seed: int = 0) -> List[WasteItem]:
+    rng = random.Random(seed)
+    keys = group_keys(n_groups)
+    return [
+        WasteItem(
+            id=f"w{i}",
+            location=f"{rng.randint(1, 25):02d}-{rng.randint(1, 3)}",
+            length_mm=rng.randint(*WASTE_LENGTH_RANGE_MM),
+            profile_code=profile_code,
+            color=color,
+        )
+        for i, (profile_code, color) in enumerate(rng.choice(keys) for _ in range(n_items))
+    ]
+
+
+def make_consumption_history(profile_codes: List[str], days: int, as_of: date,
+                             seed: int = 0) -> List[ConsumptionEvent]:
+    # Whole bars taken on working days, a few profiles much busier than the rest
+    rng = random.Random(seed)
+    events = []
+    for code in profile_codes:
+        bars_per_day = rng.choice([0.2, 1, 1, 2, 5])
+        for d in range(1, days + 1):
+            day = as_of - timedelta(days=d)
+            if day.weekday() >= 5:
+                continue
+            taken = int(rng.expovariate(1 / bars_per_day))
+            if taken:
+                events.append(ConsumptionEvent(
+                    profile_code=code,
+                    quantity_change=-taken,
+                    length_mm=6500,
+                    timestamp=datetime(day.year, day.month, day.day, rng.randint(6, 21)),
+                ))
+    return events
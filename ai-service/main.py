@@ -1,14 +1,66 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response, StreamingResponse
+from pydantic import ValidationError
+from typing import Optional
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+import json
 import os
+import uuid
 from datetime import date, timedelta
 from app.models.schema import (
-    ShortagePredictionRequest, ShortagePredictionResponse,
+    ShortagePredictionRequest, ShortagePredictionResponse, ShortageBatchRequest, ShortageBatchResponse,
     WasteRecommendationRequest, WasteRecommendationResponse,
-    OptimizationRequest, OptimizationResponse
+    WasteRecommendationBatchRequest, WasteRecommendationBatchResponse,
+    OptimizationRequest, OptimizationResponse, OptimizationJobStatus,
+    WasteInventorySnapshot, WasteInventoryDelta, WasteInventoryStatus, ResultCacheStats,
+    OptimizationPlanDelta, PlanReoptimizationResponse, GroupKey, PickStop,
+    MuntinCutListRequest, MuntinCutListResponse, BeadCutListRequest, BeadCutListResponse
 )
-from app.algorithm.waste_optimizer import optimize_batch_cutting
+from app.algorithm.waste_optimizer import (
+    optimize_batch_cutting, iter_group_results, group_rows, waste_rows, batch_settings, lists_patterns,
+    shutdown_executors
+)
+from app.models.columnar import MSGPACK_MEDIA_TYPE, ColumnarFormatError, decode_batch
+from app.algorithm.plan import build_response, iter_stream_chunks
+from app.algorithm.incremental import StoredPlan, apply_plan_delta
+from app.algorithm.shortage_forecast import default_history, predict_shortages
+from app.algorithm.reservations import default_reservations, withhold_reserved
+from app.algorithm.pick_route import default_layout, locations_of, route_picks
+from app.algorithm.muntins import (
+    MuntinLayoutError, cut_list, default_muntin_catalogue, muntin_orders, muntin_pieces
+)
+from app.algorithm.miters import default_profile_catalogue
+from app.algorithm.beads import BeadGeometryError, bead_cut_list, bead_orders, bead_pieces, total_length_mm
+from app.algorithm.color_substitution import CORE_COLOR_PENALTY_MM, core_colored_groups, default_core_colors
+from app.algorithm.waste_recommender import (
+    build_recommendation, recommend_batch, recommendation_route, tightest_fits
+)
+from app.services.optimization_jobs import OptimizationJob, OptimizationJobQueue, JobQueueFull
+from app.services.waste_inventory import WasteInventoryStore, WasteVersionConflict
+from app.services.result_cache import CatalogueVersions, ResultCache, content_key, rows_key
+from app.services.plan_store import PlanStore
+from app.metrics import RequestTimingMiddleware
+
+job_queue = OptimizationJobQueue(optimize_batch_cutting)
+waste_store = WasteInventoryStore()
+result_cache = ResultCache()
+catalogue_versions = CatalogueVersions()
+plan_store = PlanStore()
 
-app = FastAPI(title="Ferplast-magazyn Intelligence API", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    default_core_colors()
+    default_muntin_catalogue()
+    default_profile_catalogue()
+    yield
+    job_queue.shutdown()
+    shutdown_executors()
+
+app = FastAPI(title="Ferplast-magazyn Intelligence API", version="0.1.0", lifespan=lifespan)
+app.add_middleware(RequestTimingMiddleware)
 
 @app.get("/")
 def read_root():
@@ -18,8 +70,114 @@ def read_root():
 def health():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+def _version_conflict(e: WasteVersionConflict) -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail=f"Nieaktualna wersja stanu odpadów. Aktualna wersja: {e.current_version}."
+    )
+
+def _missing_waste() -> HTTPException:
+    return HTTPException(status_code=422, detail="Podaj available_waste albo waste_version.")
+
+def _waste_keys(keys, core_colored) -> list:
+    # The groups to fetch from the store: the batch's own and, for groups
+    # with a colored core, the stored colors with the same core
+    keys = list(dict.fromkeys(keys))
+    index = default_core_colors() if core_colored else None
+    if index is None:
+        return keys
+    substitutes = [
+        (profile_code, substitute)
+        for profile_code, color in keys if (profile_code, color) in core_colored
+        for substitute in index.substitutes(color, waste_store.colors_of(profile_code))
+    ]
+    return keys + substitutes
+
+def _with_waste(request: OptimizationRequest) -> OptimizationRequest:
+    # Version references are swapped for the stored pool of the batch's groups
+    if request.available_waste is not None:
+        return request
+    if request.waste_version is None:
+        raise _missing_waste()
+    keys = _waste_keys(((o.profile_code, o.color) for o in request.orders), core_colored_groups(request.profile_specs))
+    try:
+        waste = waste_store.items_for_keys(keys, request.waste_version)
+    except WasteVersionConflict as e:
+        raise _version_conflict(e)
+    return request.model_copy(update={"available_waste": waste})
+
+def _catalogue_salt() -> str:
+    # Plans and recommendations also read these; a reloaded or rebuilt
+    # catalogue must not serve results made with the previous one
+    return catalogue_versions.stamp(
+        core_colors=default_core_colors(), layout=default_layout(),
+        profiles=default_profile_catalogue(), reservations=default_reservations(),
+    )
+
+def _cache_salt(available_waste, waste_version) -> str:
+    # A version reference hashes the same whatever is stored under it, so the
+    # key also carries the store generation behind that version
+    if available_waste is not None or waste_version is None:
+        return f"/{_catalogue_salt()}"
+    try:
+        generation = waste_store.generation_of(waste_version)
+    except WasteVersionConflict as e:
+        raise _version_conflict(e)
+    return f"{generation}/{_catalogue_salt()}"
+
+def _json_body(body: bytes, cache_status: str) -> Response:
+    return Response(content=body, media_type="application/json", headers={"X-Cache": cache_status})
+
+def _cached(key: str, compute) -> Response:
+    # Serves the stored JSON body, or computes, stores and serves it
+    body = result_cache.get(key)
+    if body is not None:
+        return _json_body(body, "HIT")
+    body = compute().model_dump_json().encode()
+    result_cache.put(key, body)
+    return _json_body(body, "MISS")
+
+@app.get("/cache/stats", response_model=ResultCacheStats)
+def get_cache_stats():
+    return ResultCacheStats(**result_cache.stats())
+
+@app.delete("/cache", response_model=ResultCacheStats)
+def invalidate_cache(namespace: Optional[str] = None):
+    # namespace: "optimize" or "recommend"; everything when omitted
+    result_cache.invalidate(namespace)
+    return get_cache_stats()
+
+@app.put("/inventory/waste", response_model=WasteInventoryStatus)
+def replace_waste_inventory(snapshot: WasteInventorySnapshot):
+    waste_store.replace(snapshot.version, snapshot.items)
+    return get_waste_inventory()
+
+@app.post("/inventory/waste/delta", response_model=WasteInventoryStatus)
+def update_waste_inventory(delta: WasteInventoryDelta):
+    try:
+        waste_store.apply_delta(delta.base_version, delta.version, delta.upserts, delta.deletes)
+    except WasteVersionConflict as e:
+        raise _version_conflict(e)
+    return get_waste_inventory()
+
+@app.get("/inventory/waste", response_model=WasteInventoryStatus)
+def get_waste_inventory():
+    return WasteInventoryStatus(version=waste_store.version, item_count=len(waste_store))
+
 @app.post("/predict/shortage", response_model=ShortagePredictionResponse)
 def predict_shortage(request: ShortagePredictionRequest):
+    history = request.consumption_history
+    if history is None:
+        history = default_history()
+    if history:
+        return predict_shortages([(request.profile_code, request.current_stock_mm)], history,
+                                 request.history_days)[0]
+
+    # No consumption history available: rough estimate from the stock level
     history_window = max(request.history_days, 1)
     daily_usage = max(request.current_stock_mm / history_window, 1.0)
     days_left = int(request.current_stock_mm / daily_usage)
@@ -37,46 +195,289 @@ def predict_shortage(request: ShortagePredictionRequest):
         profile_code=request.profile_code,
         predicted_stockout_date=date.today() + timedelta(days=days_left),
         risk_level=risk,
-        daily_usage_trend=daily_usage
+        daily_usage_trend=daily_usage,
+        days_left=days_left
+    )
+
+@app.post("/predict/shortage/batch", response_model=ShortageBatchResponse)
+def predict_shortage_batch(request: ShortageBatchRequest):
+    history = request.consumption_history
+    if history is None:
+        history = default_history()
+    predictions = predict_shortages(
+        [(item.profile_code, item.current_stock_mm) for item in request.items],
+        history, request.history_days, request.as_of
     )
+    # Whole-catalogue ranking: soonest stockout first, then fastest usage
+    predictions.sort(key=lambda p: (p.days_left is None, p.days_left or 0, -p.daily_usage_trend))
+    return ShortageBatchResponse(predictions=predictions)
 
 @app.post("/recommend/waste", response_model=WasteRecommendationResponse)
 def recommend_waste(request: WasteRecommendationRequest):
-    # Simple logic: Find best fit from provided list
-    best_item = None
-    min_cutoff = float('inf')
-    
-    for item in request.available_waste:
-        if (item.profile_code == request.profile_code and 
-            item.color == request.color and 
-            item.length_mm >= request.required_length_mm):
-            
-            cutoff = item.length_mm - request.required_length_mm
-            # Prefer smaller cutoff (best fit)
-            if cutoff < min_cutoff:
-                min_cutoff = cutoff
-                best_item = item
-                
-    if best_item:
-        return WasteRecommendationResponse(
-            recommended_item_id=best_item.id,
-            waste_length_mm=best_item.length_mm,
-            cutoff_waste_mm=int(min_cutoff),
-            score=max(0.1, 1.0 - (min_cutoff / max(request.required_length_mm, 1))),
-            message=f"Użyj odpadu z lokalizacji {best_item.location}"
-        )
+    key = content_key("recommend", request, salt=_cache_salt(request.available_waste, request.waste_version))
+    return _cached(key, lambda: _recommend_waste(request))
+
+def _recommend_waste(request: WasteRecommendationRequest) -> WasteRecommendationResponse:
+    core_colors = default_core_colors() if request.is_core_colored else None
+    if request.available_waste is not None:
+        matches = tightest_fits(request.available_waste, request.profile_code, request.color,
+                                request.required_length_mm, request.top_k, default_reservations(), core_colors)
+    elif request.waste_version is not None:
+        # Stored inventory is indexed: hash on (profile, color), bisect on length
+        try:
+            matches = waste_store.best_fits(request.profile_code, request.color, request.required_length_mm,
+                                            request.top_k, request.waste_version, default_reservations(),
+                                            core_colors, CORE_COLOR_PENALTY_MM)
+        except WasteVersionConflict as e:
+            raise _version_conflict(e)
     else:
-        return WasteRecommendationResponse(
-            recommended_item_id=None,
-            waste_length_mm=0,
-            cutoff_waste_mm=0,
-            score=0.0,
-            message="Brak pasującego odpadu. Użyj nowej sztangi."
+        raise _missing_waste()
+
+    return build_recommendation(matches, request.required_length_mm, request.color)
+
+@app.post("/recommend/waste/batch", response_model=WasteRecommendationBatchResponse)
+def recommend_waste_batch(request: WasteRecommendationBatchRequest):
+    if request.available_waste is not None:
+        pool = request.available_waste
+    elif request.waste_version is not None:
+        keys = _waste_keys(((q.profile_code, q.color) for q in request.queries),
+                           {(q.profile_code, q.color) for q in request.queries if q.is_core_colored})
+        try:
+            pool = waste_store.items_for_keys(keys, request.waste_version)
+        except WasteVersionConflict as e:
+            raise _version_conflict(e)
+    else:
+        raise _missing_waste()
+
+    if not request.pick_route:
+        return WasteRecommendationBatchResponse(
+            recommendations=recommend_batch(request.queries, pool, request.exclusive, default_reservations(),
+                                            core_colors=default_core_colors())
         )
+    layout = default_layout()
+    recommendations = recommend_batch(request.queries, pool, request.exclusive, default_reservations(), layout,
+                                      default_core_colors())
+    route = recommendation_route(request.queries, recommendations, layout)
+    return WasteRecommendationBatchResponse(
+        recommendations=recommendations,
+        pick_route=[
+            PickStop(waste_id=waste_id, location=location, profile_code=profile_code, color=color)
+            for waste_id, location, profile_code, color, _ in route.stops
+        ],
+        pick_route_distance=route.distance
+    )
+
+_BATCH_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": {"$ref": "#/components/schemas/OptimizationRequest"}},
+            # Columnar orders and waste, see app/models/columnar.py
+            MSGPACK_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}},
+        },
+    }
+}
+
+@app.post("/optimize/batch", response_model=OptimizationResponse, openapi_extra=_BATCH_BODY)
+async def optimize_batch(http_request: Request):
+    # The body is parsed here rather than by FastAPI so a columnar body
+    # never becomes one Pydantic model per order
+    body = await http_request.body()
+    content_type = http_request.headers.get("content-type", "")
+    if content_type.split(";")[0].strip() == MSGPACK_MEDIA_TYPE:
+        return await run_in_threadpool(_optimize_columnar, body)
+    try:
+        request = OptimizationRequest.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in e.errors()])
+    return await run_in_threadpool(_optimize_json, request)
+
+def _plan_key(settings: OptimizationRequest, orders, waste, locations) -> str:
+    # Batches are hashed in row form, so JSON and columnar bodies of the same
+    # batch share a key whatever their whitespace and field order. workers
+    # is kept: it sets each group's solver budget. waste is None for a
+    # version reference; locations only matter to the pick route.
+    rows = [list(orders.items()), list(waste.items()) if waste is not None else None,
+            locations if settings.pick_route else None]
+    return rows_key("optimize", settings, rows, exclude={"orders", "available_waste"},
+                    salt=_cache_salt(waste, settings.waste_version))
+
+def _cached_plan(key: str) -> Optional[Response]:
+    # The content hash doubles as plan id. A cached body is only served
+    # while its plan is still stored, so its plan_id stays usable.
+    body = result_cache.get(key)
+    if body is not None and plan_store.get(key.partition(":")[2]) is not None:
+        return _json_body(body, "HIT")
+    return None
+
+def _plan_batch(key: str, request: OptimizationRequest, orders, waste, locations=None) -> Response:
+    # waste: every offcut, held ones included; the plan keeps them for deltas
+    # locations: waste id -> location, for the pick route
+    plan_id = key.partition(":")[2]
+    free = withhold_reserved(orders, waste)
+    results = list(iter_group_results(request, grouped=(orders, free)))
+    route = None
+    if request.pick_route:
+        results, route = route_picks(results, free, locations or {}, request)
+    plan_store.put(plan_id, StoredPlan(batch_settings(request), orders, waste, {r.key: r for r in results},
+                                       locations or {}))
+    response = build_response(results, request.scrap_threshold_mm, route, lists_patterns(request))
+    response.plan_id = plan_id
+    body = response.model_dump_json().encode()
+    result_cache.put(key, body)
+    return _json_body(body, "MISS")
+
+def _optimize_json(request: OptimizationRequest) -> Response:
+    inline = request.available_waste is not None
+    orders, waste = group_rows(request, reserve=False)
+    key = _plan_key(request, orders, waste if inline else None, locations_of(request.available_waste))
+    cached = _cached_plan(key)
+    if cached is not None:
+        return cached
+    if not inline:
+        request = _with_waste(request)
+        waste = waste_rows(request.available_waste)
+    return _plan_batch(key, request, orders, waste, locations_of(request.available_waste))
+
+def _optimize_columnar(body: bytes) -> Response:
+    try:
+        batch = decode_batch(body)
+    except ColumnarFormatError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ValidationError as e:
+        raise RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in e.errors()])
+    settings = batch.settings
+    # Inline columnar waste carries no locations
+    waste, locations = batch.waste, {}
+    key = _plan_key(settings, batch.orders, waste, locations)
+    cached = _cached_plan(key)
+    if cached is not None:
+        return cached
+    if waste is None:
+        if settings.waste_version is None:
+            raise _missing_waste()
+        try:
+            keys = _waste_keys(batch.orders, core_colored_groups(settings.profile_specs))
+            items = waste_store.items_for_keys(keys, settings.waste_version)
+        except WasteVersionConflict as e:
+            raise _version_conflict(e)
+        waste, locations = waste_rows(items), locations_of(items)
+    return _plan_batch(key, settings, batch.orders, waste, locations)
+
+@app.post("/optimize/plans/{plan_id}/delta", response_model=PlanReoptimizationResponse)
+def reoptimize_plan(plan_id: str, delta: OptimizationPlanDelta):
+    plan = plan_store.get(plan_id)
+    if plan is None:
+        raise HTTPException(status_code=404, detail="Plan nie istnieje lub wygasł. Wyślij /optimize/batch ponownie.")
+    new_plan, resolved = apply_plan_delta(plan, delta)
+    route = None
+    if new_plan.settings.pick_route:
+        free = withhold_reserved(new_plan.orders, new_plan.waste)
+        results, route = route_picks(new_plan.results.values(), free, new_plan.locations,
+                                     new_plan.settings)
+        new_plan = new_plan._replace(results={r.key: r for r in results})
+    new_plan_id = uuid.uuid4().hex
+    plan_store.put(new_plan_id, new_plan)
+
+    response = build_response(new_plan.results.values(), new_plan.settings.scrap_threshold_mm, route,
+                              lists_patterns(new_plan.settings))
+    return PlanReoptimizationResponse(
+        **{**dict(response), "plan_id": new_plan_id},
+        base_plan_id=plan_id,
+        resolved_groups=[GroupKey(profile_code=p, color=c) for p, c in resolved]
+    )
+
+@app.post("/optimize/batch/stream")
+def optimize_batch_stream(request: OptimizationRequest):
+    # NDJSON: cut/pattern records as each (profile, color) group finishes,
+    # then a summary record with the batch totals
+    if request.pick_route:
+        # The route reorders picks across all groups, after the last one is solved
+        raise HTTPException(status_code=422,
+                            detail="pick_route nie jest obsługiwane w strumieniu. Użyj /optimize/batch.")
+    request = _with_waste(request)
+
+    def lines():
+        chunks = iter_stream_chunks(iter_group_results(request), request.scrap_threshold_mm,
+                                    lists_patterns(request))
+        for chunk in chunks:
+            yield "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in chunk)
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+def _job_status(job: OptimizationJob) -> OptimizationJobStatus:
+    return OptimizationJobStatus(
+        job_id=job.job_id,
+        status=job.status,
+        groups_done=job.groups_done,
+        groups_total=job.groups_total,
+        submitted_at=job.submitted_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        error=job.error,
+        result=job.result
+    )
+
+@app.post("/optimize/jobs", response_model=OptimizationJobStatus, status_code=202)
+def submit_optimization_job(request: OptimizationRequest):
+    try:
+        job = job_queue.submit(_with_waste(request))
+    except JobQueueFull:
+        raise HTTPException(status_code=503, detail="Kolejka optymalizacji jest pełna. Spróbuj ponownie później.")
+    return _job_status(job)
+
+@app.get("/optimize/jobs/{job_id}", response_model=OptimizationJobStatus)
+def get_optimization_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Nie znaleziono zadania (mogło wygasnąć).")
+    return _job_status(job)
 
-@app.post("/optimize/batch", response_model=OptimizationResponse)
-def optimize_batch(request: OptimizationRequest):
-    return optimize_batch_cutting(request)
+@app.delete("/optimize/jobs/{job_id}", response_model=OptimizationJobStatus)
+def cancel_optimization_job(job_id: str):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Nie znaleziono zadania (mogło wygasnąć).")
+    return _job_status(job)
+
+@app.post("/muntins/cut-list", response_model=MuntinCutListResponse)
+def muntin_cut_list(request: MuntinCutListRequest):
+    catalogue = default_muntin_catalogue()
+    if catalogue is None:
+        raise HTTPException(status_code=503, detail="Brak katalogu szprosów (MUNTINS_V3_PATH).")
+    try:
+        pieces = muntin_pieces(request.windows, catalogue, request.bead_clearance_mm,
+                               request.muntin_clearance_mm, request.saw_offset_mm)
+    except MuntinLayoutError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    plan = None
+    if request.optimization is not None:
+        settings = request.optimization
+        orders = settings.orders + muntin_orders(request.windows, pieces)
+        plan = optimize_batch_cutting(_with_waste(settings.model_copy(update={"orders": orders})))
+    return MuntinCutListResponse(
+        cuts=cut_list(request.windows, pieces),
+        total_length_mm=round(sum(p.length_mm * p.count for p in pieces), 1),
+        plan=plan
+    )
+
+@app.post("/beads/cut-list", response_model=BeadCutListResponse)
+def bead_cut_list_endpoint(request: BeadCutListRequest):
+    try:
+        pieces = bead_pieces(request.openings, default_profile_catalogue(), request.dimensions, request.clearance_mm)
+    except BeadGeometryError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    plan = None
+    if request.optimization is not None:
+        settings = request.optimization
+        orders = settings.orders + bead_orders(request.openings, pieces)
+        plan = optimize_batch_cutting(_with_waste(settings.model_copy(update={"orders": orders})))
+    return BeadCutListResponse(
+        cuts=bead_cut_list(request.openings, pieces),
+        total_length_mm=total_length_mm(request.openings, pieces),
+        plan=plan
+    )
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,75 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app.algorithm import miters
+from app.algorithm.beads import BeadGeometryError, bead_cut_list, bead_pieces
+from app.algorithm.miters import ProfileGeometry
+from app.models.schema import BeadOpening
+from main import app
+
+client = TestClient(app)
+
+# Sash 80 mm high with 20 mm beads mitered at 45 degrees; frame with square-cut beads
+CATALOGUE = {
+    "S82": ProfileGeometry(80.0, 82.0, 20.0, 45.0),
+    "R70": ProfileGeometry(60.0, 70.0, 25.0, 0.0),
+    "X": ProfileGeometry(0.0, 0.0, 20.0, 45.0),
+}
+
+
+@pytest.fixture(autouse=True)
+def catalogue(monkeypatch):
+    monkeypatch.setattr(main, "default_profile_catalogue", lambda: CATALOGUE)
+    monkeypatch.setattr(miters, "default_profile_catalogue", lambda: CATALOGUE)
+
+
+def opening(opening_id, profile_code, width, height, **kw):
+    return BeadOpening(opening_id=opening_id, profile_code=profile_code, width_mm=width, height_mm=height, **kw)
+
+
+def test_lengths_from_outer_and_rebate_sizes():
+    openings = [opening("A", "S82", 1000, 1400), opening("B", "R70", 800, 600)]
+    pieces = bead_pieces(openings, CATALOGUE, clearance_mm=1.0)
+    assert pieces.long_mm.tolist() == [[839.0, 1239.0], [679.0, 479.0]]
+    assert pieces.short_mm.tolist() == [[799.0, 1199.0], [679.0, 479.0]]
+    assert pieces.angle_deg.tolist() == [45.0, 90.0]
+
+    pieces = bead_pieces([opening("C", "X", 500, 500)], CATALOGUE, dimensions="rebate")
+    assert pieces.long_mm.tolist() == [[500.0, 500.0]]
+
+
+def test_cut_rows_name_each_opening_once():
+    # A window listed again later, e.g. a second line of the same order
+    openings = [opening("A", "S82", 1000, 1400), opening("B", "S82", 1000, 1400), opening("A", "S82", 1000, 1400)]
+    rows = bead_cut_list(openings, bead_pieces(openings, CATALOGUE))
+    assert [row.opening_ids for row in rows] == [["A", "B"], ["A", "B"]]
+    assert [row.quantity for row in rows] == [6, 6]
+
+
+def test_missing_geometry_and_small_openings_are_rejected():
+    with pytest.raises(BeadGeometryError, match="X, Y"):
+        bead_pieces([opening("A", "X", 500, 500), opening("B", "Y", 500, 500)], CATALOGUE)
+    with pytest.raises(BeadGeometryError, match="Otwór A"):
+        bead_pieces([opening("A", "S82", 180, 500)], CATALOGUE)
+
+
+def test_endpoint_groups_beads_and_nests_them_on_bars():
+    openings = [opening(f"O{i}", "S82", 980, 980, color="White", quantity=2).model_dump() for i in range(3)]
+    body = client.post("/beads/cut-list", json={"openings": openings}).json()
+    assert [(c["profile_code"], c["length_mm"], c["short_length_mm"], c["quantity"]) for c in body["cuts"]] == [
+        ("S82-L", 820, 780, 24)]
+    assert body["cuts"][0]["opening_ids"] == ["O0", "O1", "O2"]
+    assert body["total_length_mm"] == 24 * 820 and body["plan"] is None
+
+    settings = {"orders": [], "available_waste": [], "algorithm": "ffd"}
+    plain = client.post("/beads/cut-list", json={"openings": openings, "optimization": settings}).json()["plan"]
+    nested = client.post("/beads/cut-list", json={
+        "openings": openings, "optimization": {**settings, "miter_nesting": True},
+    }).json()["plan"]
+    assert len(plain["cuts"]) == len(nested["cuts"]) == 24
+    # 7 beads per bar square-ended, 8 sharing 20 mm diagonals
+    assert (plain["total_new_bars_count"], nested["total_new_bars_count"]) == (4, 3)
+
+    response = client.post("/beads/cut-list", json={"openings": [opening("A", "Y", 500, 500).model_dump()]})
+    assert response.status_code == 422
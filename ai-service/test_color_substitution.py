@@ -0,0 +1,94 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app.algorithm import waste_optimizer
+from app.algorithm.color_substitution import CoreColorIndex, substitution_gain
+from app.algorithm.waste_optimizer import optimize_batch_cutting
+from app.models.schema import OptimizationRequest, OrderItem, ProfileSpec, WasteItem
+from main import app
+
+client = TestClient(app)
+
+CORES = CoreColorIndex({"Orzech": "brąz", "Mahoń": "brąz", "Złoty Dąb": "karmel"})
+
+
+@pytest.fixture
+def core_colors(monkeypatch):
+    monkeypatch.setattr(waste_optimizer, "default_core_colors", lambda: CORES)
+    monkeypatch.setattr(main, "default_core_colors", lambda: CORES)
+
+
+def waste(item_id, length, color, location="01-1"):
+    return WasteItem(id=item_id, location=location, length_mm=length, profile_code="P1", color=color)
+
+
+def request_for(orders, pool, core_colored=True):
+    return OptimizationRequest(
+        orders=[OrderItem(order_id=o, profile_code="P1", color="Orzech", required_length_mm=n) for o, n in orders],
+        available_waste=pool,
+        profile_specs=[ProfileSpec(profile_code="P1", color="Orzech", is_core_colored=core_colored)],
+    )
+
+
+def test_core_of_follows_the_map_and_white_foils():
+    assert CORES.core_of("orzech") == "brąz"
+    assert CORES.core_of("RAL 9016 mat") == "biały"
+    assert CORES.core_of("Antracyt") is None
+    assert CORES.substitutes("Orzech", ["Orzech", "Mahoń", "Złoty Dąb"]) == ["Mahoń"]
+
+    # Request colors outside the map are not kept
+    index = CoreColorIndex({"Orzech": "brąz"})
+    for n in range(1000):
+        index.core_of(f"Folia {n}")
+    assert len(index._core) == 1
+
+
+def test_core_colored_group_borrows_an_offcut_instead_of_a_new_bar(core_colors):
+    pool = [waste("m1", 2100, "Mahoń"), waste("z1", 2100, "Złoty Dąb")]
+    response = optimize_batch_cutting(request_for([("a", 2000)], pool))
+    assert response.total_new_bars_count == 0
+    assert [(c.source_type, c.source_id) for c in response.cuts] == [("WASTE", "m1")]
+
+    # Without is_core_colored, or without a map, only the group's own color fits
+    assert optimize_batch_cutting(request_for([("a", 2000)], pool, core_colored=False)).total_new_bars_count == 1
+    with pytest.MonkeyPatch.context() as m:
+        m.setattr(waste_optimizer, "default_core_colors", lambda: None)
+        assert optimize_batch_cutting(request_for([("a", 2000)], pool)).total_new_bars_count == 1
+
+
+def test_offcut_used_by_its_own_group_is_not_lent(core_colors):
+    request = request_for([("a", 2000)], [waste("m1", 2100, "Mahoń")])
+    request.orders.append(OrderItem(order_id="b", profile_code="P1", color="Mahoń", required_length_mm=2050))
+    response = optimize_batch_cutting(request)
+    assert {c.order_id: c.source_type for c in response.cuts} == {"a": "NEW_BAR", "b": "WASTE"}
+
+
+def test_penalty_outweighs_a_small_scrap_saving():
+    result = waste_optimizer.solve_group(("P1", "Orzech"), [(("a", 6300, 1), 1)], [], request_for([], []), 1.0)
+    # Same bars, 150 mm less scrap with one substitute: not worth 300 mm
+    substituted = result._replace(scrap_mm=result.scrap_mm - 150,
+                                  cuts=result.cuts + [("b", "WASTE", "m1", 0, None)])
+    assert not substitution_gain(result, substituted, ["m1"], penalty_mm=300)
+    assert substitution_gain(result, substituted, ["m1"], penalty_mm=100)
+    # No substitute cut: never a gain
+    assert not substitution_gain(result, result, ["m1"], penalty_mm=0)
+
+
+def test_recommendations_offer_substitutes_with_their_color(core_colors):
+    pool = [waste("o1", 1600, "Orzech").model_dump(), waste("m1", 1250, "Mahoń").model_dump(),
+            waste("z1", 1210, "Złoty Dąb").model_dump()]
+    query = {"profile_code": "P1", "color": "Orzech", "required_length_mm": 1200, "top_k": 3}
+    body = client.post("/recommend/waste", json={**query, "available_waste": pool, "is_core_colored": True}).json()
+    assert body["recommended_item_id"] == "m1"
+    assert "Mahoń" in body["message"]
+    # Ranked as 1250 + 300 mm penalty: ahead of 1600 of the own color; Złoty Dąb has another core
+    assert [(a["waste_id"], a["color"]) for a in body["alternatives"]] == [("m1", "Mahoń"), ("o1", None)]
+
+    body = client.post("/recommend/waste", json={**query, "available_waste": pool}).json()
+    assert [a["waste_id"] for a in body["alternatives"]] == ["o1"]
+
+    batch = client.post("/recommend/waste/batch", json={
+        "queries": [{**query, "is_core_colored": True}], "available_waste": pool,
+    }).json()
+    assert batch["recommendations"][0]["recommended_item_id"] == "m1"
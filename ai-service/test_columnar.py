@@ -0,0 +1,70 @@
+import json
+import random
+
+import msgpack
+from fastapi.testclient import TestClient
+
+from app.models.columnar import MSGPACK_MEDIA_TYPE, encode_batch
+from main import app
+from test_optimizer_equivalence import random_request
+
+client = TestClient(app)
+HEADERS = {"Content-Type": MSGPACK_MEDIA_TYPE}
+
+
+def test_columnar_body_gives_the_json_plan():
+    rng = random.Random(17)
+    for algorithm in ("greedy", "ffd"):
+        request = random_request(rng, 120, 60).model_copy(update={"algorithm": algorithm})
+        by_json = client.post("/optimize/batch", json=request.model_dump(mode="json"))
+        client.delete("/cache")
+        by_columns = client.post("/optimize/batch", content=encode_batch(request), headers=HEADERS)
+        assert by_columns.status_code == 200
+        assert by_columns.headers["X-Cache"] == "MISS"
+        # Same batch, same key: the plan id is the same too
+        assert by_json.json() == by_columns.json()
+
+        again = client.post("/optimize/batch", content=encode_batch(request), headers=HEADERS)
+        assert again.headers["X-Cache"] == "HIT"
+        # A JSON body of the batch, keys reordered, is served the columnar plan
+        reordered = dict(reversed(list(request.model_dump(mode="json").items())))
+        again = client.post("/optimize/batch", content=json.dumps(reordered, indent=2),
+                            headers={"Content-Type": "application/json"})
+        assert again.headers["X-Cache"] == "HIT"
+
+
+def test_plain_integer_arrays_and_stored_waste():
+    snapshot = {"version": 30, "items": [
+        {"id": "cw1", "location": "02-1", "length_mm": 1300, "profile_code": "COL", "color": "White"},
+    ]}
+    client.put("/inventory/waste", json=snapshot)
+    body = msgpack.packb({
+        "profiles": ["COL"],
+        "colors": ["White"],
+        "orders": {"order_id": ["a", "b"], "profile": [0, 0], "color": [0, 0], "required_length_mm": [1200, 5800]},
+        "waste_version": 30,
+    })
+    response = client.post("/optimize/batch", content=body, headers=HEADERS).json()
+    assert [(c["order_id"], c["source_type"], c["source_id"]) for c in response["cuts"]] == [
+        ("b", "NEW_BAR", None), ("a", "WASTE", "cw1")
+    ]
+
+    stale = msgpack.packb({**msgpack.unpackb(body), "waste_version": 29})
+    assert client.post("/optimize/batch", content=stale, headers=HEADERS).status_code == 409
+
+
+def test_malformed_columns_are_rejected():
+    base = {
+        "profiles": ["P1"],
+        "colors": ["White"],
+        "orders": {"order_id": ["a"], "profile": [0], "color": [0], "required_length_mm": [1000]},
+        "available_waste": {"id": [], "profile": [], "color": [], "length_mm": []},
+    }
+    bad_code = {**base, "orders": {**base["orders"], "color": [1]}}
+    short_column = {**base, "orders": {**base["orders"], "required_length_mm": []}}
+    bad_setting = {**base, "algorithm": "simplex"}
+    for payload in (bad_code, short_column, bad_setting):
+        response = client.post("/optimize/batch", content=msgpack.packb(payload), headers=HEADERS)
+        assert response.status_code == 422
+    assert client.post("/optimize/batch", content=b"\xc1", headers=HEADERS).status_code == 422
+    assert client.post("/optimize/batch", content=msgpack.packb(base), headers=HEADERS).status_code == 200
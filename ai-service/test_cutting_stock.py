@@ -0,0 +1,108 @@
+import random
+
+import pytest
+from pydantic import ValidationError
+
+from app.algorithm import waste_optimizer
+from app.algorithm.waste_optimizer import optimize_batch_cutting, resolve_workers
+from app.models.schema import OptimizationRequest, OrderItem, WasteItem
+from test_optimizer_equivalence import random_request
+
+
+def assert_valid_plan(request: OptimizationRequest, response):
+    lengths = {o.order_id: o.required_length_mm for o in request.orders}
+    waste = {w.id: w.length_mm for w in request.available_waste}
+
+    cut_ids = sorted(piece.order_id for p in response.patterns for piece in p.pieces)
+    assert cut_ids == sorted(lengths)
+    assert sorted(c.order_id for c in response.cuts) == sorted(lengths)
+
+    used_waste = [p.source_id for p in response.patterns if p.source_type == "WASTE"]
+    assert len(used_waste) == len(set(used_waste))
+    for p in response.patterns:
+        if p.source_type == "WASTE":
+            assert p.stock_length_mm == waste[p.source_id]
+        else:
+            assert p.stock_length_mm == request.full_bar_length_mm
+        used = sum(piece.length_mm for piece in p.pieces)
+        assert p.remnant_mm == p.stock_length_mm - used >= 0
+
+    assert response.total_new_bars_count == sum(1 for p in response.patterns if p.source_type == "NEW_BAR")
+    assert response.total_waste_used_count == len(used_waste)
+
+
+def test_ffd_and_exact_produce_valid_plans():
+    rng = random.Random(7)
+    for _ in range(40):
+        request = random_request(rng, rng.randint(0, 30), rng.randint(0, 20))
+        for algorithm in ("ffd", "exact"):
+            response = optimize_batch_cutting(request.model_copy(update={"algorithm": algorithm}))
+            assert_valid_plan(request, response)
+
+
+def test_exact_never_opens_more_bars_than_ffd():
+    rng = random.Random(11)
+    for _ in range(25):
+        request = random_request(rng, rng.randint(5, 25), rng.randint(0, 10))
+        ffd = optimize_batch_cutting(request.model_copy(update={"algorithm": "ffd"}))
+        exact = optimize_batch_cutting(request.model_copy(update={"algorithm": "exact", "time_limit_ms": 200}))
+        assert exact.total_new_bars_count <= ffd.total_new_bars_count
+
+
+def test_exact_finds_perfect_packing_greedy_misses():
+    # 3750+1750+1000 and 2000+2000+1500+1000 fill two 6500 bars exactly;
+    # best fit puts 2000 next to 3750 and needs a third bar.
+    lengths = [3750, 2000, 2000, 1750, 1500, 1000, 1000]
+    orders = [
+        OrderItem(order_id=f"o{i}", profile_code="P1", color="White", required_length_mm=length)
+        for i, length in enumerate(lengths)
+    ]
+    request = OptimizationRequest(orders=orders, available_waste=[])
+
+    assert optimize_batch_cutting(request).total_new_bars_count == 3
+    assert optimize_batch_cutting(request.model_copy(update={"algorithm": "ffd"})).total_new_bars_count == 3
+    exact = optimize_batch_cutting(request.model_copy(update={"algorithm": "exact"}))
+    assert exact.total_new_bars_count == 2
+    assert exact.total_scrap_generated_mm == 0
+    assert_valid_plan(request, exact)
+
+
+def test_patterns_use_warehouse_waste_first():
+    orders = [
+        OrderItem(order_id="o1", profile_code="P1", color="White", required_length_mm=1200),
+        OrderItem(order_id="o2", profile_code="P1", color="White", required_length_mm=800),
+    ]
+    waste = [WasteItem(id="w1", location="A1", length_mm=2000, profile_code="P1", color="White")]
+    request = OptimizationRequest(orders=orders, available_waste=waste, algorithm="exact")
+
+    response = optimize_batch_cutting(request)
+    assert response.total_new_bars_count == 0
+    assert [p.source_id for p in response.patterns] == ["w1"]
+    assert [piece.order_id for piece in response.patterns[0].pieces] == ["o1", "o2"]
+
+
+def test_parallel_groups_merge_in_request_order():
+    rng = random.Random(3)
+    request = random_request(rng, 80, 60)
+    for algorithm in ("greedy", "ffd"):
+        serial = optimize_batch_cutting(request.model_copy(update={"algorithm": algorithm, "workers": 1}))
+        parallel = optimize_batch_cutting(request.model_copy(update={"algorithm": algorithm, "workers": 2}))
+        assert parallel.model_dump() == serial.model_dump()
+
+
+def test_workers_are_bounded(monkeypatch):
+    monkeypatch.setattr(waste_optimizer, "MAX_WORKERS", 4)
+    assert [resolve_workers(n) for n in (1, 4, 64, 0)] == [1, 4, 4, 4]
+    with pytest.raises(ValidationError):
+        OptimizationRequest(orders=[], available_waste=[], workers=100000)
+
+
+def test_requests_share_one_pool():
+    rng = random.Random(5)
+    pools = set()
+    for orders in (10, 40):
+        request = random_request(rng, orders, 10).model_copy(update={"algorithm": "ffd", "workers": 2})
+        optimize_batch_cutting(request)
+        pools.add(id(waste_optimizer._get_executor()))
+    assert len(pools) == 1
+    assert waste_optimizer._get_executor()._max_workers == waste_optimizer.MAX_WORKERS
@@ -0,0 +1,107 @@
+import random
+
+from fastapi.testclient import TestClient
+
+from app.models.schema import OptimizationRequest, OptimizationResponse
+from main import app
+from test_cutting_stock import assert_valid_plan
+from test_optimizer_equivalence import random_request
+
+client = TestClient(app)
+
+
+def order(order_id, length, profile_code="P1", color="White"):
+    return {"order_id": order_id, "profile_code": profile_code, "color": color, "required_length_mm": length}
+
+
+def waste(waste_id, length, profile_code="P1", color="White"):
+    return {"id": waste_id, "location": "01-1", "length_mm": length, "profile_code": profile_code, "color": color}
+
+
+def test_delta_replans_only_touched_groups():
+    orders = [order("a1", 2000), order("a2", 1500), order("b1", 3000, "P2"), order("b2", 1000, "P2")]
+    pool = [waste("w1", 2100), waste("w2", 1200), waste("w3", 3500, "P2")]
+    base = client.post("/optimize/batch", json={"orders": orders, "available_waste": pool}).json()
+
+    delta = {"add_orders": [order("a3", 800)], "remove_waste_ids": ["w3"]}
+    # w3 carries b1, so P2 is re-planned too; w2 is unused, removing it changes nothing
+    replanned = client.post(f"/optimize/plans/{base['plan_id']}/delta", json=delta).json()
+    assert replanned["base_plan_id"] == base["plan_id"]
+    assert replanned["resolved_groups"] == [{"profile_code": "P1", "color": "White"},
+                                            {"profile_code": "P2", "color": "White"}]
+    assert "w3" not in [c["source_id"] for c in replanned["cuts"]]
+
+    unused = client.post(f"/optimize/plans/{replanned['plan_id']}/delta", json={"remove_waste_ids": ["w2"]}).json()
+    assert unused["resolved_groups"] == []
+    assert unused["cuts"] == replanned["cuts"]
+
+    assert client.post("/optimize/plans/unknown/delta", json={}).status_code == 404
+
+
+def test_ffd_repair_keeps_existing_patterns():
+    orders = [order(f"o{i}", length) for i, length in enumerate([3000, 2500, 2000, 1800, 1200, 900])]
+    base = client.post("/optimize/batch", json={"orders": orders, "available_waste": [], "algorithm": "ffd"}).json()
+
+    replanned = client.post(f"/optimize/plans/{base['plan_id']}/delta",
+                            json={"add_orders": [order("new", 400)], "remove_order_ids": ["o5"]}).json()
+    old = [[p["order_id"] for p in pattern["pieces"] if p["order_id"] != "o5"] for pattern in base["patterns"]]
+    new = [[p["order_id"] for p in pattern["pieces"]] for pattern in replanned["patterns"]]
+    for kept, pattern in zip(old, new):
+        assert pattern[:len(kept)] == kept
+    assert sorted(sum(new, [])) == sorted([o["order_id"] for o in orders[:5]] + ["new"])
+
+
+def test_greedy_plans_are_repaired_too():
+    orders = [order(f"o{i}", length) for i, length in enumerate([3000, 2500, 2000, 1800, 1200, 900])]
+    base = client.post("/optimize/batch", json={"orders": orders, "available_waste": [],
+                                                "include_patterns": True}).json()
+    replanned = client.post(f"/optimize/plans/{base['plan_id']}/delta",
+                            json={"remove_order_ids": ["o0"]}).json()
+    # A fresh greedy run would put 2500, 2000 and 1800 on one bar; the repair keeps every piece in place
+    old = [[p["order_id"] for p in pattern["pieces"] if p["order_id"] != "o0"] for pattern in base["patterns"]]
+    assert [[p["order_id"] for p in pattern["pieces"]] for pattern in replanned["patterns"]] == old
+
+
+def test_delta_rebuilds_the_pick_route():
+    pool = [{**waste("w1", 2100), "location": "01-1"}, {**waste("w2", 1600), "location": "02-1"}]
+    base = client.post("/optimize/batch", json={"orders": [order("a", 2000)], "available_waste": pool,
+                                                "pick_route": True}).json()
+    assert [s["waste_id"] for s in base["pick_route"]] == ["w1"]
+    replanned = client.post(f"/optimize/plans/{base['plan_id']}/delta",
+                            json={"add_orders": [order("b", 1500)]}).json()
+    assert [s["waste_id"] for s in replanned["pick_route"]] == ["w1", "w2"]
+    assert replanned["pick_route_distance"] is not None
+
+
+def test_random_deltas_match_full_request_validity():
+    rng = random.Random(21)
+    for _ in range(15):
+        request = random_request(rng, rng.randint(5, 40), rng.randint(0, 20))
+        request = request.model_copy(update={"algorithm": rng.choice(["greedy", "ffd"]), "include_patterns": True})
+        payload = request.model_dump(mode="json")
+        base = client.post("/optimize/batch", json=payload).json()
+
+        removed_orders = [o["order_id"] for o in payload["orders"] if rng.random() < 0.2]
+        removed_waste = [w["id"] for w in payload["available_waste"] if rng.random() < 0.2]
+        added = [order(f"x{i}", rng.randint(300, 3000), rng.choice(["P1", "P2"])) for i in range(rng.randint(0, 4))]
+        delta = {"add_orders": added, "remove_order_ids": removed_orders, "remove_waste_ids": removed_waste}
+        replanned = client.post(f"/optimize/plans/{base['plan_id']}/delta", json=delta).json()
+
+        final = OptimizationRequest(**{
+            **payload,
+            "orders": [o for o in payload["orders"] if o["order_id"] not in removed_orders] + added,
+            "available_waste": [w for w in payload["available_waste"] if w["id"] not in removed_waste],
+        })
+        response = OptimizationResponse(**replanned)
+        assert sorted(c.order_id for c in response.cuts) == sorted(o.order_id for o in final.orders)
+        assert_valid_plan(final, response)
+
+
+def test_greedy_responses_list_patterns_only_when_asked():
+    body = {"orders": [order("a", 2000), order("b", 1500)], "available_waste": []}
+    plain = client.post("/optimize/batch", json=body).json()
+    assert plain["patterns"] == []
+    # The stored plan keeps them: a delta still repairs in place
+    replanned = client.post(f"/optimize/plans/{plain['plan_id']}/delta", json={"add_orders": [order("c", 900)]}).json()
+    assert replanned["patterns"] == []
+    assert len(client.post("/optimize/batch", json={**body, "include_patterns": True}).json()["patterns"]) == 1
@@ -0,0 +1,54 @@
+import random
+
+from app.algorithm.waste_optimizer import optimize_batch_cutting
+from app.models.schema import OptimizationRequest, OrderItem, WasteItem
+from test_optimizer_equivalence import random_request
+
+
+def orders_of(*lengths):
+    return [OrderItem(order_id=f"o{i}", profile_code="P1", color="White", required_length_mm=length)
+            for i, length in enumerate(lengths)]
+
+
+def test_greedy_remnants_lose_kerf_and_trim():
+    request = OptimizationRequest(orders=orders_of(3000, 3000), available_waste=[], kerf_mm=4, end_trim_mm=10)
+    response = optimize_batch_cutting(request)
+    # 6500 - 10 trim - 3000 - 4 kerf, then another 3000 + 4 kerf
+    assert [c.waste_created_mm for c in response.cuts] == [3486, 482]
+    assert response.total_new_bars_count == 1
+
+
+def test_last_cut_needs_no_kerf():
+    request = OptimizationRequest(orders=orders_of(3250, 3245), available_waste=[], kerf_mm=5)
+    for algorithm in ("greedy", "ffd", "exact"):
+        response = optimize_batch_cutting(request.model_copy(update={"algorithm": algorithm}))
+        assert response.total_new_bars_count == 1
+        assert sorted(c.waste_created_mm for c in response.cuts) == [0, 3245]
+
+
+def test_trim_decides_which_offcuts_fit():
+    waste = [
+        WasteItem(id="short", location="01-1", length_mm=1005, profile_code="P1", color="White"),
+        WasteItem(id="exact", location="01-2", length_mm=1010, profile_code="P1", color="White"),
+    ]
+    request = OptimizationRequest(orders=orders_of(1000), available_waste=waste, kerf_mm=3, end_trim_mm=10)
+    for algorithm in ("greedy", "ffd"):
+        cut = optimize_batch_cutting(request.model_copy(update={"algorithm": algorithm})).cuts[0]
+        assert (cut.source_id, cut.waste_created_mm) == ("exact", 0)
+
+
+def test_patterns_respect_kerf_and_trim():
+    rng = random.Random(17)
+    for _ in range(30):
+        kerf, trim = rng.choice([0, 3, 5]), rng.choice([0, 10, 25])
+        base = random_request(rng, rng.randint(1, 25), rng.randint(0, 12))
+        for algorithm in ("ffd", "exact"):
+            request = base.model_copy(update={"algorithm": algorithm, "kerf_mm": kerf, "end_trim_mm": trim,
+                                              "time_limit_ms": 100})
+            response = optimize_batch_cutting(request)
+            for p in response.patterns:
+                used = sum(piece.length_mm for piece in p.pieces)
+                # Every cut but a last one that leaves nothing behind costs a kerf
+                left = p.stock_length_mm - trim - used - kerf * len(p.pieces)
+                assert p.remnant_mm == max(left, 0)
+                assert left >= -kerf
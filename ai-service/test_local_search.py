@@ -0,0 +1,62 @@
+import json
+import random
+
+from fastapi.testclient import TestClient
+
+from app.algorithm.waste_optimizer import optimize_batch_cutting
+from app.models.schema import OptimizationRequest, OrderItem
+from main import app
+from test_cutting_stock import assert_valid_plan
+from test_optimizer_equivalence import random_request
+
+client = TestClient(app)
+
+
+def test_local_search_never_loses_to_greedy():
+    rng = random.Random(18)
+    for _ in range(15):
+        request = random_request(rng, rng.randint(1, 120), rng.randint(0, 40))
+        greedy = optimize_batch_cutting(request)
+        local = optimize_batch_cutting(request.model_copy(update={"algorithm": "local", "time_limit_ms": 30}))
+        assert_valid_plan(request, local)
+
+        improvement = local.improvement
+        assert improvement.baseline_new_bars_count == greedy.total_new_bars_count
+        assert improvement.baseline_scrap_generated_mm == greedy.total_scrap_generated_mm
+        assert improvement.new_bars_saved == greedy.total_new_bars_count - local.total_new_bars_count
+        assert improvement.scrap_saved_mm == greedy.total_scrap_generated_mm - local.total_scrap_generated_mm
+        assert (local.total_new_bars_count, local.total_scrap_generated_mm) <= \
+            (greedy.total_new_bars_count, greedy.total_scrap_generated_mm)
+
+
+def test_local_search_finds_packing_greedy_misses():
+    # Same instance as the exact solver's test: greedy needs a third bar
+    lengths = [3750, 2000, 2000, 1750, 1500, 1000, 1000]
+    orders = [
+        OrderItem(order_id=f"o{i}", profile_code="P1", color="White", required_length_mm=length)
+        for i, length in enumerate(lengths)
+    ]
+    request = OptimizationRequest(orders=orders, available_waste=[], algorithm="local", time_limit_ms=2000)
+
+    response = optimize_batch_cutting(request)
+    assert response.total_new_bars_count == 2
+    assert response.total_scrap_generated_mm == 0
+    assert response.improvement.new_bars_saved == 1
+    assert_valid_plan(request, response)
+
+
+def test_zero_budget_returns_the_greedy_plan():
+    request = random_request(random.Random(4), 60, 20)
+    greedy = optimize_batch_cutting(request)
+    local = optimize_batch_cutting(request.model_copy(update={"algorithm": "local", "time_limit_ms": 0}))
+    assert sorted((c.order_id, c.source_id) for c in local.cuts if c.source_type == "WASTE") == \
+        sorted((c.order_id, c.source_id) for c in greedy.cuts if c.source_type == "WASTE")
+    assert local.improvement.new_bars_saved == local.improvement.scrap_saved_mm == 0
+
+
+def test_stream_summary_reports_improvement():
+    request = random_request(random.Random(9), 40, 10).model_copy(update={"algorithm": "local", "time_limit_ms": 20})
+    lines = client.post("/optimize/batch/stream", json=request.model_dump(mode="json")).text.splitlines()
+    summary = json.loads(lines[-1])
+    assert summary["type"] == "summary"
+    assert set(summary["improvement"]) >= {"baseline_new_bars_count", "new_bars_saved", "scrap_saved_mm"}
@@ -0,0 +1,44 @@
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from main import app
+
+client = TestClient(app)
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_metrics_expose_route_latency_and_optimizer_counters():
+    route = {"method": "POST", "route": "/optimize/batch", "status": "200"}
+    requests_before = sample("ai_http_request_duration_seconds_count", **route)
+    groups_before = sample("ai_optimizer_groups_total", algorithm="greedy")
+    bars_before = sample("ai_optimizer_new_bars_total", algorithm="greedy")
+    scans_before = sample("ai_optimizer_candidate_scans_total", pool="virtual_remnant")
+
+    orders = [
+        {"order_id": "o1", "profile_code": "P1", "color": "White", "required_length_mm": 4000},
+        {"order_id": "o2", "profile_code": "P1", "color": "White", "required_length_mm": 2000},
+        {"order_id": "o3", "profile_code": "P2", "color": "White", "required_length_mm": 1000},
+    ]
+    response = client.post("/optimize/batch", json={"orders": orders, "available_waste": []})
+    assert response.status_code == 200
+    client.get("/optimize/jobs/unknown-job")
+
+    assert sample("ai_http_request_duration_seconds_count", **route) == requests_before + 1
+    assert sample("ai_optimizer_groups_total", algorithm="greedy") == groups_before + 2
+    assert sample("ai_optimizer_new_bars_total", algorithm="greedy") == bars_before + 2
+    assert sample("ai_optimizer_candidate_scans_total", pool="virtual_remnant") == scans_before + 3
+
+    body = client.get("/metrics").text
+    assert 'ai_optimizer_strategy_seconds_total{strategy="new_bar"}' in body
+    # Path parameters stay in the template, not in the label
+    assert 'route="/optimize/jobs/{job_id}",status="404"' in body
+
+
+def test_orders_per_group_counts_order_lines_not_pieces():
+    sum_before = sample("ai_optimizer_orders_per_group_sum", algorithm="greedy")
+    orders = [{"order_id": "q1", "profile_code": "QTY", "color": "White", "required_length_mm": 900, "quantity": 4}]
+    assert client.post("/optimize/batch", json={"orders": orders, "available_waste": []}).status_code == 200
+    assert sample("ai_optimizer_orders_per_group_sum", algorithm="greedy") == sum_before + 1
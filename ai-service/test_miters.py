@@ -0,0 +1,102 @@
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.algorithm import miters
+from app.algorithm.miters import ProfileGeometry, group_overlap, overlap_mm
+from app.algorithm.waste_optimizer import optimize_batch_cutting
+from app.models.schema import OptimizationRequest, OrderItem
+from main import app
+from test_optimizer_equivalence import random_request
+
+client = TestClient(app)
+
+# P1 frame 70 mm high, its beads 20 mm high, both cut at 45 degrees; M1 is a
+# mullion, cut square; P3 has no geometry
+CATALOGUE = {
+    "P1": ProfileGeometry(70.0, 82.0, 20.0, 45.0, 45.0),
+    "P2": ProfileGeometry(60.0, 70.0, 0.0, 0.0, 45.0),
+    "P3": ProfileGeometry(0.0, 0.0, 0.0, 0.0),
+    "M1": ProfileGeometry(80.0, 82.0, 0.0, 0.0),
+}
+
+
+@pytest.fixture(autouse=True)
+def catalogue(monkeypatch):
+    monkeypatch.setattr(miters, "default_profile_catalogue", lambda: CATALOGUE)
+
+
+def frames(profile_code, *lengths):
+    return [OrderItem(order_id=f"{profile_code}-{i}", profile_code=profile_code, color="White", required_length_mm=n)
+            for i, n in enumerate(lengths)]
+
+
+def test_overlap_follows_height_angle_and_kerf():
+    assert overlap_mm(70, 45, 0) == 70
+    # The diagonal kerf is sqrt(2) times the square one
+    assert overlap_mm(70, 45, 4) == 68
+    assert overlap_mm(20, 60, 0) == 11
+    assert overlap_mm(0, 45, 0) == overlap_mm(70, 0, 0) == 0
+
+    request = OptimizationRequest(orders=[], available_waste=[], miter_nesting=True)
+    assert group_overlap("P1", 1000, request) == 70
+    assert group_overlap("P1-L", 1000, request) == 20
+    assert group_overlap("P2-L", 1000, request) == group_overlap("P3", 1000, request) == 0
+    # Square-cut profiles share no diagonal, however high
+    assert group_overlap("M1", 1000, request) == 0
+    # A piece shorter than both diagonals is not mitered: the group is not nested
+    assert group_overlap("P1", 140, request) == 0
+    assert group_overlap("P1", 1000, request.model_copy(update={"miter_nesting": False})) == 0
+
+
+@pytest.mark.parametrize("algorithm", ["greedy", "ffd", "exact", "local", "pattern"])
+def test_shared_diagonals_save_a_bar(algorithm):
+    request = OptimizationRequest(orders=frames("P1", *[1100] * 6), available_waste=[], algorithm=algorithm,
+                                  time_limit_ms=50, include_patterns=True)
+    assert optimize_batch_cutting(request).total_new_bars_count == 2
+
+    response = optimize_batch_cutting(request.model_copy(update={"miter_nesting": True}))
+    assert response.total_new_bars_count == 1
+    # 6 x 1100 less 5 shared diagonals of 70 mm
+    assert response.cuts[-1].waste_created_mm == 6500 - 6600 + 5 * 70
+    [pattern] = response.patterns
+    assert [piece.length_mm for piece in pattern.pieces] == [1100] * 6
+    assert pattern.remnant_mm == 250
+
+
+def test_nested_plans_fit_their_stock():
+    rng = random.Random(24)
+    for _ in range(25):
+        kerf, trim = rng.choice([0, 3]), rng.choice([0, 10])
+        base = random_request(rng, rng.randint(1, 30), rng.randint(0, 15))
+        for algorithm in ("greedy", "ffd", "exact"):
+            request = base.model_copy(update={"algorithm": algorithm, "kerf_mm": kerf, "end_trim_mm": trim,
+                                              "miter_nesting": True, "time_limit_ms": 50})
+            response = optimize_batch_cutting(request)
+            assert sorted(c.order_id for c in response.cuts) == sorted(o.order_id for o in request.orders)
+            shortest = {}
+            for o in request.orders:
+                key = (o.profile_code, o.color)
+                shortest[key] = min(shortest.get(key, o.required_length_mm), o.required_length_mm)
+            for p in response.patterns:
+                overlap = {"P1": overlap_mm(70, 45, kerf), "P2": overlap_mm(60, 45, kerf)}.get(p.profile_code, 0)
+                if shortest[(p.profile_code, p.color)] <= 2 * overlap:
+                    overlap = 0
+                used = sum(piece.length_mm for piece in p.pieces) - overlap * (len(p.pieces) - 1)
+                left = p.stock_length_mm - trim - used - kerf * len(p.pieces)
+                assert p.remnant_mm == max(left, 0)
+                assert left >= -kerf
+
+
+def test_plan_delta_keeps_nesting():
+    body = client.post("/optimize/batch", json={
+        "orders": [o.model_dump() for o in frames("P1", *[1100] * 5)],
+        "available_waste": [], "algorithm": "ffd", "miter_nesting": True,
+    }).json()
+    assert body["total_new_bars_count"] == 1
+    replanned = client.post(f"/optimize/plans/{body['plan_id']}/delta", json={
+        "add_orders": [{"order_id": "P1-5", "profile_code": "P1", "color": "White", "required_length_mm": 1100}],
+    }).json()
+    assert replanned["total_new_bars_count"] == 1
+    assert replanned["patterns"][0]["remnant_mm"] == 250
@@ -0,0 +1,116 @@
+import random
+
+from app.algorithm.waste_optimizer import optimize_batch_cutting
+from app.models.schema import OptimizationRequest, OrderItem, StockCatalogEntry, StockLength
+from test_optimizer_equivalence import random_request
+
+
+def make_orders(lengths, profile_code="P1", color="White"):
+    return [
+        OrderItem(order_id=f"o{i}", profile_code=profile_code, color=color, required_length_mm=length)
+        for i, length in enumerate(lengths)
+    ]
+
+
+def catalog(*lengths, profile_code="P1", color=None):
+    return StockCatalogEntry(
+        profile_code=profile_code,
+        color=color,
+        lengths=[StockLength(length_mm=length, cost=cost) for length, cost in lengths],
+    )
+
+
+def test_without_catalog_cost_is_the_bar_count():
+    request = random_request(random.Random(3), 40, 10)
+    for algorithm in ("greedy", "ffd", "exact"):
+        response = optimize_batch_cutting(request.model_copy(update={"algorithm": algorithm}))
+        assert response.total_new_bar_cost == response.total_new_bars_count
+        new_bars = [c for c in response.cuts if c.source_type == "NEW_BAR"]
+        assert all(c.stock_length_mm == request.full_bar_length_mm for c in new_bars)
+        assert all(c.stock_length_mm is None for c in response.cuts if c.source_type != "NEW_BAR")
+
+
+def test_short_run_gets_the_cheapest_bar_that_holds_it():
+    request = OptimizationRequest(
+        orders=make_orders([1500, 1200]),
+        available_waste=[],
+        stock_catalog=[catalog((6500, 10.0), (3000, 5.5))],
+    )
+    for algorithm in ("greedy", "ffd", "exact"):
+        response = optimize_batch_cutting(request.model_copy(update={"algorithm": algorithm}))
+        assert response.total_new_bars_count == 1
+        assert response.total_new_bar_cost == 5.5
+        assert response.cuts[0].stock_length_mm == 3000
+
+
+def test_long_run_prefers_the_cheapest_bar_per_mm():
+    request = OptimizationRequest(
+        orders=make_orders([2000] * 6),
+        available_waste=[],
+        stock_catalog=[catalog((6000, 9.0), (4000, 8.0))],
+        algorithm="ffd",
+    )
+    response = optimize_batch_cutting(request)
+    assert [p.stock_length_mm for p in response.patterns] == [6000, 6000]
+    assert response.total_new_bar_cost == 18.0
+
+
+def test_exact_minimizes_cost_over_the_mix():
+    # Two 6000 bars cost 20, one 6000 and one 3000 cost 16
+    request = OptimizationRequest(
+        orders=make_orders([3000, 3000, 2900]),
+        available_waste=[],
+        stock_catalog=[catalog((6000, 10.0), (3000, 6.0))],
+        algorithm="exact",
+    )
+    response = optimize_batch_cutting(request)
+    assert sorted(p.stock_length_mm for p in response.patterns) == [3000, 6000]
+    assert response.total_new_bar_cost == 16.0
+
+
+def test_color_entry_overrides_profile_entry():
+    orders = make_orders([1000]) + make_orders([1000], color="Winchester")
+    orders[1].order_id = "w0"
+    request = OptimizationRequest(
+        orders=orders,
+        available_waste=[],
+        stock_catalog=[catalog((6500, 10.0)), catalog((2000, 4.0), color="Winchester")],
+    )
+    response = optimize_batch_cutting(request)
+    assert {c.order_id: c.stock_length_mm for c in response.cuts} == {"o0": 6500, "w0": 2000}
+    assert response.total_new_bar_cost == 14.0
+
+
+def test_bar_choice_accounts_for_kerf_and_trim():
+    # 2992 fits a plain 3000 bar, but not after a 10 mm trim plus a 4 mm kerf
+    request = OptimizationRequest(
+        orders=make_orders([2992]),
+        available_waste=[],
+        stock_catalog=[catalog((6500, 10.0), (3000, 4.0))],
+    )
+    trimmed = request.model_copy(update={"kerf_mm": 4, "end_trim_mm": 10})
+    for algorithm in ("greedy", "ffd", "exact"):
+        plain = optimize_batch_cutting(request.model_copy(update={"algorithm": algorithm}))
+        assert (plain.cuts[0].stock_length_mm, plain.cuts[0].waste_created_mm) == (3000, 8)
+        response = optimize_batch_cutting(trimmed.model_copy(update={"algorithm": algorithm}))
+        assert response.cuts[0].stock_length_mm == 6500
+        assert response.total_new_bar_cost == 10.0
+
+
+def test_random_catalogs_give_valid_plans():
+    rng = random.Random(16)
+    for _ in range(25):
+        request = random_request(rng, rng.randint(1, 20), rng.randint(0, 10))
+        lengths = {rng.choice([2500, 3000, 4000, 6000, 6500]): rng.choice([4.0, 5.5, 8.0, 10.0]) for _ in range(3)}
+        request.stock_catalog = [catalog(*lengths.items(), profile_code=p) for p in ("P1", "P2", "P3")]
+        ffd = optimize_batch_cutting(request.model_copy(update={"algorithm": "ffd"}))
+        exact = optimize_batch_cutting(request.model_copy(update={"algorithm": "exact", "time_limit_ms": 200}))
+        for response in (ffd, exact):
+            used = 0.0
+            for p in response.patterns:
+                assert p.remnant_mm == p.stock_length_mm - sum(piece.length_mm for piece in p.pieces)
+                if p.source_type == "NEW_BAR":
+                    assert p.stock_length_mm in lengths or p.remnant_mm < 0
+                    used += lengths.get(p.stock_length_mm, 0.0)
+            assert abs(response.total_new_bar_cost - used) < 1e-9
+        assert exact.total_new_bar_cost <= ffd.total_new_bar_cost + 1e-9
@@ -0,0 +1,74 @@
+import math
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app.algorithm.muntins import MuntinCatalogue, MuntinLayoutError, load_muntin_catalogue, muntin_pieces
+from app.models.schema import MuntinWindow
+from main import app
+
+client = TestClient(app)
+
+REPO_CATALOGUE = os.path.join(os.path.dirname(__file__), "..", "backend", "src", "main", "resources",
+                              "initial_data", "muntins_v3.json")
+
+# Glass equals the sash, square-edged muntin: the figures of the app's LayoutAndCutTest
+FLAT = MuntinCatalogue({
+    "profiles": [{"name": "P", "glassOffsetX": 0.0, "glassOffsetY": 0.0}],
+    "beads": [{"name": "B", "angleFace": 18.0, "effectiveGlassOffset": 0.0}],
+    "muntins": [{"name": "S", "width": 26.0, "thickness": 0.0, "wallAngleDeg": 18.0}],
+})
+
+
+def window(window_id="W1", size=1000.0, rows=2, cols=2, **kw):
+    return MuntinWindow(window_id=window_id, frame_width_mm=size, frame_height_mm=size, rows=rows, cols=cols, **kw)
+
+
+def lengths(pieces):
+    return sorted((round(p.length_mm, 1), p.count) for p in pieces)
+
+
+def test_grids_match_the_app_figures():
+    assert lengths(muntin_pieces([window()], FLAT)) == [(485.0, 2), (998.0, 1)]
+    assert lengths(muntin_pieces([window(rows=3, cols=3)], FLAT)) == [(305.3, 2), (318.3, 4), (998.0, 2)]
+    # One column: the horizontals run bead to bead
+    assert lengths(muntin_pieces([window(cols=1), window(rows=1, cols=3, continuous="horizontal")], FLAT)) == [
+        (998.0, 1), (998.0, 2)]
+
+
+def test_thickness_adds_the_face_angle_at_each_end():
+    catalogue = load_muntin_catalogue(REPO_CATALOGUE)
+    pieces = muntin_pieces([window(size=1200.0, quantity=3)], catalogue)
+    # 1200 - 2 * (32 + 26) of glass, 12 mm thick at 18 degrees on both bead and muntin faces
+    glass, lean = 1200 - 2 * 58, 12 * math.tan(math.radians(18))
+    by_kind = {p.kind: p for p in pieces}
+    assert by_kind["continuous"].length_mm == pytest.approx(glass + 2 * lean - 2)
+    assert by_kind["end"].length_mm == pytest.approx(glass / 2 - 12.5 + 2 * lean - 2)
+    assert (by_kind["end"].count, by_kind["end"].angle_start_deg) == (6, 18.0)
+
+
+def test_dense_grid_and_unknown_names_are_rejected():
+    with pytest.raises(MuntinLayoutError):
+        muntin_pieces([window(size=200.0, rows=2, cols=20)], FLAT)
+    with pytest.raises(MuntinLayoutError):
+        muntin_pieces([window(muntin="Szpros 99")], FLAT)
+
+
+def test_cut_list_endpoint_groups_windows_and_plans_bars(monkeypatch):
+    monkeypatch.setattr(main, "default_muntin_catalogue", lambda: FLAT)
+    windows = [window("W1").model_dump(), window("W2").model_dump(), window("W3", rows=3, cols=3).model_dump()]
+    body = client.post("/muntins/cut-list", json={
+        "windows": windows,
+        "optimization": {"orders": [], "available_waste": [], "full_bar_length_mm": 6000},
+    }).json()
+    assert [(c["length_mm"], c["quantity"], c["window_ids"]) for c in body["cuts"]] == [
+        (998.0, 4, ["W1", "W2", "W3"]), (485.0, 4, ["W1", "W2"]), (318.3, 4, ["W3"]), (305.3, 2, ["W3"])]
+    assert body["cuts"][0]["description"] == "Pion ciągły"
+    pieces = sum(c["quantity"] for c in body["cuts"])
+    assert len(body["plan"]["cuts"]) == pieces
+    assert body["plan"]["total_new_bars_count"] == 2
+
+    response = client.post("/muntins/cut-list", json={"windows": [window(size=100.0, cols=20).model_dump()]})
+    assert response.status_code == 422
@@ -0,0 +1,103 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.models.schema import OptimizationRequest, OptimizationResponse, OrderItem
+from app.services.optimization_jobs import JobQueueFull, OptimizationJobQueue
+from main import app
+
+EMPTY_RESPONSE = OptimizationResponse(
+    cuts=[], total_waste_used_count=0, total_new_bars_count=0, total_scrap_generated_mm=0
+)
+
+
+def wait_for(predicate, timeout_s=10.0):
+    deadline = time.monotonic() + timeout_s
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def blocking_runner(release: threading.Event, groups: int = 3):
+    def run(request, use_pool=False, progress=None):
+        for done in range(1, groups + 1):
+            release.wait()
+            progress(done, groups)
+        return EMPTY_RESPONSE
+    return run
+
+
+def test_queue_rejects_jobs_beyond_capacity_and_cancels_queued_ones():
+    release = threading.Event()
+    jobs = OptimizationJobQueue(blocking_runner(release), workers=1, max_queued=1)
+    running = jobs.submit(OptimizationRequest(orders=[], available_waste=[]))
+    wait_for(lambda: running.status == "RUNNING")
+
+    queued = jobs.submit(OptimizationRequest(orders=[], available_waste=[]))
+    try:
+        jobs.submit(OptimizationRequest(orders=[], available_waste=[]))
+        assert False, "queue should be full"
+    except JobQueueFull:
+        pass
+
+    assert jobs.cancel(queued.job_id).status == "CANCELLED"
+    # The cancelled job gives its slot back before a worker reaches it
+    waiting = jobs.submit(OptimizationRequest(orders=[], available_waste=[]))
+    release.set()
+    wait_for(lambda: running.status == "DONE")
+    assert running.groups_done == running.groups_total == 3
+    assert queued.result is None
+    wait_for(lambda: waiting.status == "DONE")
+    jobs.shutdown()
+
+
+def test_running_job_is_cancelled_between_groups():
+    release = threading.Event()
+    jobs = OptimizationJobQueue(blocking_runner(release), workers=1)
+    job = jobs.submit(OptimizationRequest(orders=[], available_waste=[]))
+    wait_for(lambda: job.status == "RUNNING")
+
+    jobs.cancel(job.job_id)
+    release.set()
+    wait_for(lambda: job.is_finished)
+    assert job.status == "CANCELLED"
+    assert job.groups_done == 1
+    jobs.shutdown()
+
+
+def test_finished_jobs_are_evicted_after_ttl():
+    release = threading.Event()
+    release.set()
+    jobs = OptimizationJobQueue(blocking_runner(release), workers=1, ttl_s=0.05)
+    job = jobs.submit(OptimizationRequest(orders=[], available_waste=[]))
+    wait_for(lambda: job.is_finished)
+    assert jobs.get(job.job_id) is job
+    time.sleep(0.1)
+    assert jobs.get(job.job_id) is None
+    jobs.shutdown()
+
+
+def test_job_api_returns_optimization_result():
+    orders = [
+        OrderItem(order_id=f"o{i}", profile_code="P1", color="White", required_length_mm=1200)
+        for i in range(5)
+    ]
+    payload = OptimizationRequest(orders=orders, available_waste=[]).model_dump()
+
+    with TestClient(app) as client:
+        submitted = client.post("/optimize/jobs", json=payload)
+        assert submitted.status_code == 202
+        job_id = submitted.json()["job_id"]
+
+        def done():
+            return client.get(f"/optimize/jobs/{job_id}").json()["status"] == "DONE"
+        wait_for(done, timeout_s=30)
+
+        body = client.get(f"/optimize/jobs/{job_id}").json()
+        assert body["groups_done"] == body["groups_total"] == 1
+        direct = client.post("/optimize/batch", json=payload).json()
+        # Jobs do not register plans for incremental re-optimization
+        assert direct.pop("plan_id") is not None
+        assert body["result"] == {**direct, "plan_id": None}
+        assert client.get("/optimize/jobs/unknown").status_code == 404
@@ -0,0 +1,41 @@
+import json
+import random
+
+from fastapi.testclient import TestClient
+
+from main import app
+from test_optimizer_equivalence import random_request
+
+client = TestClient(app)
+
+
+def test_stream_matches_batch_response():
+    request = random_request(random.Random(5), 60, 40).model_copy(update={"algorithm": "ffd"})
+    payload = request.model_dump()
+
+    response = client.post("/optimize/batch/stream", json=payload)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    batch = client.post("/optimize/batch", json=payload).json()
+
+    cuts = [r for r in records if r["type"] == "cut"]
+    assert [{k: c[k] for k in batch["cuts"][0]} for c in cuts] == batch["cuts"]
+    patterns = [{k: v for k, v in r.items() if k != "type"} for r in records if r["type"] == "pattern"]
+    assert patterns == batch["patterns"]
+
+    summary = records[-1]
+    assert summary["type"] == "summary"
+    assert summary["groups"] == len({(o.profile_code, o.color) for o in request.orders})
+    for key in ("total_waste_used_count", "total_new_bars_count", "total_scrap_generated_mm"):
+        assert summary[key] == batch[key]
+
+
+def test_stream_of_empty_batch_is_only_a_summary():
+    response = client.post("/optimize/batch/stream", json={"orders": [], "available_waste": []})
+    assert [json.loads(line)["type"] for line in response.text.splitlines()] == ["summary"]
+
+
+def test_stream_rejects_a_pick_route():
+    response = client.post("/optimize/batch/stream", json={"orders": [], "available_waste": [], "pick_route": True})
+    assert response.status_code == 422
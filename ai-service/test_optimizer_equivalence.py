@@ -0,0 +1,150 @@
+import random
+
+from app.algorithm.waste_optimizer import optimize_batch_cutting
+from app.models.schema import OptimizationRequest, OrderItem, WasteItem
+
+
+def reference_optimize_batch_cutting(request: OptimizationRequest) -> dict:
+    # Linear-scan implementation the indexed pool replaced; kept as the
+    # behavioural reference for optimize_batch_cutting.
+    grouped_orders = {}
+    for order in request.orders:
+        grouped_orders.setdefault((order.profile_code, order.color), []).append(order)
+    waste_pool = {}
+    for waste in request.available_waste:
+        waste_pool.setdefault((waste.profile_code, waste.color), []).append(waste)
+
+    scrap_limit = request.scrap_threshold_mm
+    cuts = []
+    total_new_bars = 0
+    total_scrap = 0
+    waste_used_count = 0
+
+    for key, orders in grouped_orders.items():
+        orders.sort(key=lambda x: (-x.priority, -x.required_length_mm))
+        available_waste = sorted(waste_pool.get(key, []), key=lambda x: x.length_mm)
+        virtual_waste = []
+
+        for order in orders:
+            need = order.required_length_mm
+            best_v, min_v = -1, float("inf")
+            for i, length in enumerate(virtual_waste):
+                if length >= need and length - need < min_v:
+                    best_v, min_v = i, length - need
+
+            if best_v != -1:
+                remnant = virtual_waste.pop(best_v) - need
+                cuts.append((order.order_id, "NEW_BAR_REMNANT", None, remnant))
+                if remnant > 0:
+                    if remnant >= scrap_limit:
+                        virtual_waste.append(remnant)
+                    else:
+                        total_scrap += remnant
+                continue
+
+            best_w, min_w, best_is_bad = -1, float("inf"), True
+            for i, item in enumerate(available_waste):
+                if item.length_mm < need:
+                    continue
+                remnant = item.length_mm - need
+                is_bad = scrap_limit < remnant < request.min_usable_offcut_mm
+                if not is_bad:
+                    if best_is_bad or remnant < min_w:
+                        best_w, min_w, best_is_bad = i, remnant, False
+                elif best_is_bad and remnant < min_w:
+                    best_w, min_w = i, remnant
+
+            if best_w != -1:
+                source = available_waste.pop(best_w)
+                remnant = source.length_mm - need
+                cuts.append((order.order_id, "WASTE", source.id, remnant))
+                waste_used_count += 1
+                if remnant > 0:
+                    if remnant < scrap_limit:
+                        total_scrap += remnant
+                    elif remnant >= request.min_usable_offcut_mm:
+                        virtual_waste.append(remnant)
+            else:
+                total_new_bars += 1
+                remnant = request.full_bar_length_mm - need
+                cuts.append((order.order_id, "NEW_BAR", None, remnant))
+                if remnant > 0:
+                    if remnant >= scrap_limit:
+                        virtual_waste.append(remnant)
+                    else:
+                        total_scrap += remnant
+
+    return {
+        "cuts": [
+            {
+                "order_id": order_id,
+                "source_type": source_type,
+                "source_id": source_id,
+                "waste_created_mm": remnant,
+                "is_scrap": 0 < remnant < scrap_limit,
+            }
+            for order_id, source_type, source_id, remnant in cuts
+        ],
+        "total_waste_used_count": waste_used_count,
+        "total_new_bars_count": total_new_bars,
+        "total_scrap_generated_mm": total_scrap,
+    }
+
+
+def random_request(rng: random.Random, n_orders: int, n_waste: int) -> OptimizationRequest:
+    profiles = ["P1", "P2", "P3"]
+    colors = ["White", "Winchester"]
+    # Coarse lengths on purpose: plenty of ties between orders and offcuts
+    orders = [
+        OrderItem(
+            order_id=f"o{i}",
+            profile_code=rng.choice(profiles),
+            color=rng.choice(colors),
+            required_length_mm=rng.randrange(300, 3000, 50),
+            priority=rng.randint(1, 5),
+        )
+        for i in range(n_orders)
+    ]
+    waste = [
+        WasteItem(
+            id=f"w{i}",
+            location=f"{rng.randint(1, 25):02d}-{rng.randint(1, 3)}",
+            length_mm=rng.randrange(200, 4000, 50),
+            profile_code=rng.choice(profiles),
+            color=rng.choice(colors),
+        )
+        for i in range(n_waste)
+    ]
+    return OptimizationRequest(
+        orders=orders,
+        available_waste=waste,
+        full_bar_length_mm=rng.choice([6000, 6500]),
+        min_usable_offcut_mm=rng.choice([150, 500, 800]),
+        scrap_threshold_mm=rng.choice([100, 200]),
+    )
+
+
+def test_indexed_pool_matches_reference_implementation():
+    rng = random.Random(20240301)
+    for _ in range(200):
+        request = random_request(rng, rng.randint(0, 60), rng.randint(0, 80))
+        expected = reference_optimize_batch_cutting(request)
+        actual = optimize_batch_cutting(request).model_dump(exclude={"cuts": {"__all__": {"stock_length_mm"}}})
+        assert {key: actual[key] for key in expected} == expected
+
+
+def test_bad_offcut_is_used_only_as_last_resort():
+    waste = [
+        WasteItem(id="bad", location="A1", length_mm=1300, profile_code="P1", color="White"),
+        WasteItem(id="good", location="A2", length_mm=1600, profile_code="P1", color="White"),
+    ]
+    order = OrderItem(order_id="o1", profile_code="P1", color="White", required_length_mm=1000)
+    request = OptimizationRequest(orders=[order], available_waste=waste)
+
+    cut = optimize_batch_cutting(request).cuts[0]
+    assert cut.source_id == "good"
+
+    request = OptimizationRequest(orders=[order], available_waste=waste[:1])
+    cut = optimize_batch_cutting(request).cuts[0]
+    assert cut.source_id == "bad"
+    assert cut.waste_created_mm == 300
@@ -0,0 +1,89 @@
+import random
+
+from fastapi.testclient import TestClient
+
+from app.algorithm.pick_route import WarehouseLayout
+from app.algorithm.waste_optimizer import optimize_batch_cutting
+from app.models.schema import OptimizationRequest, OrderItem, WasteItem
+from main import app
+from test_cutting_stock import assert_valid_plan
+from test_optimizer_equivalence import random_request
+
+client = TestClient(app)
+
+
+def waste(item_id, length, location):
+    return WasteItem(id=item_id, location=location, length_mm=length, profile_code="P1", color="White")
+
+
+def order(order_id, length):
+    return OrderItem(order_id=order_id, profile_code="P1", color="White", required_length_mm=length)
+
+
+def test_locations_follow_the_configured_format():
+    layout = WarehouseLayout(rows=25, shelf_capacity=3, location_format="RR-P")
+    assert layout.position("03-2") == (3, 2)
+    # Digit counts are not enforced: "R-P" and "RR-P" configs read the same labels
+    assert layout.position("3-2") == (3, 2)
+    assert [layout.position(v) for v in ("26-1", "03-4", "A3-1", "", None)] == [None] * 5
+    assert WarehouseLayout(location_format="R/P").position("7/1") == (7, 1)
+
+    # Between rows around the nearer aisle end
+    assert layout.distance((3, 1), (3, 3)) == 2
+    assert layout.distance((3, 1), (5, 1)) == 2 + 2
+    assert layout.distance((3, 3), (5, 3)) == 2 + 2
+    positions = [(4, 1), None, (2, 3), (4, 3), (2, 1)]
+    assert layout.walk_order(positions) == [4, 2, 3, 0, 1]
+
+
+def test_optimizer_takes_co_located_offcut_among_equal_cuts():
+    orders = [order("o1", 1000), order("o2", 1000)]
+    pool = [waste("a", 1010, "05-1"), waste("b", 1012, "09-2"), waste("c", 1030, "09-2"), waste("far", 1600, "09-2")]
+    request = OptimizationRequest(orders=orders, available_waste=pool)
+    plain = optimize_batch_cutting(request)
+    assert {c.source_id for c in plain.cuts} == {"a", "b"}
+    assert plain.pick_route == []
+
+    routed = optimize_batch_cutting(request.model_copy(update={"pick_route": True}))
+    assert {c.order_id: c.source_id for c in routed.cuts} == {"o1": "c", "o2": "b"}
+    assert routed.total_scrap_generated_mm == plain.total_scrap_generated_mm + 20
+    assert [(s.waste_id, s.location, s.order_ids) for s in routed.pick_route] == \
+        [("c", "09-2", ["o1"]), ("b", "09-2", ["o2"])]
+    # Saw to row 9, pallet 2 and back
+    assert routed.pick_route_distance == 22
+    assert_valid_plan(request, routed)
+
+
+def test_pick_route_keeps_plans_valid():
+    rng = random.Random(20)
+    for algorithm in ("greedy", "ffd", "local"):
+        for _ in range(10):
+            request = random_request(rng, rng.randint(1, 60), rng.randint(0, 60)).model_copy(
+                update={"algorithm": algorithm, "time_limit_ms": 20})
+            plain = optimize_batch_cutting(request)
+            routed = optimize_batch_cutting(request.model_copy(update={"pick_route": True}))
+            assert_valid_plan(request, routed)
+            assert routed.total_new_bars_count == plain.total_new_bars_count
+            assert routed.total_waste_used_count == len(routed.pick_route)
+            assert routed.total_scrap_generated_mm == sum(p.remnant_mm for p in routed.patterns if p.is_scrap)
+            first_cut = {c.order_id: c.source_id for c in routed.cuts if c.source_type == "WASTE"}
+            assert first_cut == {p.pieces[0].order_id: p.source_id for p in routed.patterns if p.source_type == "WASTE"}
+
+
+def test_batch_recommendations_prefer_co_located_offcuts():
+    body = {
+        "queries": [
+            {"profile_code": "P1", "color": "White", "required_length_mm": 1100},
+            {"profile_code": "P1", "color": "White", "required_length_mm": 1000},
+        ],
+        "available_waste": [w.model_dump() for w in
+                            (waste("x", 1105, "09-2"), waste("a", 1010, "01-1"), waste("b", 1020, "09-3"))],
+        "exclusive": True,
+    }
+    plain = client.post("/recommend/waste/batch", json=body).json()
+    assert [r["recommended_item_id"] for r in plain["recommendations"]] == ["x", "a"]
+
+    routed = client.post("/recommend/waste/batch", json={**body, "pick_route": True}).json()
+    assert [r["recommended_item_id"] for r in routed["recommendations"]] == ["x", "b"]
+    assert [s["waste_id"] for s in routed["pick_route"]] == ["x", "b"]
+    assert routed["pick_route_distance"] == 11 + 1 + 12
@@ -0,0 +1,91 @@
+import random
+from collections import Counter
+
+import msgpack
+from fastapi.testclient import TestClient
+
+from app.algorithm.waste_optimizer import group_rows, optimize_batch_cutting
+from app.models.columnar import MSGPACK_MEDIA_TYPE, encode_batch
+from app.models.schema import OptimizationRequest, OrderItem, WasteItem
+from main import app
+from test_cutting_stock import assert_valid_plan
+from test_optimizer_equivalence import random_request
+
+client = TestClient(app)
+
+
+def order(order_id, length, quantity=1):
+    return OrderItem(order_id=order_id, profile_code="P1", color="White", required_length_mm=length, quantity=quantity)
+
+
+def assert_pieces(request, response):
+    # Every piece of every order cut once, patterns within their stock
+    pieces = Counter()
+    for o in request.orders:
+        pieces[o.order_id] += o.quantity
+    assert Counter(c.order_id for c in response.cuts) == pieces
+    assert Counter(piece.order_id for p in response.patterns for piece in p.pieces) == pieces
+    for p in response.patterns:
+        assert p.remnant_mm == p.stock_length_mm - sum(piece.length_mm for piece in p.pieces) >= 0
+
+
+def test_quantity_cuts_one_piece_per_unit():
+    pool = [WasteItem(id="w1", location="01-1", length_mm=2500, profile_code="P1", color="White")]
+    request = OptimizationRequest(orders=[order("sash", 1200, quantity=3)], available_waste=pool)
+    response = optimize_batch_cutting(request)
+    assert [c.order_id for c in response.cuts] == ["sash"] * 3
+
+    # Same plan as three separate orders
+    single = request.model_copy(update={"orders": [order(f"s{i}", 1200) for i in range(3)]})
+    strip = lambda r: [(c.source_type, c.source_id, c.waste_created_mm) for c in r.cuts]
+    assert strip(response) == strip(optimize_batch_cutting(single))
+
+
+def test_pattern_algorithm_cuts_patterns_in_multiples():
+    orders = [order("frame", 1300, quantity=400), order("sash", 1000, quantity=300), order("glazing", 640, quantity=7)]
+    request = OptimizationRequest(orders=orders, available_waste=[], algorithm="pattern")
+    response = optimize_batch_cutting(request)
+    assert_pieces(request, response)
+    # 5 x 1300 and 6 x 1000 per 6500 mm bar; 640 mm pieces do not fit the 500 mm remnants
+    assert response.total_new_bars_count == 80 + 50 + 1
+    assert Counter(tuple(piece.order_id for piece in p.pieces) for p in response.patterns)[("frame",) * 5] == 80
+
+
+def test_groups_carry_quantities_not_pieces():
+    request = OptimizationRequest(orders=[order("frame", 1300, quantity=400), order("sash", 1000)], available_waste=[])
+    orders, _ = group_rows(request)
+    assert orders == {("P1", "White"): [(("frame", 1300, 1), 400), (("sash", 1000, 1), 1)]}
+
+
+def test_pattern_algorithm_plans_are_valid():
+    rng = random.Random(21)
+    for _ in range(30):
+        request = random_request(rng, rng.randint(0, 60), rng.randint(0, 40))
+        request = request.model_copy(update={
+            "algorithm": "pattern",
+            "orders": [o.model_copy(update={"quantity": rng.choice([1, 1, 2, 5])}) for o in request.orders],
+        })
+        response = optimize_batch_cutting(request)
+        assert_pieces(request, response)
+        assert response.total_new_bars_count == sum(1 for p in response.patterns if p.source_type == "NEW_BAR")
+        used = [p.source_id for p in response.patterns if p.source_type == "WASTE"]
+        assert len(used) == len(set(used)) == response.total_waste_used_count
+        if all(o.quantity == 1 for o in request.orders):
+            assert_valid_plan(request, response)
+
+
+def test_quantity_over_columnar_and_plan_delta():
+    orders = [order("frame", 1300, quantity=10), order("sash", 900, quantity=4)]
+    request = OptimizationRequest(orders=orders, available_waste=[], algorithm="pattern")
+    body = client.post("/optimize/batch", content=encode_batch(request),
+                       headers={"content-type": MSGPACK_MEDIA_TYPE}).json()
+    assert Counter(c["order_id"] for c in body["cuts"]) == {"frame": 10, "sash": 4}
+
+    # Removing an order removes all of its pieces; kept pieces stay on their bars
+    replanned = client.post(f"/optimize/plans/{body['plan_id']}/delta", json={"remove_order_ids": ["sash"]}).json()
+    assert Counter(c["order_id"] for c in replanned["cuts"]) == {"frame": 10}
+
+    data = msgpack.unpackb(encode_batch(request))
+    data["orders"]["quantity"] = [1, 0]
+    response = client.post("/optimize/batch", content=msgpack.packb(data), headers={"content-type": MSGPACK_MEDIA_TYPE})
+    assert response.status_code == 422
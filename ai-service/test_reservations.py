@@ -0,0 +1,145 @@
+import os
+import subprocess
+import sys
+from datetime import date, datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app.algorithm import reservations
+from app.algorithm.reservations import ReservationIndex, forecast_class_demand
+from app.algorithm.waste_optimizer import optimize_batch_cutting
+from app.models.schema import ConsumptionEvent, OptimizationRequest, OrderItem, WasteItem
+
+client = TestClient(main.app)
+
+
+@pytest.fixture
+def reserve(monkeypatch):
+    # Installs a reservation index for the optimizer and the API
+    def install(index):
+        monkeypatch.setattr(reservations, "default_reservations", lambda: index)
+        monkeypatch.setattr(main, "default_reservations", lambda: index)
+        client.delete("/cache")
+    yield install
+    client.delete("/cache")
+
+
+def waste(item_id, length, profile_code="P1", color="White"):
+    return WasteItem(id=item_id, location="03-1", length_mm=length, profile_code=profile_code, color=color)
+
+
+def order(order_id, length):
+    return OrderItem(order_id=order_id, profile_code="P1", color="White", required_length_mm=length)
+
+
+def test_length_classes_use_the_tolerance():
+    index = ReservationIndex([1200, 850], tolerance_mm=10)
+    assert [index.class_of(n) for n in (1190, 1210, 1211, 845, 1000)] == [1200, 1200, None, 850, None]
+    assert index.released([1195, 1205, 860, 2000]) == {1200: [1195, 1205], 850: [860]}
+
+
+def test_an_order_releases_a_held_piece_it_can_be_cut_from():
+    index = ReservationIndex([1200], tolerance_mm=10)
+    rows = {"White": [(1192, "short"), (1205, "long")]}
+    # 1192 is too short for 1198; 1205 is the one to free
+    assert index.held_rows("P1", rows, {"White": index.released([1198])}) == {"short"}
+    # No held piece fits: nothing is released
+    assert index.held_rows("P1", {"White": [(1192, "short")]}, {"White": index.released([1198])}) == {"short"}
+    # Two orders each take the shortest piece left that fits: 1196 and 1192
+    rows = {"White": [(1192, "a"), (1196, "b"), (1205, "c")]}
+    assert index.held_rows("P1", rows, {"White": index.released([1191, 1195])}) == {"c"}
+    # An order only releases pieces of its own color
+    rows = {"White": [(1205, "w")], "Oak": [(1205, "o")]}
+    assert index.held_rows("P1", rows, {"Oak": index.released([1198])}) == {"w"}
+
+
+def test_optimizer_keeps_reserved_offcuts_for_their_length(reserve):
+    reserve(ReservationIndex([1200]))
+    pool = [waste("r1", 1205), waste("w1", 1500)]
+    request = OptimizationRequest(orders=[order("o1", 1000), order("o2", 1100)], available_waste=pool)
+    used = {c.source_id for c in optimize_batch_cutting(request).cuts if c.source_type == "WASTE"}
+    assert used == {"w1"}
+
+    # An order of the reserved length releases a held piece
+    request = OptimizationRequest(orders=[order("o1", 1000), order("sash", 1198)], available_waste=pool)
+    cuts = {c.order_id: c.source_id for c in optimize_batch_cutting(request).cuts}
+    assert cuts["sash"] == "r1"
+
+
+def test_forecast_holds_only_the_expected_demand():
+    as_of = date(2024, 6, 1)
+    index = ReservationIndex([1200])
+    events = [
+        ConsumptionEvent(profile_code="P1", quantity_change=-1, length_mm=1202,
+                         timestamp=datetime(2024, 5, 25 + i))
+        for i in range(2)
+    ]
+    # 2 pieces in 14 days, kept for 14 days ahead
+    index.demand = forecast_class_demand(events, index, as_of, window_days=14, horizon_days=14)
+    assert index.demand == {("P1", 1200): 2}
+
+    rows = {"White": [(1195, "a"), (1200, "b"), (1208, "c"), (900, "d")]}
+    assert index.held_rows("P1", rows, {}) == {"b", "a"}
+    # The order is cut from the shortest held piece that fits it
+    assert index.held_rows("P1", rows, {"White": index.released([1200])}) == {"a"}
+    # No recorded demand for this profile: nothing held
+    assert index.held_rows("P2", rows, {}) == set()
+
+    # The profile's demand is held once across its colors, closest pieces first
+    rows = {"White": [(1195, "a"), (1208, "c")], "Oak": [(1200, "b"), (1204, "e")]}
+    assert index.held_rows("P1", rows, {}) == {"b", "e"}
+
+
+def test_held_offcuts_in_several_colors_stay_within_the_demand(reserve):
+    reserve(ReservationIndex([1200], demand={("P1", 1200): 1}))
+    pool = [waste("w", 1205), waste("o", 1201, color="Oak"), waste("long", 1600, color="Oak")]
+    body = {"profile_code": "P1", "color": "Oak", "required_length_mm": 1000,
+            "available_waste": [w.model_dump() for w in pool]}
+    # Only the Oak piece closest to 1200 is held; White is free stock
+    assert client.post("/recommend/waste", json=body).json()["recommended_item_id"] == "long"
+    white = {**body, "color": "White"}
+    assert client.post("/recommend/waste", json=white).json()["recommended_item_id"] == "w"
+
+    client.put("/inventory/waste", json={"version": 41, "items": [w.model_dump() for w in pool]})
+    stored = {"profile_code": "P1", "color": "White", "required_length_mm": 1000, "waste_version": 41}
+    assert client.post("/recommend/waste", json=stored).json()["recommended_item_id"] == "w"
+
+
+def test_added_waste_is_withheld_like_the_batch(reserve):
+    reserve(ReservationIndex([1200]))
+    body = {"orders": [order("o1", 1000).model_dump()], "available_waste": [waste("w1", 1100).model_dump()],
+            "algorithm": "greedy"}
+    plan = client.post("/optimize/batch", json=body).json()
+    delta = {"add_waste": [waste("r1", 1205).model_dump()], "add_orders": [order("o2", 1000).model_dump()]}
+    response = client.post(f"/optimize/plans/{plan['plan_id']}/delta", json=delta).json()
+    assert {c["source_id"] for c in response["cuts"] if c["source_type"] == "WASTE"} == {"w1"}
+
+
+def test_recommendations_skip_held_offcuts(reserve):
+    reserve(ReservationIndex([1200]))
+    pool = [waste("r1", 1205), waste("w1", 1600)]
+    body = {"profile_code": "P1", "color": "White", "required_length_mm": 1000,
+            "available_waste": [w.model_dump() for w in pool]}
+    assert client.post("/recommend/waste", json=body).json()["recommended_item_id"] == "w1"
+    sash = {**body, "required_length_mm": 1200}
+    assert client.post("/recommend/waste", json=sash).json()["recommended_item_id"] == "r1"
+
+    client.put("/inventory/waste", json={"version": 40, "items": [w.model_dump() for w in pool]})
+    stored = {"profile_code": "P1", "color": "White", "required_length_mm": 1000, "waste_version": 40, "top_k": 5}
+    response = client.post("/recommend/waste", json=stored).json()
+    assert [a["waste_id"] for a in response["alternatives"]] == ["w1"]
+
+    batch = {"queries": [{"profile_code": "P1", "color": "White", "required_length_mm": 1000}],
+             "waste_version": 40}
+    assert client.post("/recommend/waste/batch", json=batch).json()["recommendations"][0]["recommended_item_id"] == "w1"
+
+
+def test_reservations_are_off_by_default():
+    # A fresh interpreter without RESERVE_WASTE_ENABLED, whatever the test run sets
+    env = {k: v for k, v in os.environ.items() if k != "RESERVE_WASTE_ENABLED"}
+    script = "from app.algorithm import reservations as r; print(r.RESERVE_WASTE_ENABLED, r.default_reservations())"
+    out = subprocess.run([sys.executable, "-c", script], env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                         capture_output=True, text=True, check=True).stdout
+    assert out.split() == ["False", "None"]
@@ -0,0 +1,87 @@
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from app.algorithm.miters import ProfileGeometry
+from app.services.result_cache import CatalogueVersions, ResultCache
+from main import app
+
+client = TestClient(app)
+
+
+def test_lru_ttl_and_byte_limits():
+    cache = ResultCache(max_entries=2, max_bytes=10, ttl_s=60)
+    cache.put("a:1", b"1111")
+    cache.put("a:2", b"2222")
+    assert cache.get("a:1") == b"1111"          # a:1 is now most recent
+    cache.put("b:3", b"3333")                    # over both limits: a:2 goes
+    assert cache.get("a:2") is None
+    assert cache.stats()["bytes"] == 8
+    assert cache.invalidate("a") == 1
+    assert cache.get("b:3") == b"3333"
+
+    cache = ResultCache(max_entries=8, max_bytes=100, ttl_s=0.01)
+    cache.put("k", b"x")
+    time.sleep(0.02)
+    assert cache.get("k") is None
+    assert cache.stats()["hits"] == 0 and cache.stats()["misses"] == 1
+
+
+def test_repeat_optimization_is_served_from_cache():
+    before = client.delete("/cache").json()
+    request = {
+        "orders": [{"order_id": "c1", "profile_code": "CACHE", "color": "White", "required_length_mm": 1234}],
+        "available_waste": [{"id": "cw1", "location": "01-1", "length_mm": 1500,
+                             "profile_code": "CACHE", "color": "White"}],
+    }
+    first = client.post("/optimize/batch", json=request)
+    again = client.post("/optimize/batch", json=request)
+    assert (first.headers["X-Cache"], again.headers["X-Cache"]) == ("MISS", "HIT")
+    assert again.json() == first.json()
+
+    # workers changes each group's time budget, so it is part of the key
+    for changed in ({**request, "scrap_threshold_mm": 100}, {**request, "workers": 2}):
+        assert client.post("/optimize/batch", json=changed).headers["X-Cache"] == "MISS"
+
+    stats = client.get("/cache/stats").json()
+    assert stats["entries"] == 3
+    assert (stats["hits"] - before["hits"], stats["misses"] - before["misses"]) == (1, 3)
+    assert client.delete("/cache", params={"namespace": "optimize"}).json()["entries"] == 0
+    assert client.post("/optimize/batch", json=request).headers["X-Cache"] == "MISS"
+
+
+def test_version_references_follow_the_stored_content():
+    item = {"id": "v1", "location": "01-1", "length_mm": 1500, "profile_code": "CACHE", "color": "White"}
+    query = {"profile_code": "CACHE", "color": "White", "required_length_mm": 1000, "waste_version": 7}
+
+    client.put("/inventory/waste", json={"version": 7, "items": [item]})
+    assert client.post("/recommend/waste", json=query).json()["recommended_item_id"] == "v1"
+    # Same version number, different content: must not hit the old entry
+    client.put("/inventory/waste", json={"version": 7, "items": [{**item, "id": "v2"}]})
+    assert client.post("/recommend/waste", json=query).json()["recommended_item_id"] == "v2"
+
+    client.post("/inventory/waste/delta", json={"base_version": 7, "version": 8, "deletes": ["v2"]})
+    assert client.post("/recommend/waste", json=query).status_code == 409
+
+
+def test_catalogue_versions_follow_the_loaded_objects():
+    versions = CatalogueVersions()
+    profiles, colors = {}, None
+    first = versions.stamp(profiles=profiles, colors=colors)
+    assert versions.stamp(colors=colors, profiles=profiles) == first
+    # An equal but reloaded catalogue is a new version
+    assert versions.stamp(profiles={}, colors=colors) != first
+
+
+def test_cached_plans_do_not_survive_a_catalogue_reload(monkeypatch):
+    request = {
+        "orders": [{"order_id": "c1", "profile_code": "CAT", "color": "White", "required_length_mm": 1234}],
+        "available_waste": [], "miter_nesting": True,
+    }
+    client.delete("/cache")
+    assert client.post("/optimize/batch", json=request).headers["X-Cache"] == "MISS"
+    assert client.post("/optimize/batch", json=request).headers["X-Cache"] == "HIT"
+    reloaded = {"CAT": ProfileGeometry(70.0, 82.0, 20.0, 45.0, 45.0)}
+    monkeypatch.setattr(main, "default_profile_catalogue", lambda: reloaded)
+    assert client.post("/optimize/batch", json=request).headers["X-Cache"] == "MISS"
@@ -0,0 +1,106 @@
+import os
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app.algorithm import shortage_forecast
+from app.algorithm.shortage_forecast import daily_usage_matrix, forecast_days_left, load_history_csv
+from app.models.schema import ConsumptionEvent
+from main import app
+
+client = TestClient(app)
+
+AS_OF = date(2024, 3, 4)  # Monday
+
+
+def taken(profile_code, day, bars=1, length_mm=6500, operation_type="TAKEN"):
+    return ConsumptionEvent(profile_code=profile_code, operation_type=operation_type, quantity_change=-bars,
+                            length_mm=length_mm, timestamp=datetime.combine(day, datetime.min.time()))
+
+
+def test_usage_matrix_counts_only_taken_stock_in_window():
+    events = [
+        taken("P1", AS_OF - timedelta(days=1), bars=2),
+        taken("P1", AS_OF - timedelta(days=1)),
+        taken("P1", AS_OF - timedelta(days=40)),                        # before the window
+        taken("P2", AS_OF - timedelta(days=3), operation_type="MOVED"),
+        ConsumptionEvent(profile_code="P2", quantity_change=5, length_mm=6500,
+                         timestamp=datetime(2024, 3, 1)),               # stock added
+    ]
+    usage = daily_usage_matrix(events, ["P1", "P2"], AS_OF, 30)
+    assert usage.shape == (2, 30)
+    assert usage[0, -1] == 3 * 6500
+    assert usage.sum() == 3 * 6500
+
+
+def test_weekday_profile_delays_stockout_over_weekend():
+    # Four weeks of one bar per weekday, nothing on weekends
+    days = [AS_OF - timedelta(days=d) for d in range(1, 29)]
+    events = [taken("P1", day) for day in days if day.weekday() < 5]
+    usage = daily_usage_matrix(events, ["P1"], AS_OF, 28)
+    # Seven bars in stock: Mon-Fri takes five, the weekend none, next Mon-Tue two
+    days_left, rate = forecast_days_left(usage, np.array([7 * 6500.0]), AS_OF)
+    assert days_left[0] == 8
+    assert rate[0] == 20 * 6500 / 28
+
+
+def test_batch_ranks_catalogue_by_urgency():
+    history = [taken("FAST", AS_OF - timedelta(days=d), bars=3) for d in range(1, 15)]
+    history += [taken("SLOW", AS_OF - timedelta(days=d)) for d in range(1, 15)]
+    payload = {
+        "as_of": AS_OF.isoformat(),
+        "history_days": 14,
+        "items": [
+            {"profile_code": "IDLE", "current_stock_mm": 65000},
+            {"profile_code": "SLOW", "current_stock_mm": 10 * 6500},
+            {"profile_code": "FAST", "current_stock_mm": 4 * 6500},
+        ],
+        "consumption_history": [e.model_dump(mode="json") for e in history],
+    }
+    predictions = client.post("/predict/shortage/batch", json=payload).json()["predictions"]
+    assert [p["profile_code"] for p in predictions] == ["FAST", "SLOW", "IDLE"]
+    assert [p["days_left"] for p in predictions] == [1, 9, None]
+    assert [p["risk_level"] for p in predictions] == ["CRITICAL", "MEDIUM", "LOW"]
+    assert predictions[0]["predicted_stockout_date"] == (AS_OF + timedelta(days=1)).isoformat()
+    assert predictions[2]["predicted_stockout_date"] is None
+
+
+def test_history_csv_round_trip(tmp_path):
+    path = tmp_path / "operation_logs.csv"
+    path.write_text(
+        "operation_type,profile_code,quantity_change,length_mm,timestamp\n"
+        "TAKEN,P1,-2,6500,2024-03-01T08:15:00\n"
+        "ADDED,P1,10,6500,2024-03-02T09:00:00\n",
+        encoding="utf-8"
+    )
+    events = load_history_csv(str(path))
+    assert [(e.operation_type, e.quantity_change) for e in events] == [("TAKEN", -2), ("ADDED", 10)]
+
+
+def test_repeated_profile_code_keeps_its_usage():
+    history = [taken("P1", AS_OF - timedelta(days=d)) for d in range(1, 15)]
+    payload = {
+        "as_of": AS_OF.isoformat(),
+        "history_days": 14,
+        "items": [{"profile_code": "P1", "current_stock_mm": 3 * 6500},
+                  {"profile_code": "P1", "current_stock_mm": 6 * 6500}],
+        "consumption_history": [e.model_dump(mode="json") for e in history],
+    }
+    predictions = client.post("/predict/shortage/batch", json=payload).json()["predictions"]
+    # One bar a day, today included
+    assert [p["days_left"] for p in predictions] == [2, 5]
+    assert predictions[0]["daily_usage_trend"] == predictions[1]["daily_usage_trend"] > 0
+
+
+def test_history_export_is_read_again_only_when_rewritten(tmp_path, monkeypatch):
+    path = tmp_path / "operation_logs.csv"
+    header = "operation_type,profile_code,quantity_change,length_mm,timestamp\n"
+    path.write_text(header + "TAKEN,P1,-2,6500,2024-03-01T08:15:00\n", encoding="utf-8")
+    monkeypatch.setattr(shortage_forecast, "CONSUMPTION_HISTORY_PATH", str(path))
+    first = shortage_forecast.default_history()
+    assert shortage_forecast.default_history() is first
+
+    path.write_text(header + "TAKEN,P2,-1,6500,2024-03-02T08:15:00\n", encoding="utf-8")
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+    assert [e.profile_code for e in shortage_forecast.default_history()] == ["P2"]
@@ -0,0 +1,59 @@
+from fastapi.testclient import TestClient
+
+from app.models.schema import WasteItem
+from app.services.waste_inventory import WasteInventoryStore, WasteVersionConflict
+from main import app
+
+client = TestClient(app)
+
+
+def waste(item_id, length, profile_code="P1", color="White"):
+    return WasteItem(id=item_id, location="01-1", length_mm=length, profile_code=profile_code, color=color)
+
+
+def test_store_applies_deltas_against_matching_version_only():
+    store = WasteInventoryStore()
+    store.replace(1, [waste("a", 1200), waste("b", 800), waste("c", 900, color="Orzech")])
+    assert [w.id for w in store.items_for("P1", "White")] == ["b", "a"]
+
+    store.apply_delta(1, 2, upserts=[waste("a", 700), waste("d", 1500)], deletes=["b"])
+    assert [(w.id, w.length_mm) for w in store.items_for("P1", "White", version=2)] == [("a", 700), ("d", 1500)]
+    assert len(store) == 3
+
+    try:
+        store.apply_delta(1, 3, upserts=[], deletes=["a"])
+        assert False, "stale delta accepted"
+    except WasteVersionConflict as e:
+        assert e.current_version == 2
+    try:
+        store.items_for("P1", "White", version=1)
+        assert False, "stale read accepted"
+    except WasteVersionConflict:
+        pass
+
+
+def test_endpoints_use_stored_pool_by_version():
+    pool = [waste("w1", 2100), waste("w2", 1000), waste("w3", 3000, profile_code="P2")]
+    snapshot = {"version": 10, "items": [w.model_dump() for w in pool]}
+    assert client.put("/inventory/waste", json=snapshot).json() == {"version": 10, "item_count": 3}
+
+    recommendation = client.post("/recommend/waste", json={
+        "profile_code": "P1", "color": "White", "required_length_mm": 900, "waste_version": 10
+    }).json()
+    assert recommendation["recommended_item_id"] == "w2"
+
+    orders = [
+        {"order_id": "o1", "profile_code": "P1", "color": "White", "required_length_mm": 2000},
+        {"order_id": "o2", "profile_code": "P2", "color": "White", "required_length_mm": 2500},
+    ]
+    by_version = client.post("/optimize/batch", json={"orders": orders, "waste_version": 10}).json()
+    by_payload = client.post("/optimize/batch", json={"orders": orders, "available_waste": snapshot["items"]}).json()
+    # Same plan; the plan ids name different requests
+    assert by_version.pop("plan_id") != by_payload.pop("plan_id")
+    assert by_version == by_payload
+
+    delta = {"base_version": 10, "version": 11, "deletes": ["w2"]}
+    assert client.post("/inventory/waste/delta", json=delta).json() == {"version": 11, "item_count": 2}
+    assert client.post("/inventory/waste/delta", json=delta).status_code == 409
+    assert client.post("/optimize/batch", json={"orders": orders, "waste_version": 10}).status_code == 409
+    assert client.post("/optimize/batch", json={"orders": orders}).status_code == 422
@@ -0,0 +1,86 @@
+import random
+
+from fastapi.testclient import TestClient
+
+from app.algorithm.waste_recommender import tightest_fits
+from app.models.schema import WasteItem
+from app.services.waste_inventory import WasteInventoryStore
+from main import app
+
+client = TestClient(app)
+
+
+def random_pool(rng, n):
+    return [
+        WasteItem(id=f"w{i}", location=f"{rng.randint(1, 20):02d}-{rng.randint(1, 5)}",
+                  length_mm=rng.randint(300, 6500), profile_code=rng.choice(["P1", "P2"]),
+                  color=rng.choice(["White", "Orzech"]))
+        for i in range(n)
+    ]
+
+
+def test_index_matches_linear_scan_including_ties():
+    rng = random.Random(5)
+    pool = random_pool(rng, 2000)
+    store = WasteInventoryStore()
+    store.replace(1, pool)
+    for _ in range(200):
+        profile_code, color = rng.choice(["P1", "P2"]), rng.choice(["White", "Orzech"])
+        required, k = rng.randint(200, 7000), rng.randint(1, 5)
+        expected = sorted(
+            (w for w in pool if w.profile_code == profile_code and w.color == color and w.length_mm >= required),
+            key=lambda w: w.length_mm
+        )[:k]
+        assert [w.id for w in store.best_fits(profile_code, color, required, k)] == [w.id for w in expected]
+        assert [w.id for w in tightest_fits(pool, profile_code, color, required, k)] == [w.id for w in expected]
+
+
+def test_recommend_returns_top_k_alternatives():
+    pool = [
+        {"id": "a", "location": "01-1", "length_mm": 1500, "profile_code": "P1", "color": "White"},
+        {"id": "b", "location": "02-3", "length_mm": 1100, "profile_code": "P1", "color": "White"},
+        {"id": "c", "location": "03-2", "length_mm": 1300, "profile_code": "P1", "color": "White"},
+        {"id": "d", "location": "04-1", "length_mm": 1050, "profile_code": "P1", "color": "Orzech"},
+    ]
+    body = {"profile_code": "P1", "color": "White", "required_length_mm": 1000, "top_k": 3}
+
+    inline = client.post("/recommend/waste", json={**body, "available_waste": pool}).json()
+    assert inline["recommended_item_id"] == "b"
+    assert inline["cutoff_waste_mm"] == 100
+    assert inline["message"] == "Użyj odpadu z lokalizacji 02-3"
+    assert [(c["waste_id"], c["location"]) for c in inline["alternatives"]] == [("b", "02-3"), ("c", "03-2"), ("a", "01-1")]
+
+    client.put("/inventory/waste", json={"version": 42, "items": pool})
+    stored = client.post("/recommend/waste", json={**body, "waste_version": 42}).json()
+    assert stored == inline
+
+    none = client.post("/recommend/waste", json={**body, "required_length_mm": 2000, "available_waste": pool}).json()
+    assert none["recommended_item_id"] is None and none["alternatives"] == []
+
+
+def test_batch_matches_single_queries_and_allocates_exclusively():
+    pool = [
+        {"id": "a", "location": "01-1", "length_mm": 1200, "profile_code": "P1", "color": "White"},
+        {"id": "b", "location": "01-2", "length_mm": 1100, "profile_code": "P1", "color": "White"},
+        {"id": "c", "location": "02-1", "length_mm": 900, "profile_code": "P2", "color": "White"},
+    ]
+    queries = [
+        {"profile_code": "P1", "color": "White", "required_length_mm": 1000, "top_k": 2},
+        {"profile_code": "P1", "color": "White", "required_length_mm": 1000},
+        {"profile_code": "P1", "color": "White", "required_length_mm": 1000},
+        {"profile_code": "P2", "color": "White", "required_length_mm": 800},
+    ]
+
+    shared = client.post("/recommend/waste/batch", json={"queries": queries, "available_waste": pool}).json()
+    singles = [client.post("/recommend/waste", json={**q, "available_waste": pool}).json() for q in queries]
+    assert shared["recommendations"] == singles
+
+    exclusive = client.post("/recommend/waste/batch",
+                            json={"queries": queries, "available_waste": pool, "exclusive": True}).json()
+    assert [r["recommended_item_id"] for r in exclusive["recommendations"]] == ["b", "a", None, "c"]
+    assert [c["waste_id"] for c in exclusive["recommendations"][0]["alternatives"]] == ["b", "a"]
+
+    client.put("/inventory/waste", json={"version": 43, "items": pool})
+    stored = client.post("/recommend/waste/batch",
+                         json={"queries": queries, "waste_version": 43, "exclusive": True}).json()
+    assert stored == exclusive
@@ -59,7 +59,9 @@ def create_profile():
         "heightMm": get_input("Wysokość (mm)", default=0, val_type=int, required=False),
         "widthMm": get_input("Szerokość (mm)", default=0, val_type=int, required=False),
         "beadHeightMm": get_input("Wysokość Listwy (mm)", default=0, val_type=int, required=False),
-        "beadAngle": get_input("Kąt Listwy", default=0.0, val_type=float, required=False)
+        "beadAngle": get_input("Kąt Listwy", default=0.0, val_type=float, required=False),
+        "cutAngle": get_input("Kąt cięcia (45 = rama/skrzydło, 0 = prosto)", default=0.0, val_type=float,
+                              required=False)
     }
 
 def create_color():